@@ -0,0 +1,289 @@
+import json
+import threading
+import time
+import urllib.request
+from collections import deque, namedtuple
+from profiler import span
+
+# What the detector hands to the dispatcher: "trigger" when looking down lasted long
+# enough, "recover" when the user looks back up after a trigger
+ActionEvent = namedtuple("ActionEvent", ["kind", "timestamp", "l_ratio", "r_ratio"])
+
+TRIGGER = "trigger"
+RECOVER = "recover"
+
+
+class Action:
+    """Base class for trigger side effects run by the ActionDispatcher
+
+    run(event) is called on the dispatcher's worker thread, at most once
+    every `min_interval` seconds; cancel(event) when the user looks back up.
+    """
+
+    name = None
+
+    def __init__(self, min_interval=0.0):
+        self.min_interval = min_interval
+        self.last_run = None
+
+    def run(self, event):
+        raise NotImplementedError
+
+    def cancel(self, event):
+        pass
+
+    def close(self):
+        pass
+
+
+class SoundAction(Action):
+    """Play the trigger sound"""
+
+    name = "sound"
+
+    def __init__(self, audio, min_interval=0.0):
+        super().__init__(min_interval)
+        self.audio = audio
+
+    def run(self, event):
+        self.audio.play()
+
+    def cancel(self, event):
+        self.audio.stop()
+
+
+class OverlayAction(Action):
+    """Flash the spam images `loops` times in the overlay window"""
+
+    name = "overlay"
+
+    def __init__(self, overlay, loops, min_interval=0.0):
+        super().__init__(min_interval)
+        self.overlay = overlay
+        self.loops = loops
+
+    def run(self, event):
+        self.overlay.show(self.loops)
+
+    def cancel(self, event):
+        self.overlay.cancel()
+
+
+class NotificationAction(Action):
+    """Show a desktop notification through `notify(message, title)`, e.g. the tray icon's"""
+
+    name = "notification"
+
+    def __init__(self, notify, min_interval=0.0):
+        super().__init__(min_interval)
+        self.notify = notify
+
+    def run(self, event):
+        self.notify("Stop doomscrolling!", "Caught Looking Down")
+
+
+class LogAction(Action):
+    """Append every trigger and recovery to a JSON-lines file"""
+
+    name = "log"
+
+    def __init__(self, path, min_interval=0.0):
+        super().__init__(min_interval)
+        self.path = path
+
+    def run(self, event):
+        self._write(event)
+
+    def cancel(self, event):
+        self._write(event)
+
+    def _write(self, event):
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(event._asdict()) + "\n")
+
+
+class WebhookAction(Action):
+    """POST each trigger as JSON to a URL (meant for a local service, so the timeout is short)"""
+
+    name = "webhook"
+
+    def __init__(self, url, timeout=2.0, min_interval=0.0):
+        super().__init__(min_interval)
+        self.url = url
+        self.timeout = timeout
+
+    def run(self, event):
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps(event._asdict()).encode(),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+class ActionDispatcher:
+    """Run trigger side effects on one worker thread, fed by a bounded queue
+
+    submit() never blocks the caller. Pending events are coalesced: a
+    trigger while another is still queued is dropped, and a recovery
+    removes queued triggers it has overtaken. Each action is rate limited
+    by its own `min_interval`. When the queue is full the oldest event is
+    dropped, so a stuck handler cannot hold up detection or pile up work.
+    """
+
+    def __init__(self, actions=(), max_queue=8):
+        self.actions = list(actions)
+        self.max_queue = max_queue
+        self.submitted = 0
+        self.dispatched = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.rate_limited = 0
+        self.errors = 0
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+
+    def set_actions(self, actions):
+        """Replace the handlers, closing the ones no longer used
+
+        A new handler takes over the last run time of the old one with the
+        same name, so saving settings does not reset its rate limit.
+        """
+        with self._cond:
+            old, self.actions = self.actions, list(actions)
+            last_runs = {action.name: action.last_run for action in old}
+            for action in self.actions:
+                if action.last_run is None:
+                    action.last_run = last_runs.get(action.name)
+        for action in old:
+            if action not in self.actions:
+                action.close()
+
+    def start(self):
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._running = True
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the worker once it finishes the event it is running; pending events are discarded"""
+        with self._cond:
+            self._running = False
+            self._queue.clear()
+            self._cond.notify_all()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2)
+        self._thread = None
+
+    def close(self):
+        self.stop()
+        for action in self.actions:
+            action.close()
+
+    def submit(self, event):
+        """Queue an event for the worker, return False if it was coalesced into a pending one"""
+        with self._cond:
+            self.submitted += 1
+            if event.kind == TRIGGER and any(pending.kind == TRIGGER for pending in self._queue):
+                self.coalesced += 1
+                return False
+            if event.kind == RECOVER:
+                # The user already looked back up - queued triggers are stale
+                pending = len(self._queue)
+                self._queue = deque(e for e in self._queue if e.kind != TRIGGER)
+                self.coalesced += pending - len(self._queue)
+                if any(e.kind == RECOVER for e in self._queue):
+                    self.coalesced += 1
+                    return False
+            if len(self._queue) >= self.max_queue:
+                self._queue.popleft()
+                self.dropped += 1
+            self._queue.append(event)
+            self._cond.notify()
+        self.start()
+        return True
+
+    def trigger(self, l_ratio=None, r_ratio=None):
+        return self.submit(ActionEvent(TRIGGER, time.time(), l_ratio, r_ratio))
+
+    def recover(self):
+        return self.submit(ActionEvent(RECOVER, time.time(), None, None))
+
+    def stats(self):
+        """Return counters for the stats window and metrics"""
+        return {
+            "actions_submitted": self.submitted,
+            "actions_dispatched": self.dispatched,
+            "actions_coalesced": self.coalesced,
+            "actions_dropped": self.dropped,
+            "actions_rate_limited": self.rate_limited,
+            "actions_errors": self.errors,
+            "actions_pending": len(self._queue),
+        }
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running and not self._queue:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                event = self._queue.popleft()
+                actions = list(self.actions)
+            self._dispatch(event, actions)
+
+    def _dispatch(self, event, actions):
+        self.dispatched += 1
+        for action in actions:
+            try:
+                if event.kind == RECOVER:
+                    action.cancel(event)
+                    continue
+                now = time.monotonic()
+                if action.last_run is not None and now - action.last_run < action.min_interval:
+                    self.rate_limited += 1
+                    continue
+                action.last_run = now
+                with span(f"action.{action.name}"):
+                    action.run(event)
+            except Exception as e:
+                self.errors += 1
+                print(f"Error running {action.name} action: {e}")
+
+
+if __name__ == "__main__":
+    # Fire a burst of triggers at a local webhook stand-in and a log file: python actions.py
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+
+    class StandIn(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+            print(f"Webhook received: {body.decode()}")
+            self.send_response(204)
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), StandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    dispatcher = ActionDispatcher([
+        WebhookAction(f"http://127.0.0.1:{server.server_port}/trigger", min_interval=1.0),
+        LogAction("actions.log"),
+    ])
+    for _ in range(5):
+        dispatcher.trigger(0.2, 0.2)
+    time.sleep(0.2)
+    dispatcher.recover()
+    dispatcher.trigger(0.2, 0.2)
+    time.sleep(0.5)
+    dispatcher.close()
+    server.shutdown()
+    print(dispatcher.stats())
@@ -0,0 +1,240 @@
+"""Run the detection pipeline over recorded videos, in parallel, and summarize doomscroll episodes
+
+Long videos are split into chunks of --chunk-seconds that are decoded and
+analysed on separate cores. For each video a gaze timeline (.npz, the
+format timeline.py and bench.py read) is written under --output, in the
+same folder layout as the inputs, next to a summary.json of its look-down
+episodes.
+
+Examples:
+    python analyze.py recordings/ --output analysis/
+    python analyze.py recordings/ --threshold 0.3 --timer 1.5 --estimator eye-region
+    python timeline.py analysis/session1.npz 0.3 1.5       # re-tune a single file afterwards
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+import cv2
+import numpy as np
+from config import load_config, trigger_min_confidence
+from timeline import GazeTimeline, TriggerEngine
+
+VIDEO_SUFFIXES = {".mp4", ".avi", ".mov", ".mkv", ".webm", ".m4v"}
+
+# One gaze model per worker process, reused across the chunks it is given
+_estimator = None
+
+
+def find_videos(paths):
+    """Expand files and directories (recursively) into a sorted list of video files"""
+    videos = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            videos.extend(p for p in path.rglob("*") if p.suffix.lower() in VIDEO_SUFFIXES)
+        elif path.suffix.lower() in VIDEO_SUFFIXES:
+            videos.append(path)
+    return sorted(videos)
+
+
+def timeline_paths(videos, output):
+    """Map each video to its timeline .npz under `output`, mirroring the folders below the videos' common parent
+
+    Videos that would still share a name (clip.mp4 and clip.avi) keep
+    their own suffix in it (clip.mp4.npz).
+    """
+    resolved = [path.resolve() for path in videos]
+    try:
+        root = Path(os.path.commonpath([path.parent for path in resolved]))
+        relative = [path.relative_to(root) for path in resolved]
+    except ValueError:
+        # No common parent (different drives on Windows)
+        relative = [path.relative_to(path.anchor) for path in resolved]
+    targets = [path.with_suffix(".npz") for path in relative]
+    taken = [targets.count(target) > 1 for target in targets]
+    return {
+        video: output / (path.with_name(path.name + ".npz") if clash else target)
+        for video, path, target, clash in zip(videos, relative, targets, taken)
+    }
+
+
+def plan_chunks(path, chunk_seconds):
+    """Return (fps, frame_count, [(start, end), ...]) frame ranges covering the video"""
+    cap = cv2.VideoCapture(str(path))
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+
+    if count <= 0:
+        # No frame count in the container: one chunk, read to the end
+        return fps, None, [(0, None)]
+    size = max(1, int(chunk_seconds * fps))
+    return fps, count, [(start, min(start + size, count)) for start in range(0, count, size)]
+
+
+def analyze_chunk(path, start, end, config):
+    """Decode frames [start, end) of a video and return their (l_ratio, r_ratio, face, confidence) arrays"""
+    global _estimator
+    from estimators import create_estimator
+    from gaze import iris_ratios, mirror_points
+
+    if _estimator is None:
+        _estimator = create_estimator(config)
+    else:
+        # A new chunk is a new scene: drop the ROI tracked in the previous one
+        _estimator.configure(config)
+
+    cap = cv2.VideoCapture(str(path))
+    if start:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+
+    l_ratio, r_ratio, face, confidence = [], [], [], []
+    index = start
+    frame = None
+    while end is None or index < end:
+        # Decode into the previous frame's buffer
+        ret, frame = cap.read(frame)
+        if not ret:
+            break
+        index += 1
+
+        estimate = _estimator.estimate(frame)
+        if estimate:
+            # Mirrored like the live detector, so left and right match its timelines
+            l, r = iris_ratios(mirror_points(estimate.points))
+            l_ratio.append(l)
+            r_ratio.append(r)
+            face.append(True)
+            confidence.append(estimate.confidence)
+        else:
+            l_ratio.append(np.nan)
+            r_ratio.append(np.nan)
+            face.append(False)
+            confidence.append(0.0)
+    cap.release()
+
+    return (
+        np.array(l_ratio, dtype=np.float64),
+        np.array(r_ratio, dtype=np.float64),
+        np.array(face, dtype=bool),
+        np.array(confidence, dtype=np.float64),
+    )
+
+
+def summarize_file(timeline, engine):
+    """Look-down episodes of one video: every down run, and which ones lasted long enough to trigger"""
+    timestamp, l_ratio, r_ratio, face, confidence = timeline.arrays()
+    result = engine.batch(timestamp, l_ratio, r_ratio, face, confidence)
+    triggered = set(np.searchsorted(result["run_end"], result["triggers"]).tolist())
+
+    episodes = []
+    for run, (start, end, dwell) in enumerate(zip(result["run_start"], result["run_end"], result["dwell"])):
+        if run in triggered:
+            episodes.append({"start_s": float(timestamp[start]), "end_s": float(timestamp[end]), "dwell_s": float(dwell)})
+
+    duration = float(timestamp[-1]) if len(timestamp) else 0.0
+    return {
+        "frames": len(timestamp),
+        "duration_s": duration,
+        "face_found_rate": float(face.mean()) if len(face) else 0.0,
+        "down_runs": len(result["run_start"]),
+        "down_seconds": float(result["dwell"].sum()),
+        "triggers": len(result["triggers"]),
+        "episodes": episodes,
+        "episode_seconds": sum(episode["dwell_s"] for episode in episodes),
+    }
+
+
+def analyze(videos, output, config, workers=None, chunk_seconds=60.0):
+    """Analyse every video on a process pool, write per-file timelines and summary.json, return the summary"""
+    output = Path(output)
+    output.mkdir(parents=True, exist_ok=True)
+    engine = TriggerEngine(
+        config["iris_threshold"], config["timer"], trigger_min_confidence(config), config["iris_hysteresis"]
+    )
+
+    plans = {path: plan_chunks(path, chunk_seconds) for path in videos}
+    timelines = timeline_paths(videos, output)
+    jobs = [(path, start, end) for path, (_, _, chunks) in plans.items() for start, end in chunks]
+    results = {path: {} for path in videos}
+    summary = {
+        "iris_threshold": config["iris_threshold"],
+        "iris_hysteresis": config["iris_hysteresis"],
+        "timer": config["timer"],
+        "gaze_estimator": config["gaze_estimator"],
+        "files": {},
+    }
+
+    started = time.perf_counter()
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), mp_context=context) as pool:
+        futures = {pool.submit(analyze_chunk, path, start, end, config): (path, start) for path, start, end in jobs}
+        for future in as_completed(futures):
+            path, start = futures[future]
+            try:
+                results[path][start] = future.result()
+            except Exception as e:
+                print(f"Error analysing {path} from frame {start}: {e}")
+                continue
+
+            if len(results[path]) == len(plans[path][2]):
+                summary["files"][str(path)] = _finish_file(plans[path][0], results.pop(path), timelines[path], engine)
+                print(f"{path}: {summary['files'][str(path)]['triggers']} episodes")
+
+    elapsed = time.perf_counter() - started
+    frames = sum(info["frames"] for info in summary["files"].values())
+    summary["elapsed_s"] = elapsed
+    summary["frames_per_s"] = frames / elapsed if elapsed else 0.0
+    with open(output / "summary.json", 'w') as f:
+        json.dump(summary, f, indent=4)
+    return summary
+
+
+def _finish_file(fps, chunks, timeline_path, engine):
+    """Stitch a video's chunks back together in order, save its timeline and summarize it"""
+    l_ratio, r_ratio, face, confidence = (np.concatenate(parts) for parts in zip(*(chunks[s] for s in sorted(chunks))))
+    # Media time, so episodes are in seconds of footage however fast it was analysed
+    timestamp = np.arange(len(face)) / fps
+    timeline = GazeTimeline.from_arrays(timestamp, l_ratio, r_ratio, face, confidence)
+    timeline_path.parent.mkdir(parents=True, exist_ok=True)
+    timeline.save(timeline_path)
+    return {"timeline": str(timeline_path), **summarize_file(timeline, engine)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyse recorded sessions for doomscroll episodes")
+    parser.add_argument("inputs", nargs="+", help="Video files or directories of them")
+    parser.add_argument("--output", default="analysis", help="Directory for timelines and summary.json")
+    parser.add_argument("--config", default="config.json", help="Config file for threshold, timer and gaze backend")
+    parser.add_argument("--threshold", type=float, help="Override iris_threshold")
+    parser.add_argument("--timer", type=float, help="Override timer")
+    parser.add_argument("--estimator", choices=["facemesh", "face-landmarker", "eye-region"], help="Override gaze_estimator")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: one per core)")
+    parser.add_argument("--chunk-seconds", type=float, default=60.0, help="Split videos into chunks of this length")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    if args.threshold is not None:
+        config["iris_threshold"] = args.threshold
+    if args.timer is not None:
+        config["timer"] = args.timer
+    if args.estimator:
+        config["gaze_estimator"] = args.estimator
+
+    videos = find_videos(args.inputs)
+    if not videos:
+        print("No video files found")
+        return
+
+    summary = analyze(videos, args.output, config, workers=args.workers, chunk_seconds=args.chunk_seconds)
+    episodes = sum(info["triggers"] for info in summary["files"].values())
+    print(f"{len(summary['files'])} files, {episodes} episodes, {summary['frames_per_s']:.1f} frames/s")
+    print(f"Summary written to {Path(args.output) / 'summary.json'}")
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    main()
@@ -0,0 +1,98 @@
+import threading
+from collections import OrderedDict
+from pathlib import Path
+import pygame
+
+
+class AudioPlayer:
+    """Play the trigger sound: stream long files, keep short clips decoded
+
+    Files larger than `stream_threshold` bytes are streamed through
+    pygame.mixer.music and never decoded in full. Short clips are decoded
+    into pygame.mixer.Sound on a background thread and cached by path,
+    mtime and size, so reloading the same file is free.
+    """
+
+    def __init__(self, stream_threshold=512 * 1024, max_cached=4):
+        self.stream_threshold = stream_threshold
+        self.max_cached = max_cached
+        self.path = None
+        self.mixer_ready = False
+        self._mixer_failed = False
+        self._key = None
+        self._missing = None
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_mixer(self):
+        """Initialise the mixer once, return True if audio is available"""
+        with self._lock:
+            if not self.mixer_ready and not self._mixer_failed:
+                try:
+                    pygame.mixer.init()
+                    self.mixer_ready = True
+                except pygame.error as e:
+                    print(f"Error initializing audio: {e}")
+                    self._mixer_failed = True
+            return self.mixer_ready
+
+    def load(self, path):
+        """Select the sound to play; decoding (if any) happens in the background"""
+        path = Path(path)
+        try:
+            stat = path.stat()
+        except OSError:
+            # load() runs on every settings change, so only say it once per missing path
+            if self._missing != path:
+                print(f"Error loading sound: {path} not found")
+            self._missing = path
+            self.path = None
+            self._key = None
+            return
+        self._missing = None
+
+        key = (str(path), stat.st_mtime, stat.st_size)
+        if key == self._key:
+            return
+        self.path = path
+        self._key = key
+
+        if stat.st_size <= self.stream_threshold and key not in self._cache:
+            threading.Thread(target=self._decode, args=(key,), daemon=True).start()
+
+    def play(self):
+        """Play the selected sound without blocking"""
+        if self._key is None or not self.init_mixer():
+            return
+
+        try:
+            sound = self._cache.get(self._key)
+            if sound is not None:
+                sound.play()
+            else:
+                # Long file, or a short clip still decoding - stream it
+                pygame.mixer.music.load(str(self.path))
+                pygame.mixer.music.play()
+        except pygame.error as e:
+            print(f"Error playing sound: {e}")
+
+    def stop(self):
+        if not self.mixer_ready:
+            return
+        pygame.mixer.stop()
+        pygame.mixer.music.stop()
+
+    def _decode(self, key):
+        if not self.init_mixer():
+            return
+        try:
+            sound = pygame.mixer.Sound(key[0])
+        except pygame.error as e:
+            print(f"Error loading sound: {e}")
+            return
+
+        with self._lock:
+            self._cache[key] = sound
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_cached:
+                self._cache.popitem(last=False)
@@ -0,0 +1,558 @@
+"""Benchmark the detection pipeline without a camera or display
+
+Examples:
+    python bench.py                                   # replay the bundled assets/spam images
+    python bench.py --source session.mp4 --frames 900 --output bench.json
+    python bench.py --timeline session.npz            # decision stage only, from a recorded timeline
+    python bench.py --resume --cycles 10              # stop/start latency with and without the warm pool (camera)
+    python bench.py --source session.mp4 --compare-tracking
+    python bench.py --source session.mp4 --compare-estimators
+    python bench.py --source session.mp4 --alloc              # per-frame allocation and GC pressure
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import numpy as np
+from stages import StageTimer, summarize
+from timeline import GazeTimeline, TriggerEngine
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, or None if unavailable"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports KB, macOS reports bytes
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    except ImportError:
+        pass
+
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [
+                ("cb", wintypes.DWORD),
+                ("PageFaultCount", wintypes.DWORD),
+                ("PeakWorkingSetSize", ctypes.c_size_t),
+                ("WorkingSetSize", ctypes.c_size_t),
+                ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                ("PagefileUsage", ctypes.c_size_t),
+                ("PeakPagefileUsage", ctypes.c_size_t),
+            ]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        handle = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+            return counters.PeakWorkingSetSize / (1024 * 1024)
+    except (AttributeError, OSError):
+        pass
+    return None
+
+
+class AllocationProbe:
+    """Stage timer that records tracemalloc figures per frame instead of stage times
+
+    The peak is reset at every frame start, so peak minus the level at the
+    start is the most the frame had allocated on top of what was already
+    live (across every thread). Results go into preallocated arrays, so the
+    probe itself adds nothing per frame.
+    """
+
+    current = {}
+
+    def __init__(self, frames):
+        import tracemalloc
+        self._tracemalloc = tracemalloc
+        self.transient = np.zeros(frames, dtype=np.int64)
+        self.retained = np.zeros(frames, dtype=np.int64)
+        self.frames = 0
+        self._start = 0
+
+    def start_frame(self):
+        self._start = self._tracemalloc.get_traced_memory()[0]
+        self._tracemalloc.reset_peak()
+
+    def lap(self, stage):
+        pass
+
+    def end_frame(self):
+        if self.frames < len(self.transient):
+            current, peak = self._tracemalloc.get_traced_memory()
+            self.transient[self.frames] = peak - self._start
+            self.retained[self.frames] = current
+        self.frames += 1
+
+
+def run_pipeline(args, overrides=None, stages=None, warm_up=False):
+    """Run CharlieKirkDetector's detection loop over a recorded source, return (detector, triggers, seconds)
+
+    With `warm_up`, the backend runs once before the clock starts (so start-up cost is left out).
+    """
+    from detector import CharlieKirkDetector
+    from pipeline import InferencePipeline
+
+    detector = CharlieKirkDetector(args.config)
+    detector.config.update({
+        "preview": "off",
+        "sound_enabled": False,
+        "timeline_path": None,
+        "max_fps": 1000,
+        "idle_interval": 0.0,
+        "no_face_interval": 0.0,
+    })
+    if args.no_roi:
+        detector.config["roi_tracking"] = False
+    if args.tracking:
+        detector.config["tracking_enabled"] = True
+    if args.estimator:
+        detector.config["gaze_estimator"] = args.estimator
+    detector.config.update(overrides or {})
+    detector.scheduler.apply_config(detector.config)
+    pipelined = isinstance(detector.estimator, InferencePipeline)
+    if detector.estimator.name != detector.config["gaze_estimator"] or pipelined != detector.config["pipeline_enabled"]:
+        detector._release_model(detector.estimator)
+        detector._ensure_model()
+    detector.setup_roi()
+    detector.setup_tracking()
+
+    # Record triggers instead of playing sound and spamming images
+    triggers = []
+    detector.trigger_spam = lambda *ratios: triggers.append((time.time(), detector.last_frame_time))
+
+    if warm_up:
+        detector.warm_up()
+    detector.stages = stages or StageTimer()
+    started = time.perf_counter()
+    detector.run(replay_source(args))
+    elapsed = time.perf_counter() - started
+    return detector, triggers, elapsed
+
+
+def replay_source(args):
+    """Lossless replay of --source, so every run sees exactly the same frames"""
+    from frame_source import ImageDirectorySource, VideoFileSource
+    from pathlib import Path
+
+    path = Path(args.source)
+    if path.is_dir():
+        return ImageDirectorySource(path, fps=None, loop=True, lossless=True, max_frames=args.frames)
+    return VideoFileSource(path, loop=True, realtime=False, lossless=True, max_frames=args.frames)
+
+
+def bench_pipeline(args):
+    """Run the detection loop over a recorded source and time every stage"""
+    detector, triggers, elapsed = run_pipeline(args)
+
+    # Trigger latency: from the triggering frame's capture, and from the first frame of its down run
+    timestamp, l_ratio, r_ratio, face, confidence = detector.timeline.arrays()
+    runs = detector.trigger_engine.batch(timestamp, l_ratio, r_ratio, face, confidence)
+    down_to_trigger = []
+    for trigger_time, _ in triggers:
+        started_runs = runs["run_start"][timestamp[runs["run_start"]] <= trigger_time]
+        if len(started_runs):
+            down_to_trigger.append(trigger_time - timestamp[started_runs[-1]])
+
+    frames = detector.stages.frames
+    results = {
+        "mode": "pipeline",
+        "source": str(args.source),
+        "frames": frames,
+        "wall_time_s": elapsed,
+        "fps": frames / elapsed if elapsed else 0.0,
+        "face_found_rate": float(face.mean()) if len(face) else 0.0,
+        "stages": detector.stages.summary(),
+        "triggers": len(triggers),
+        "trigger_latency": summarize([t - captured for t, captured in triggers]) if triggers else None,
+        "down_to_trigger": summarize(down_to_trigger) if down_to_trigger else None,
+        "gaze_estimator": detector.estimator.name,
+        "roi_tracking": bool(getattr(detector.estimator, "roi_tracker", None)),
+    }
+    if detector.landmark_tracker:
+        results.update(detector.landmark_tracker.stats())
+    return results
+
+
+def bench_tracking(args):
+    """Compare tracking between inferences against inference on every frame over the same frames
+
+    Both runs are lossless over the same source, so sample i is the same
+    frame in each. Triggers are evaluated with timestamps at the source's
+    nominal frame rate, since wall-clock times differ between the runs.
+    """
+    baseline, _, baseline_time = run_pipeline(args, {"tracking_enabled": False})
+    tracked, _, tracked_time = run_pipeline(args, {"tracking_enabled": True})
+
+    _, base_l, base_r, base_face, _ = baseline.timeline.arrays()
+    _, l_ratio, r_ratio, face, confidence = tracked.timeline.arrays()
+    n = min(len(base_face), len(face))
+    base_l, base_r, base_face = base_l[:n], base_r[:n], base_face[:n]
+    l_ratio, r_ratio, face, confidence = l_ratio[:n], r_ratio[:n], face[:n], confidence[:n]
+    timestamp = np.arange(n) / args.fps
+
+    threshold = tracked.trigger_engine.threshold
+    both = base_face & face
+    base_down = (base_l < threshold) & (base_r < threshold)
+    down = (l_ratio < threshold) & (r_ratio < threshold)
+    error = np.abs(np.concatenate([l_ratio[both] - base_l[both], r_ratio[both] - base_r[both]]))
+
+    engine = tracked.trigger_engine
+    base_triggers = engine.batch(timestamp, base_l, base_r, base_face)["triggers"]
+    triggers = engine.batch(timestamp, l_ratio, r_ratio, face, confidence)["triggers"]
+    # A tracked trigger matches a baseline one if it fires within half a second of it
+    tolerance = int(round(0.5 * args.fps))
+    matched = sum(1 for i in base_triggers if len(triggers) and np.abs(triggers - i).min() <= tolerance)
+
+    results = {
+        "mode": "tracking",
+        "source": str(args.source),
+        "frames": n,
+        "fps_every_frame": n / baseline_time if baseline_time else 0.0,
+        "fps_tracking": n / tracked_time if tracked_time else 0.0,
+        "face_agreement": float((base_face == face).mean()) if n else 0.0,
+        "down_agreement": float((base_down[both] == down[both]).mean()) if both.any() else None,
+        "ratio_error_mean": float(error.mean()) if len(error) else None,
+        "ratio_error_p95": float(np.percentile(error, 95)) if len(error) else None,
+        "triggers_every_frame": len(base_triggers),
+        "triggers_tracking": len(triggers),
+        "triggers_matched": matched,
+        "stages_tracking": tracked.stages.summary(),
+    }
+    results.update(tracked.landmark_tracker.stats())
+    return results
+
+
+def bench_pipelined(args):
+    """Compare the multi-process pipeline against the single detection thread over the same frames
+
+    The replay is lossless, so both runs see every frame in the same order
+    and sample i is the same frame in each. Both backends are warmed up
+    before the clock starts.
+    """
+    single, _, single_time = run_pipeline(args, {"pipeline_enabled": False}, warm_up=True)
+    single.resource_pool.release_all()
+    pipelined, _, pipelined_time = run_pipeline(args, {"pipeline_enabled": True}, warm_up=True)
+    pipeline_stats = pipelined.estimator.stats()
+    pipelined.resource_pool.release_all()
+
+    _, base_l, base_r, base_face, _ = single.timeline.arrays()
+    _, l_ratio, r_ratio, face, _ = pipelined.timeline.arrays()
+    n = min(len(base_face), len(face))
+    both = base_face[:n] & face[:n]
+    threshold = pipelined.trigger_engine.threshold
+    base_down = (base_l[:n] < threshold) & (base_r[:n] < threshold)
+    down = (l_ratio[:n] < threshold) & (r_ratio[:n] < threshold)
+    error = np.abs(np.concatenate([l_ratio[:n][both] - base_l[:n][both], r_ratio[:n][both] - base_r[:n][both]]))
+
+    results = {
+        "mode": "pipelined",
+        "source": str(args.source),
+        "frames": n,
+        "cpu_count": os.cpu_count(),
+        "fps_single": len(base_face) / single_time if single_time else 0.0,
+        "fps_pipelined": len(face) / pipelined_time if pipelined_time else 0.0,
+        "face_agreement": float((base_face[:n] == face[:n]).mean()) if n else 0.0,
+        "down_agreement": float((base_down[both] == down[both]).mean()) if both.any() else None,
+        "ratio_error_max": float(error.max()) if len(error) else None,
+        "stages_single": single.stages.summary(),
+        "stages_pipelined": pipelined.stages.summary(),
+    }
+    results.update(pipeline_stats)
+    return results
+
+
+def bench_estimators(args):
+    """Run every gaze backend on the same frames, report cost and accuracy against FaceMesh
+
+    The reference is full-frame FaceMesh: ROI tracking can carry a crop over to
+    an unrelated next image (assets/spam is a slideshow), which is no fault of
+    the backend being measured. Accuracy is measured on frames where the
+    reference ratios are plausible (0-1: the iris between the lids) and the
+    backend found a face confident enough for the trigger to use: mean/p95
+    absolute ratio error, how often the backend agrees with the reference on
+    "looking down" at --threshold, and the scale and offset that would map its
+    ratios onto the reference (eye_region_ratio_scale / _offset for
+    eye-region; the scale is only meaningful if the recording looks both up
+    and down).
+    """
+    import cv2
+    from config import load_config, trigger_min_confidence
+    from estimators import ESTIMATORS, FaceLandmarkerEstimator, FaceMeshEstimator, create_estimator
+
+    config = load_config(args.config)
+    reference = FaceMeshEstimator(dict(config, roi_tracking=False))
+    reference_ratios = []
+    estimators = {}
+    for name in ESTIMATORS:
+        if name == "face-landmarker":
+            # Compare the real thing or nothing, not create_estimator()'s FaceMesh fallback
+            try:
+                estimators[name] = FaceLandmarkerEstimator(config)
+            except (OSError, RuntimeError, ValueError) as e:
+                print(f"Skipping face-landmarker: {e}")
+            continue
+        estimators[name] = create_estimator(dict(config, gaze_estimator=name))
+
+    timers = {name: StageTimer() for name in estimators}
+    frame_times = {name: [] for name in estimators}
+    ratios = {name: [] for name in estimators}
+    confidence = {name: [] for name in estimators}
+    for estimator in estimators.values():
+        estimator.warm_up()
+    reference.warm_up()
+
+    source = replay_source(args)
+    source.start()
+    last_seq = -1
+    while True:
+        captured = source.read(after=last_seq)
+        if captured is None:
+            if source.exhausted:
+                break
+            continue
+        last_seq = captured.seq
+        frame = cv2.flip(captured.image, 1)
+        estimate = reference.estimate(frame)
+        reference_ratios.append((estimate.l_ratio, estimate.r_ratio) if estimate else (np.nan, np.nan))
+
+        for name, estimator in estimators.items():
+            timer = estimator.stages = timers[name]
+            started = time.perf_counter()
+            timer.start_frame()
+            estimate = estimator.estimate(frame)
+            timer.lap("ratios")
+            timer.end_frame()
+            frame_times[name].append(time.perf_counter() - started)
+            ratios[name].append((estimate.l_ratio, estimate.r_ratio) if estimate else (np.nan, np.nan))
+            confidence[name].append(estimate.confidence if estimate else 0.0)
+    source.stop()
+
+    reference.close()
+
+    baseline = np.array(reference_ratios, dtype=np.float64).reshape(-1, 2)
+    # NaN (no face) compares False, so it is never plausible
+    plausible = ((baseline >= 0) & (baseline <= 1)).all(axis=1)
+    baseline_down = (baseline < args.threshold).all(axis=1)
+    results = {
+        "mode": "estimators",
+        "source": str(args.source),
+        "frames": len(baseline),
+        "reference_plausible_rate": float(plausible.mean()) if len(plausible) else 0.0,
+        "estimators": {},
+    }
+    for name, estimator in estimators.items():
+        values = np.array(ratios[name], dtype=np.float64).reshape(-1, 2)
+        found = ~np.isnan(values[:, 0])
+        usable = found & (np.array(confidence[name]) >= trigger_min_confidence(dict(config, gaze_estimator=name)))
+        both = usable & plausible
+        error = np.abs(values[both] - baseline[both]).ravel()
+        down = (values < args.threshold).all(axis=1)
+        fit_scale = fit_offset = None
+        if both.sum() >= 2:
+            x, y = values[both].ravel(), baseline[both].ravel()
+            if np.ptp(x) > 0:
+                fit_scale, fit_offset = (float(v) for v in np.polyfit(x, y, 1))
+        results["estimators"][name] = {
+            "frame": summarize(frame_times[name]) if frame_times[name] else None,
+            "stages": timers[name].summary(),
+            "face_found_rate": float(found.mean()) if len(found) else 0.0,
+            "usable_rate": float(usable.mean()) if len(usable) else 0.0,
+            "mean_confidence": float(np.mean(confidence[name])) if confidence[name] else 0.0,
+            "ratio_bias": float((values[both] - baseline[both]).mean()) if both.any() else None,
+            "ratio_error_mean": float(error.mean()) if len(error) else None,
+            "ratio_error_p95": float(np.percentile(error, 95)) if len(error) else None,
+            "down_agreement": float((down[both] == baseline_down[both]).mean()) if both.any() else None,
+            "fit_scale": fit_scale,
+            "fit_offset": fit_offset,
+        }
+        estimator.close()
+    return results
+
+
+def bench_resume(args):
+    """Measure start-to-first-frame latency over stop/start cycles, with and without the warm pool"""
+    from detector import CharlieKirkDetector
+
+    detector = CharlieKirkDetector(args.config)
+    detector.config.update({"preview": "off", "sound_enabled": False, "timeline_path": None})
+    if args.source:
+        detector.config["frame_source"] = args.source
+    detector.trigger_spam = lambda *ratios: None
+
+    results = {"mode": "resume", "source": str(detector.config["frame_source"]), "cycles": args.cycles}
+    for label, grace_period in [("without_pool", 0.0), ("with_pool", 60.0)]:
+        detector.resource_pool.grace_period = grace_period
+        detector.resource_pool.release_all()
+
+        latencies = []
+        # The first cycle only primes the pool
+        for cycle in range(args.cycles + 1):
+            detector.start_detection()
+            deadline = time.perf_counter() + 10
+            while detector.resume_latency is None and detector.running and time.perf_counter() < deadline:
+                time.sleep(0.001)
+            if cycle > 0 and detector.resume_latency is not None:
+                latencies.append(detector.resume_latency)
+            detector.stop_detection()
+        results[label] = summarize(latencies) if latencies else None
+
+    if results["without_pool"] and results["with_pool"]:
+        results["pool_saves_ms_p50"] = results["without_pool"]["p50_ms"] - results["with_pool"]["p50_ms"]
+    detector.shutdown()
+    return results
+
+
+def bench_alloc(args):
+    """Memory churn of the detection loop: bytes allocated per frame, retained growth and GC collections
+
+    Growth is the slope of traced memory over the frames after a warm-up;
+    a steady loop stays near zero. GC collections are scaled to 30 FPS.
+    """
+    import gc
+    import tracemalloc
+
+    probe = AllocationProbe(args.frames)
+    warmup = min(args.frames // 2, 30)
+    collections = [0, 0, 0]
+
+    def count(phase, info):
+        # Only collections during steady-state frames, not model loading and warm-up
+        if phase == "start" and probe.frames >= warmup:
+            collections[info["generation"]] += 1
+
+    tracemalloc.start()
+    gc.callbacks.append(count)
+    try:
+        detector, _, elapsed = run_pipeline(args, stages=probe)
+    finally:
+        gc.callbacks.remove(count)
+        tracemalloc.stop()
+
+    frames = min(probe.frames, len(probe.transient))
+    steady = max(1, probe.frames - warmup)
+    retained = probe.retained[warmup:frames]
+    growth = float(np.polyfit(np.arange(len(retained)), retained, 1)[0]) if len(retained) > 1 else 0.0
+    transient = probe.transient[warmup:frames]
+    return {
+        "mode": "alloc",
+        "source": str(args.source),
+        "frames": frames,
+        "fps": probe.frames / elapsed if elapsed else 0.0,
+        "gaze_estimator": detector.estimator.name,
+        "tracking": detector.landmark_tracker is not None,
+        "transient_kb_per_frame": {
+            "mean": float(transient.mean()) / 1024 if len(transient) else 0.0,
+            "p95": float(np.percentile(transient, 95)) / 1024 if len(transient) else 0.0,
+        },
+        "retained_growth_bytes_per_frame": growth,
+        # Noise from the capture thread is well under a frame buffer; real leaks show up as a steady slope
+        "no_growth": growth < 64,
+        "gc_collections": collections,
+        "gc_collections_per_s_at_30fps": [30.0 * c / steady for c in collections],
+    }
+
+
+def bench_decision(args):
+    """Time the ratio-to-trigger decision alone over a recorded (or synthetic) timeline"""
+    if args.timeline:
+        timeline = GazeTimeline.load(args.timeline)
+    else:
+        # Synthetic 30 FPS session: a slow random walk of the ratios with occasional face loss
+        rng = np.random.default_rng(0)
+        n = args.frames
+        timestamp = np.arange(n) / 30.0
+        l_ratio = 0.45 + 0.2 * np.sin(np.cumsum(rng.normal(0, 0.05, n)))
+        r_ratio = l_ratio + rng.normal(0, 0.02, n)
+        timeline = GazeTimeline.from_arrays(timestamp, l_ratio, r_ratio, rng.random(n) > 0.05)
+
+    engine = TriggerEngine(args.threshold, args.timer)
+    timestamp, l_ratio, r_ratio, face, confidence = timeline.arrays()
+
+    stages = StageTimer()
+    for i in range(len(timestamp)):
+        stages.start_frame()
+        engine.update(float(timestamp[i]), float(l_ratio[i]), float(r_ratio[i]), bool(face[i]), float(confidence[i]))
+        stages.lap("decision")
+        stages.end_frame()
+
+    started = time.perf_counter()
+    result = engine.batch(timestamp, l_ratio, r_ratio, face, confidence)
+    batch_time = time.perf_counter() - started
+
+    return {
+        "mode": "decision",
+        "source": args.timeline or "synthetic",
+        "frames": len(timestamp),
+        "stages": stages.summary(),
+        "batch_time_s": batch_time,
+        "batch_samples_per_s": len(timestamp) / batch_time if batch_time else 0.0,
+        "triggers": len(result["triggers"]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Charlie-Kirkification detection pipeline")
+    parser.add_argument("--source", help="Video file or image folder to replay (default: assets/spam, or the camera for --resume)")
+    parser.add_argument("--timeline", help="Recorded gaze timeline (.npz) for a decision-only run")
+    parser.add_argument("--decision-only", action="store_true", help="Skip capture and inference")
+    parser.add_argument("--resume", action="store_true", help="Measure stop/start resume latency")
+    parser.add_argument("--cycles", type=int, default=5, help="Stop/start cycles for --resume")
+    parser.add_argument("--frames", type=int, default=300, help="Frames (or synthetic samples) to process")
+    parser.add_argument("--config", default="config.json", help="Config file to start from")
+    parser.add_argument("--no-roi", action="store_true", help="Disable face-ROI cropping")
+    parser.add_argument("--tracking", action="store_true", help="Track eye points with optical flow between inferences")
+    parser.add_argument("--compare-tracking", action="store_true",
+                        help="Run with and without tracking and compare inference calls, ratios and triggers")
+    parser.add_argument("--fps", type=float, default=30.0, help="Nominal source frame rate for --compare-tracking")
+    parser.add_argument("--estimator", choices=["facemesh", "face-landmarker", "eye-region"], help="Gaze backend to run")
+    parser.add_argument("--compare-estimators", action="store_true",
+                        help="Run every gaze backend on the same frames and compare cost and accuracy")
+    parser.add_argument("--compare-pipeline", action="store_true",
+                        help="Run with and without the multi-process pipeline and compare FPS and decisions")
+    parser.add_argument("--alloc", action="store_true", help="Measure per-frame allocation and GC pressure with tracemalloc")
+    parser.add_argument("--threshold", type=float, default=0.35, help="iris_threshold for decision-only runs")
+    parser.add_argument("--timer", type=float, default=2.0, help="timer for decision-only runs")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    if args.timeline or args.decision_only:
+        results = bench_decision(args)
+    elif args.resume:
+        results = bench_resume(args)
+    elif args.compare_tracking:
+        args.source = args.source or "assets/spam"
+        results = bench_tracking(args)
+    elif args.compare_pipeline:
+        args.source = args.source or "assets/spam"
+        results = bench_pipelined(args)
+    elif args.alloc:
+        args.source = args.source or "assets/spam"
+        results = bench_alloc(args)
+    elif args.compare_estimators:
+        args.source = args.source or "assets/spam"
+        results = bench_estimators(args)
+    else:
+        args.source = args.source or "assets/spam"
+        results = bench_pipeline(args)
+
+    results["peak_rss_mb"] = peak_rss_mb()
+    results["python"] = platform.python_version()
+    results["platform"] = platform.platform()
+
+    text = json.dumps(results, indent=4)
+    print(text)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,22 @@
+import math
+import numpy as np
+
+
+class ReusableBuffer:
+    """One growable allocation that hands out contiguous arrays of any shape
+
+    view(shape) returns an array over the start of the buffer and only
+    reallocates when a larger shape is asked for, so per-frame images whose
+    size changes from frame to frame (face crops) share a single block.
+    A view is valid until the next call to view().
+    """
+
+    def __init__(self, dtype=np.uint8):
+        self.dtype = np.dtype(dtype)
+        self._data = np.empty(0, dtype=self.dtype)
+
+    def view(self, shape):
+        size = math.prod(shape)
+        if size > self._data.size:
+            self._data = np.empty(size, dtype=self.dtype)
+        return self._data[:size].reshape(shape)
@@ -0,0 +1,320 @@
+import bisect
+import time
+import numpy as np
+
+LOOKING_UP = "up"
+LOOKING_DOWN = "down"
+
+# Guided calibration: what the user is asked to do in each half, in order
+PHASES = [
+    (LOOKING_UP, "Look at your screen as you normally would"),
+    (LOOKING_DOWN, "Look down at your phone as if you were scrolling"),
+]
+
+
+class P2Quantile:
+    """Streaming estimate of one quantile in constant memory (Jain & Chlamtac's P² algorithm)
+
+    Five markers track the minimum, the maximum, the p-quantile and two
+    points between. Each add() shifts the middle markers by at most one
+    position with a parabolic step (linear where that would break their
+    order), so memory and time per sample are constant. Exact until the
+    sixth sample.
+    """
+
+    def __init__(self, p):
+        self.p = p
+        self.count = 0
+        self.heights = []
+        self.positions = [0, 1, 2, 3, 4]
+        self.desired = [0, 2 * p, 4 * p, 2 + 2 * p, 4]
+        self.increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def add(self, x):
+        self.count += 1
+        q = self.heights
+        if self.count <= 5:
+            bisect.insort(q, x)
+            return
+
+        # Cell k holds x (q[k] <= x < q[k + 1]); every marker above it moves up one position
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = bisect.bisect_right(q, x) - 1
+        n = self.positions
+        for i in range(k + 1, 5):
+            n[i] += 1
+        desired = self.desired
+        for i in range(5):
+            desired[i] += self.increments[i]
+
+        for i in (1, 2, 3):
+            d = desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                height = q[i] + d / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                    + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+                )
+                if not q[i - 1] < height < q[i + 1]:
+                    height = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = height
+                n[i] += d
+
+    def value(self):
+        """The current estimate, or None before the first sample"""
+        if self.count == 0:
+            return None
+        if self.count <= 5:
+            return self.heights[round(self.p * (self.count - 1))]
+        return self.heights[2]
+
+
+class ThresholdCalibrator:
+    """Derive iris_threshold and a hysteresis band from labelled ratio samples
+
+    Per eye and per state (looking up or down), two P² estimators follow
+    the median and the tail that faces the other state: the 10th
+    percentile while looking up, the 90th while looking down. The
+    threshold for an eye sits midway between those tails, and the
+    hysteresis band is `hysteresis_fraction` of the gap between them. If
+    the tails overlap, the threshold falls back to midway between the
+    medians with no band. The two eyes' values are averaged, since the
+    trigger needs both eyes below one threshold.
+
+    Memory is constant (eight estimators of five markers); add() costs four
+    estimator updates.
+    """
+
+    def __init__(self, hysteresis_fraction=0.25, min_samples=150):
+        self.hysteresis_fraction = hysteresis_fraction
+        self.min_samples = min_samples
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        # state -> eye -> (median, tail)
+        self.estimators = {
+            LOOKING_UP: [(P2Quantile(0.5), P2Quantile(0.1)) for _ in range(2)],
+            LOOKING_DOWN: [(P2Quantile(0.5), P2Quantile(0.9)) for _ in range(2)],
+        }
+
+    def add(self, l_ratio, r_ratio, state):
+        """Feed one sample of both eyes, taken while looking `state` (LOOKING_UP or LOOKING_DOWN)"""
+        self.count += 1
+        for (median, tail), ratio in zip(self.estimators[state], (l_ratio, r_ratio)):
+            median.add(ratio)
+            tail.add(ratio)
+
+    def samples(self, state):
+        return self.estimators[state][0][0].count
+
+    @property
+    def ready(self):
+        return min(self.samples(LOOKING_UP), self.samples(LOOKING_DOWN)) >= self.min_samples
+
+    def estimate(self):
+        """Return (threshold, hysteresis), or None until both states have `min_samples` samples"""
+        if not self.ready:
+            return None
+        thresholds = []
+        bands = []
+        for up, down in zip(self.estimators[LOOKING_UP], self.estimators[LOOKING_DOWN]):
+            (up_median, up_tail), (down_median, down_tail) = up, down
+            low, high = down_tail.value(), up_tail.value()
+            if high > low:
+                thresholds.append((low + high) / 2)
+                bands.append((high - low) * self.hysteresis_fraction)
+            else:
+                thresholds.append((down_median.value() + up_median.value()) / 2)
+                bands.append(0.0)
+        return sum(thresholds) / 2, sum(bands) / 2
+
+    @property
+    def separated(self):
+        """Whether both eyes' median ratio is lower looking down than looking up"""
+        return all(
+            down[0].value() < up[0].value()
+            for up, down in zip(self.estimators[LOOKING_UP], self.estimators[LOOKING_DOWN])
+        )
+
+    def stats(self):
+        """Return sample counts and the current estimate for the metrics snapshot"""
+        estimate = self.estimate()
+        return {
+            "calibration_up_samples": self.samples(LOOKING_UP),
+            "calibration_down_samples": self.samples(LOOKING_DOWN),
+            "calibrated_threshold": estimate[0] if estimate else None,
+            "calibrated_hysteresis": estimate[1] if estimate else None,
+        }
+
+
+class LiveCalibrator:
+    """Place iris_threshold and a hysteresis band from the unlabelled live ratio stream
+
+    Nothing here knows whether the user was looking up or down, so the
+    estimate never depends on the threshold it replaces. The trigger only
+    looks at the higher of the two iris ratios (both must be below the
+    threshold), so that is what is tracked: a histogram of `bins` buckets up
+    to `top`, whose weights halve every `half_life` samples so the estimate
+    follows changes in light or posture. Looking at the screen and looking
+    down at a phone form two modes. The threshold goes in the deepest
+    valley between them, midway between the high tail (p90) of the lower
+    mode and the low tail (p10) of the upper one, and the band is
+    `hysteresis_fraction` of the gap, as in ThresholdCalibrator. Without a
+    valley at most `valley_depth` times the lower of the two peaks, with at
+    least `min_mode` of the weight on each side, there is no estimate: a
+    user who never looked down has only one mode to split.
+
+    add() is one multiply over the buckets and one add, a few microseconds.
+    """
+
+    def __init__(self, hysteresis_fraction=0.25, min_samples=300, half_life=18000,
+                 bins=50, top=1.0, min_mode=0.03, valley_depth=0.5):
+        self.hysteresis_fraction = hysteresis_fraction
+        self.min_samples = min_samples
+        self.decay = 0.5 ** (1 / half_life)
+        self.bins = bins
+        self.bucket_width = top / bins
+        self.min_mode = min_mode
+        self.valley_depth = valley_depth
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.weights = np.zeros(self.bins)
+
+    def add(self, l_ratio, r_ratio):
+        """Feed one sample of both eyes"""
+        self.count += 1
+        self.weights *= self.decay
+        bucket = int(max(l_ratio, r_ratio) / self.bucket_width)
+        self.weights[min(max(bucket, 0), self.bins - 1)] += 1.0
+
+    def estimate(self):
+        """Return (threshold, hysteresis), or None until there are `min_samples` samples in two separate modes"""
+        if self.count < self.min_samples:
+            return None
+        # Smoothed, so one sparse bucket inside a mode is not taken for a valley
+        density = np.convolve(self.weights, [1, 2, 3, 2, 1], mode="same") / 9
+        cdf = np.cumsum(self.weights) / self.weights.sum()
+        valley = None
+        for bucket in range(1, self.bins - 1):
+            if not self.min_mode <= cdf[bucket] <= 1 - self.min_mode:
+                continue
+            peak = min(density[:bucket].max(), density[bucket + 1:].max())
+            depth = density[bucket] / peak if peak > 0 else 1.0
+            if valley is None or depth < valley[0]:
+                valley = depth, bucket
+        if valley is None or valley[0] > self.valley_depth:
+            return None
+
+        split = cdf[valley[1]]
+        edges = np.arange(self.bins + 1) * self.bucket_width
+        cdf = np.concatenate([[0.0], cdf])
+        low = float(np.interp(0.9 * split, cdf, edges))
+        high = float(np.interp(split + 0.1 * (1 - split), cdf, edges))
+        return (low + high) / 2, max(high - low, 0.0) * self.hysteresis_fraction
+
+    def stats(self):
+        """Return the sample count and the current estimate for the metrics snapshot"""
+        estimate = self.estimate()
+        return {
+            "calibration_samples": self.count,
+            "calibrated_threshold": estimate[0] if estimate else None,
+            "calibrated_hysteresis": estimate[1] if estimate else None,
+        }
+
+
+class GuidedCalibration:
+    """A timed calibration: half of `seconds` looking at the screen, half looking down
+
+    add() is fed every sample from the detection loop and labels the ones
+    with a face by the phase they fall in. The first `settle` seconds of each
+    phase are skipped while the user moves their eyes. `on_prompt(message)`
+    is called with each phase's instruction as it starts.
+    """
+
+    def __init__(self, seconds=60.0, settle=3.0, hysteresis_fraction=0.25, min_samples=30, on_prompt=None):
+        self.phase_seconds = seconds / len(PHASES)
+        self.settle = settle
+        self.on_prompt = on_prompt
+        self.calibrator = ThresholdCalibrator(hysteresis_fraction, min_samples)
+        self.started = None
+        self.phase = -1
+
+    @property
+    def finished(self):
+        return self.phase >= len(PHASES)
+
+    def add(self, timestamp, l_ratio, r_ratio):
+        """Feed one sample (ratios may be None without a face), return True once the last phase is over"""
+        if self.started is None:
+            self.started = timestamp
+        elapsed = timestamp - self.started
+        phase = int(elapsed // self.phase_seconds)
+        if phase != self.phase:
+            self.phase = phase
+            if not self.finished:
+                self.prompt(PHASES[phase][1])
+        if self.finished:
+            return True
+        if l_ratio is not None and elapsed - phase * self.phase_seconds >= self.settle:
+            self.calibrator.add(l_ratio, r_ratio, PHASES[phase][0])
+        return False
+
+    def prompt(self, message):
+        print(f"Calibration: {message}")
+        if self.on_prompt:
+            self.on_prompt(message)
+
+    def result(self):
+        """Return {"iris_threshold", "iris_hysteresis"}, or None if a phase saw too few faces
+        or looking down did not lower the ratios (the user did not follow the prompts)
+        """
+        estimate = self.calibrator.estimate()
+        if estimate is None or not self.calibrator.separated:
+            return None
+        threshold, hysteresis = estimate
+        return {"iris_threshold": round(float(threshold), 3), "iris_hysteresis": round(float(hysteresis), 3)}
+
+
+if __name__ == "__main__":
+    # Check the estimators against exact quantiles on synthetic ratios: python calibration.py
+    rng = np.random.default_rng(0)
+    up = rng.normal(0.5, 0.05, 20000)
+    down = rng.normal(0.25, 0.04, 8000)
+    for p, values in [(0.1, up), (0.5, up), (0.9, down)]:
+        estimator = P2Quantile(p)
+        for value in values:
+            estimator.add(float(value))
+        print(f"p={p}: P² {estimator.value():.4f}, exact {np.quantile(values, p):.4f}")
+
+    calibrator = ThresholdCalibrator()
+    samples = [(float(a), float(b), LOOKING_UP) for a, b in zip(up, up[::-1])] + [(float(a), float(b), LOOKING_DOWN) for a, b in zip(down, down[::-1])]
+    started = time.perf_counter()
+    for l_ratio, r_ratio, state in samples:
+        calibrator.add(l_ratio, r_ratio, state)
+    per_sample = (time.perf_counter() - started) / len(samples)
+    threshold, hysteresis = calibrator.estimate()
+    print(f"Threshold {threshold:.3f}, hysteresis {hysteresis:.3f}, {per_sample * 1e6:.1f} µs per sample")
+
+    # Live: the same ratios unlabelled and shuffled (a quarter of the time looking down), then up only
+    live = LiveCalibrator()
+    mixed = np.concatenate([up[:6000], down[:2000]])
+    rng.shuffle(mixed)
+    started = time.perf_counter()
+    for ratio in mixed:
+        live.add(float(ratio), float(ratio))
+    per_sample = (time.perf_counter() - started) / len(mixed)
+    threshold, hysteresis = live.estimate()
+    print(f"Live threshold {threshold:.3f}, hysteresis {hysteresis:.3f}, {per_sample * 1e6:.1f} µs per sample")
+    live.reset()
+    for ratio in up[:8000]:
+        live.add(float(ratio), float(ratio))
+    print(f"Live, never looking down: {live.estimate()}")
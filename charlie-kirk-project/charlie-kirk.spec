@@ -14,6 +14,7 @@ a = Analysis(
         'cv2',
         'pygame',
         'PIL',
+        'detector',
     ],
     hookspath=[],
     hooksconfig={},
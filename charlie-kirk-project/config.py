@@ -0,0 +1,299 @@
+import json
+import os
+import threading
+from pathlib import Path
+
+DEFAULT_CONFIG = {
+    "timer": 2.0,
+    "iris_threshold": 0.35,
+    "iris_hysteresis": 0.0,
+    "auto_calibrate": False,
+    "calibration_seconds": 60.0,
+    "calibration_hysteresis": 0.25,
+    "calibration_min_samples": 300,
+    "calibration_half_life": 18000,
+    "spam_loops": 4,
+    "sound_enabled": True,
+    "sound_path": "./assets/we-are-charlie-kirk-song.mp3",
+    "start_minimized": False,
+    "frame_source": 0,
+    "capture_width": None,
+    "capture_height": None,
+    "capture_fourcc": None,
+    "capture_buffer_size": 1,
+    "max_fps": 30,
+    "idle_interval": 0.25,
+    "no_face_interval": 0.5,
+    "scheduler_near_margin": 0.1,
+    "scheduler_far_margin": 0.3,
+    "scheduler_backoff": 1.5,
+    "cpu_budget_percent": 0.0,
+    "capture_scale": 1.0,
+    "pipeline_enabled": False,
+    "pipeline_slots": 4,
+    "gaze_estimator": "facemesh",
+    "face_landmarker_model": "./assets/face_landmarker.task",
+    "roi_tracking": True,
+    "roi_padding": 0.3,
+    "roi_inference_size": 256,
+    "roi_compare": False,
+    "tracking_enabled": False,
+    "tracking_full_every": 5,
+    "tracking_min_confidence": 0.6,
+    "tracking_motion_threshold": 2.0,
+    "trigger_min_confidence": 0.0,
+    "eye_region_ratio_scale": 1.0,
+    "eye_region_ratio_offset": 0.0,
+    "preview": "in-process",
+    "timeline_capacity": 36000,
+    "timeline_path": None,
+    "metrics_enabled": False,
+    "metrics_path": "metrics.prom",
+    "metrics_interval": 5.0,
+    "session_log_enabled": False,
+    "session_log_dir": "logs",
+    "session_log_max_mb": 64,
+    "session_log_flush_interval": 5.0,
+    "profile_seconds": 10.0,
+    "profile_dir": "profiles",
+    "profile_sample_interval": 0.005,
+    "profile_cprofile": False,
+    "spam_cache_mb": 64,
+    "notify_on_trigger": False,
+    "action_log_path": None,
+    "webhook_url": None,
+    "action_min_interval": 0.0,
+    "webhook_min_interval": 10.0,
+    "action_queue_size": 8,
+    "cancel_on_look_up": False,
+    "audio_stream_threshold_kb": 512,
+    "startup_report": False,
+    "warm_grace_period": 30.0,
+}
+
+# key: (type, minimum, maximum[, other allowed values]) or (type, allowed values);
+# None values are allowed where the default is None
+CONFIG_SCHEMA = {
+    "timer": (float, 0.0, 600.0),
+    "iris_threshold": (float, 0.0, 2.0),
+    "iris_hysteresis": (float, 0.0, 1.0),
+    "auto_calibrate": (bool,),
+    "calibration_seconds": (float, 10.0, 600.0),
+    "calibration_hysteresis": (float, 0.0, 0.5),
+    "calibration_min_samples": (int, 10, 1_000_000),
+    "calibration_half_life": (int, 100, 10_000_000),
+    "spam_loops": (int, 0, 100),
+    "sound_enabled": (bool,),
+    "sound_path": (str,),
+    "start_minimized": (bool,),
+    "capture_width": (int, 1, 8192),
+    "capture_height": (int, 1, 8192),
+    "capture_fourcc": (str,),
+    "capture_buffer_size": (int, 1, 64),
+    "max_fps": (float, 1.0, 240.0),
+    "idle_interval": (float, 0.0, 10.0),
+    "no_face_interval": (float, 0.0, 10.0),
+    "scheduler_near_margin": (float, 0.0, 2.0),
+    "scheduler_far_margin": (float, 0.0, 2.0),
+    # Below 1 the interval could never grow back to the idle rate
+    "scheduler_backoff": (float, 1.0, 10.0),
+    "cpu_budget_percent": (float, 0.0, 6400.0),
+    "capture_scale": (float, 0.1, 1.0),
+    "pipeline_enabled": (bool,),
+    "pipeline_slots": (int, 4, 64),
+    "gaze_estimator": (str, ["facemesh", "face-landmarker", "eye-region"]),
+    "face_landmarker_model": (str,),
+    "roi_tracking": (bool,),
+    "roi_padding": (float, 0.0, 2.0),
+    "roi_inference_size": (int, 32, 4096, [0]),
+    "roi_compare": (bool,),
+    "tracking_enabled": (bool,),
+    "tracking_full_every": (int, 1, 1000),
+    "tracking_min_confidence": (float, 0.0, 1.0),
+    "tracking_motion_threshold": (float, 0.0, 255.0),
+    "trigger_min_confidence": (float, 0.0, 1.0),
+    "eye_region_ratio_scale": (float, 0.1, 10.0),
+    "eye_region_ratio_offset": (float, -1.0, 1.0),
+    "preview": (str, ["off", "in-process", "process"]),
+    "timeline_capacity": (int, 1, 100_000_000),
+    "timeline_path": (str,),
+    "metrics_enabled": (bool,),
+    "metrics_path": (str,),
+    "metrics_interval": (float, 0.1, 3600.0),
+    "session_log_enabled": (bool,),
+    "session_log_dir": (str,),
+    "session_log_max_mb": (float, 0.1, 65536.0),
+    "session_log_flush_interval": (float, 0.1, 3600.0),
+    "profile_seconds": (float, 0.1, 3600.0),
+    "profile_dir": (str,),
+    "profile_sample_interval": (float, 0.0, 1.0),
+    "profile_cprofile": (bool,),
+    "spam_cache_mb": (float, 1.0, 4096.0),
+    "notify_on_trigger": (bool,),
+    "action_log_path": (str,),
+    "webhook_url": (str,),
+    "action_min_interval": (float, 0.0, 3600.0),
+    "webhook_min_interval": (float, 0.0, 3600.0),
+    "action_queue_size": (int, 1, 1000),
+    "cancel_on_look_up": (bool,),
+    "audio_stream_threshold_kb": (float, 0.0, 1_000_000.0),
+    "startup_report": (bool,),
+    "warm_grace_period": (float, 0.0, 3600.0),
+}
+
+# Settings that only take effect when detection is restarted (they re-open the camera)
+RESTART_KEYS = ["frame_source", "capture_width", "capture_height", "capture_fourcc", "capture_buffer_size"]
+
+# Confidence a gaze backend's samples need before the trigger uses them, whatever trigger_min_confidence
+# says (eye-region reports a poor lid fit as low confidence)
+BACKEND_MIN_CONFIDENCE = {"eye-region": 0.4}
+
+_listeners = {}
+_listeners_lock = threading.Lock()
+
+
+def validate_config(config):
+    """Return a copy of config with every known key type-checked and range-checked
+
+    Missing or invalid values fall back to the default (with a warning);
+    unknown keys are kept as they are.
+    """
+    result = dict(DEFAULT_CONFIG)
+    for key, value in config.items():
+        schema = CONFIG_SCHEMA.get(key)
+        if schema is None or (value is None and DEFAULT_CONFIG.get(key) is None):
+            result[key] = value
+            continue
+
+        kind = schema[0]
+        try:
+            if kind is bool:
+                if not isinstance(value, bool):
+                    raise ValueError("expected true or false")
+            elif kind in (int, float):
+                if isinstance(value, bool):
+                    raise ValueError("expected a number")
+                if kind is int and isinstance(value, float) and not value.is_integer():
+                    raise ValueError("expected a whole number")
+                value = kind(value)
+                extra = schema[3] if len(schema) == 4 else []
+                if len(schema) >= 3 and not schema[1] <= value <= schema[2] and value not in extra:
+                    raise ValueError(f"expected {schema[1]} to {schema[2]}" + "".join(f" or {v}" for v in extra))
+            elif kind is str:
+                if not isinstance(value, str):
+                    raise ValueError("expected a string")
+                if len(schema) == 2 and value not in schema[1]:
+                    raise ValueError(f"expected one of {schema[1]}")
+        except (TypeError, ValueError) as e:
+            print(f"Invalid config value {key}={value!r} ({e}), using {DEFAULT_CONFIG[key]!r}")
+            continue
+        result[key] = value
+    return result
+
+
+def trigger_min_confidence(config):
+    """The trigger's confidence floor: trigger_min_confidence, raised to the backend's own minimum"""
+    return max(config["trigger_min_confidence"], BACKEND_MIN_CONFIDENCE.get(config["gaze_estimator"], 0.0))
+
+
+def read_config(path="config.json"):
+    """Load and validate configuration from a JSON file, raising OSError or ValueError if it cannot be read"""
+    with open(path, 'r') as f:
+        config = json.load(f)
+    if not isinstance(config, dict):
+        raise ValueError("expected a JSON object")
+    return validate_config(config)
+
+
+def load_config(path="config.json"):
+    """Load and validate configuration from a JSON file, falling back to defaults"""
+    try:
+        return read_config(path)
+    except FileNotFoundError:
+        return dict(DEFAULT_CONFIG)
+    except (ValueError, OSError) as e:
+        print(f"Error loading config: {e}")
+        return dict(DEFAULT_CONFIG)
+
+
+def save_config(config, path="config.json"):
+    """Validate and atomically write configuration, then notify in-process listeners"""
+    config = validate_config(config)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(config, f, indent=4)
+    os.replace(tmp_path, path)
+    _notify(path, config)
+    return config
+
+
+def subscribe(path, callback):
+    """Call callback(config) whenever save_config writes `path` in this process"""
+    with _listeners_lock:
+        _listeners.setdefault(_key(path), []).append(callback)
+
+
+def unsubscribe(path, callback):
+    with _listeners_lock:
+        callbacks = _listeners.get(_key(path), [])
+        if callback in callbacks:
+            callbacks.remove(callback)
+
+
+def _notify(path, config):
+    with _listeners_lock:
+        callbacks = list(_listeners.get(_key(path), []))
+    for callback in callbacks:
+        callback(dict(config))
+
+
+def _key(path):
+    return str(Path(path).resolve())
+
+
+class ConfigWatcher:
+    """Poll the config file's mtime and call callback(config) when it is edited outside the app
+
+    An edit that does not parse is logged and skipped rather than applied as
+    the defaults.
+    """
+
+    def __init__(self, path, callback, interval=1.0):
+        self.path = path
+        self.callback = callback
+        self.interval = interval
+        self._mtime = self._current_mtime()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._mtime = self._current_mtime()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def _current_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            mtime = self._current_mtime()
+            if mtime != self._mtime:
+                self._mtime = mtime
+                try:
+                    config = read_config(self.path)
+                except (ValueError, OSError) as e:
+                    # Likely a half-written save; the next write changes the mtime again
+                    print(f"Error reloading config, keeping the current settings: {e}")
+                    continue
+                self.callback(config)
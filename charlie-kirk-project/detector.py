@@ -1,61 +1,422 @@
 import cv2
-import mediapipe as mp
-import pygame
-import json
-from PIL import Image
 from pathlib import Path
 import time
 import threading
+from frame_source import create_frame_source
+from scheduler import FrameScheduler
+import numpy as np
+from buffers import ReusableBuffer
+from gaze import iris_ratios, mirror_points
+from estimators import create_estimator
+from pipeline import InferencePipeline
+from tracking import SOURCE_INFERENCE, LandmarkTracker
+from preview import ESC_KEY, create_preview
+from timeline import GazeTimeline, TriggerEngine
+from audio import AudioPlayer
+from spam import SpamImageCache, SpamOverlay
+from actions import ActionDispatcher, LogAction, NotificationAction, OverlayAction, SoundAction, WebhookAction
+from metrics import DetectorMetrics, MetricsExporter, NullMetrics
+from sessionlog import DOWN, FACE, TRIGGER, SessionLog
+from resources import WarmResourcePool
+from profiler import ProfileCapture, TracingStageTimer, span
+from governor import CPUGovernor
+from calibration import GuidedCalibration, LiveCalibrator
+from config import RESTART_KEYS, ConfigWatcher, load_config, save_config, subscribe, trigger_min_confidence
 
 
 class CharlieKirkDetector:
     def __init__(self, config_path="config.json"):
         self.config_path = config_path
-        self.config = self.load_config()
+        self.config = load_config(config_path)
+        # What the user configured; self.config is this with the CPU governor's limits applied
+        self.base_config = self.config
+        self._pending_config = None
 
         # Initialize components
-        pygame.mixer.init()
-        self.sound = None
+        self.audio = AudioPlayer(stream_threshold=self.config.get("audio_stream_threshold_kb", 512) * 1024)
         self.load_sound()
 
-        self.face_mesh_landmarks = mp.solutions.face_mesh.FaceMesh(refine_landmarks=True)
+        self.estimator = None
+        self.landmark_tracker = None
+        self.setup_tracking()
         self.spam_folder = Path("assets/spam")
+        self.spam_cache = SpamImageCache(self.spam_folder, max_bytes=self.config.get("spam_cache_mb", 64) * 1024 * 1024)
+        self.spam_overlay = SpamOverlay(self.spam_cache)
+        # Trigger side effects run on the dispatcher's thread; the detection loop only enqueues
+        self.notifier = None
+        self.actions = ActionDispatcher(max_queue=self.config.get("action_queue_size", 8))
+        self.setup_actions()
 
         # Detection state
-        self.timer_started = None
-        self.playing = False
+        self.timeline = GazeTimeline(self.config.get("timeline_capacity", 36000))
+        self.trigger_engine = TriggerEngine(
+            self.config["iris_threshold"], self.config["timer"], trigger_min_confidence(self.config),
+            self.config["iris_hysteresis"],
+        )
+        # Live threshold calibration (auto_calibrate) and the guided one-minute calibration, when running
+        self.calibrator = None
+        self.setup_calibration()
+        self.calibration = None
+        self._on_calibrated = None
         self.running = False
-        self.cam = None
+        self.source = None
+        self.prepared_source = None
+        # Keys the open source and the built backend were made with; config changes can outrun them
+        self._source_key_in_use = None
+        self._prepared_source_key = None
+        self._model_key_in_use = None
+        self.preview = None
         self.detection_thread = None
+        self.last_frame_time = None
+        self.resume_latency = None
+        self._start_requested = None
 
-    def load_config(self):
-        """Load configuration from JSON file"""
-        try:
-            with open(self.config_path, 'r') as f:
-                return json.load(f)
-        except FileNotFoundError:
-            return {
-                "timer": 2.0,
-                "iris_threshold": 0.35,
-                "spam_loops": 4,
-                "sound_enabled": True,
-                "sound_path": "./assets/we-are-charlie-kirk-song.mp3",
-                "start_minimized": False
-            }
+        # Camera handle and FaceMesh graph stay warm for a grace period after stop
+        self.resource_pool = WarmResourcePool(self.config["warm_grace_period"])
+
+        # Metrics double as the stage timer; both are no-ops when metrics are off
+        self.metrics = NullMetrics()
+        self.metrics_exporter = None
+        self.setup_metrics()
+        self.stages = self.metrics
+        self.profile_capture = None
+        self.session_log = None
+        self.setup_session_log()
+        self.scheduler = FrameScheduler(self.config)
+        # Per-frame scratch space, reused so the hot path does not allocate
+        self._scaled = ReusableBuffer()
+        self._points = np.empty((6, 2), dtype=np.float64)
+        self.governor = None
+        self.setup_governor()
+        self._ensure_model()
+
+        # Pick up settings saved from the tray (in-process) or edited in config.json (mtime watcher)
+        subscribe(config_path, self.apply_config)
+        self.config_watcher = ConfigWatcher(config_path, self.apply_config)
 
     def reload_config(self):
-        """Reload configuration (call after settings change)"""
-        self.config = self.load_config()
+        """Reload configuration from disk (call after settings change)"""
+        self._apply_config(load_config(self.config_path))
+
+    def apply_config(self, config):
+        """Apply new settings without stopping capture or rebuilding FaceMesh
+
+        While detection is running the detection loop picks the change up
+        between frames; otherwise it is applied right away.
+        """
+        if config == self.base_config:
+            return
+        if self.running:
+            self._pending_config = config
+        else:
+            self._apply_config(config)
+
+    def _apply_config(self, config):
+        budget_changed = config["cpu_budget_percent"] != self.base_config["cpu_budget_percent"]
+        self.base_config = config
+        if budget_changed:
+            self.setup_governor()
+        if self.governor is not None:
+            config = self.governor.govern(config)
+        old = self.config
+        self.config = config
+
+        self.scheduler.apply_config(config)
+        self.resource_pool.grace_period = config["warm_grace_period"]
+        self.trigger_engine.threshold = config["iris_threshold"]
+        self.trigger_engine.timer = config["timer"]
+        self.trigger_engine.min_confidence = trigger_min_confidence(config)
+        self.trigger_engine.hysteresis = config["iris_hysteresis"]
+        if any(old.get(key) != config.get(key) for key in [
+            "auto_calibrate", "calibration_hysteresis", "calibration_min_samples", "calibration_half_life",
+        ]):
+            self.setup_calibration()
+        self._apply_calibration()
+        pipelined = isinstance(self.estimator, InferencePipeline)
+        backend_changed = any(old.get(key) != config.get(key) for key in ["gaze_estimator", "face_landmarker_model"])
+        if old.get("pipeline_enabled") != config["pipeline_enabled"] or (backend_changed and not pipelined):
+            # Swapping backends mid-session is fine: the loop calls this between frames.
+            # Taking from the pool also drops a parked backend built with the old settings
+            self.resource_pool.take("model", self._model_key())
+            if self.estimator is not None:
+                self.estimator.close()
+                self.estimator = None
+            self._ensure_model()
+        elif backend_changed or any(old.get(key) != config.get(key) for key in [
+            "roi_tracking", "roi_padding", "roi_inference_size", "roi_compare",
+            "eye_region_ratio_scale", "eye_region_ratio_offset",
+        ]) or (pipelined and old.get("capture_scale") != config["capture_scale"]):
+            # A pipeline passes these on to its inference process, which rebuilds the backend if needed
+            self.setup_roi()
+        if any(old.get(key) != config.get(key) for key in [
+            "tracking_enabled", "tracking_full_every", "tracking_min_confidence", "tracking_motion_threshold",
+        ]):
+            self.setup_tracking()
+        if any(old.get(key) != config.get(key) for key in ["metrics_enabled", "metrics_path", "metrics_interval"]):
+            self.setup_metrics()
+            tracing = isinstance(self.stages, TracingStageTimer)
+            self._set_stages(TracingStageTimer(self.metrics, self.profile_capture) if tracing else self.metrics)
+        if any(old.get(key) != config.get(key) for key in [
+            "session_log_enabled", "session_log_dir", "session_log_max_mb", "session_log_flush_interval",
+        ]):
+            self.setup_session_log()
+        self.spam_cache.max_bytes = config["spam_cache_mb"] * 1024 * 1024
+        self.audio.stream_threshold = config["audio_stream_threshold_kb"] * 1024
         self.load_sound()
+        if any(old.get(key) != config.get(key) for key in [
+            "sound_enabled", "spam_loops", "notify_on_trigger", "action_log_path", "webhook_url",
+            "action_min_interval", "webhook_min_interval", "action_queue_size",
+        ]):
+            self.setup_actions()
+
+        if self.preview is not None and self.running and old.get("preview") != config["preview"]:
+            # Only reached from the detection loop, which owns the preview
+            self.preview.close()
+            self.preview = create_preview(config["preview"])
+
+        restart = [key for key in RESTART_KEYS if old.get(key) != config.get(key)]
+        if restart:
+            print(f"Restart detection to apply: {', '.join(restart)}")
+
+    def setup_roi(self):
+        """Pass ROI cropping, the ROI comparison and the eye-region ratio mapping on to the backend"""
+        if self.estimator is not None:
+            self.estimator.configure(self.config)
+            # A pipeline rebuilds its backend from these settings in the inference process
+            self._model_key_in_use = self._model_key()
+
+    def setup_tracking(self):
+        """Turn optical-flow tracking between full inferences on or off from config"""
+        if not self.config.get("tracking_enabled", False):
+            self.landmark_tracker = None
+            return
+
+        self.landmark_tracker = LandmarkTracker(
+            full_every=self.config.get("tracking_full_every", 5),
+            min_confidence=self.config.get("tracking_min_confidence", 0.6),
+            motion_threshold=self.config.get("tracking_motion_threshold", 2.0),
+        )
+
+    def setup_calibration(self):
+        """Start live threshold calibration from scratch, or turn it off, from config"""
+        if not self.config.get("auto_calibrate", False):
+            self.calibrator = None
+            return
+        self.calibrator = LiveCalibrator(
+            self.config.get("calibration_hysteresis", 0.25),
+            self.config.get("calibration_min_samples", 300),
+            self.config.get("calibration_half_life", 18000),
+        )
+
+    def _apply_calibration(self):
+        """Let the trigger use the live calibration's threshold and band while it sees two separate modes"""
+        estimate = self.calibrator.estimate() if self.calibrator is not None else None
+        if estimate is None:
+            estimate = self.config["iris_threshold"], self.config["iris_hysteresis"]
+        self.trigger_engine.threshold, self.trigger_engine.hysteresis = estimate
+
+    def start_calibration(self, on_prompt=None, on_done=None):
+        """Run the guided calibration on the next frames (detection must be running)
+
+        `on_prompt(message)` gets each instruction (default: the notifier);
+        `on_done(result)` gets the saved {"iris_threshold", "iris_hysteresis"},
+        or None if too few frames had a face.
+        """
+        if on_prompt is None and self.notifier:
+            on_prompt = lambda message: self.notifier(message, "Calibration")
+        self._on_calibrated = on_done
+        self.calibration = GuidedCalibration(
+            self.config["calibration_seconds"],
+            hysteresis_fraction=self.config["calibration_hysteresis"],
+            on_prompt=on_prompt,
+        )
+
+    def _finish_calibration(self):
+        """Save the guided calibration's result; config listeners (this detector too) pick it up"""
+        calibration, self.calibration = self.calibration, None
+        result = calibration.result()
+        if result is None:
+            calibration.prompt("Calibration failed: could not tell looking at the screen from looking down. Try again")
+        else:
+            calibration.prompt(
+                f"Calibrated: threshold {result['iris_threshold']:.2f}, hysteresis {result['iris_hysteresis']:.2f}"
+            )
+            try:
+                save_config(dict(self.base_config, **result), self.config_path)
+            except OSError as e:
+                print(f"Error saving calibration: {e}")
+        if self._on_calibrated:
+            self._on_calibrated(result)
+
+    def setup_governor(self):
+        """Turn the CPU-budget governor on or off from config (a budget of 0 means no limit)"""
+        budget = self.base_config.get("cpu_budget_percent", 0.0)
+        if not budget:
+            self.governor = None
+        elif self.governor is None:
+            self.governor = CPUGovernor(budget)
+        else:
+            self.governor.budget_percent = budget
+
+    def setup_actions(self):
+        """Build the trigger side effects (sound, overlay, notification, log, webhook) from config"""
+        interval = self.config.get("action_min_interval", 0.0)
+        actions = []
+        if self.config["sound_enabled"]:
+            actions.append(SoundAction(self.audio, interval))
+        actions.append(OverlayAction(self.spam_overlay, self.config["spam_loops"], interval))
+        if self.config.get("notify_on_trigger", False) and self.notifier:
+            actions.append(NotificationAction(self.notifier, interval))
+        if self.config.get("action_log_path"):
+            actions.append(LogAction(self.config["action_log_path"], interval))
+        if self.config.get("webhook_url"):
+            actions.append(WebhookAction(self.config["webhook_url"], min_interval=self.config.get("webhook_min_interval", 10.0)))
+        self.actions.max_queue = self.config.get("action_queue_size", 8)
+        self.actions.set_actions(actions)
+
+    def set_notifier(self, notify):
+        """Use `notify(message, title)` (e.g. the tray icon's) for trigger notifications"""
+        self.notifier = notify
+        self.setup_actions()
+
+    def setup_metrics(self):
+        """Turn live metrics and the snapshot file on or off from config"""
+        if self.metrics_exporter:
+            self.metrics_exporter.stop()
+            self.metrics_exporter = None
+
+        if not self.config.get("metrics_enabled", False):
+            self.metrics = NullMetrics()
+            return
+
+        if not self.metrics.enabled:
+            self.metrics = DetectorMetrics()
+        if self.config.get("metrics_path"):
+            self.metrics_exporter = MetricsExporter(
+                self.metrics,
+                self.config["metrics_path"],
+                interval=self.config.get("metrics_interval", 5.0),
+                source_getter=lambda: self.source,
+            )
+            if self.running:
+                self.metrics_exporter.start()
+
+    def setup_session_log(self):
+        """Turn the binary session history on or off from config"""
+        if self.session_log:
+            self.session_log.close()
+            self.session_log = None
+
+        if self.config.get("session_log_enabled", False):
+            self.session_log = SessionLog(
+                self.config.get("session_log_dir", "logs"),
+                max_bytes=int(self.config.get("session_log_max_mb", 64) * 1024 * 1024),
+                flush_interval=self.config.get("session_log_flush_interval", 5.0),
+            )
+            if self.running:
+                self.session_log.open()
+
+    def stats(self):
+        """Return a metrics snapshot dict, or None when metrics are off"""
+        snapshot = self.metrics.snapshot(self.source)
+        if snapshot is not None and self.governor is not None:
+            snapshot.update(self.governor.stats())
+        if snapshot is not None:
+            snapshot["iris_threshold"] = self.trigger_engine.threshold
+            snapshot["iris_hysteresis"] = self.trigger_engine.hysteresis
+            calibration = self.calibration
+            snapshot["calibrating"] = calibration is not None
+            if calibration is not None:
+                snapshot.update(calibration.calibrator.stats())
+            elif self.calibrator is not None:
+                snapshot.update(self.calibrator.stats())
+        return snapshot
+
+    def start_profiling(self, seconds=None, on_done=None):
+        """Record spans, stack samples and (optionally) cProfile for `seconds`, return the capture
+
+        Files go to config "profile_dir" when the capture ends; `on_done(capture)`
+        is called then. The detection loop picks the capture up between frames.
+        """
+        if self.profile_capture is not None and self.profile_capture.active:
+            return self.profile_capture
+        capture = ProfileCapture(
+            seconds or self.config.get("profile_seconds", 10.0),
+            self.config.get("profile_dir", "profiles"),
+            sample_interval=self.config.get("profile_sample_interval", 0.005),
+            cprofile=self.config.get("profile_cprofile", False),
+            on_done=on_done,
+        )
+        capture.start()
+        self.profile_capture = capture
+        return capture
+
+    def toggle_profiling(self, on_done=None):
+        """Start a profile capture, or end the running one early; return True if one is now running"""
+        if self.profile_capture is not None and self.profile_capture.active:
+            self.profile_capture.stop()
+            return False
+        self.start_profiling(on_done=on_done)
+        return True
+
+    def _trace_frames(self):
+        """Swap the tracing stage timer in while a capture runs, and back out once it ends"""
+        capture = self.profile_capture
+        if capture.active:
+            if not isinstance(self.stages, TracingStageTimer):
+                capture.attach()
+                self._set_stages(TracingStageTimer(self.metrics, capture))
+        else:
+            capture.detach()
+            self.profile_capture = None
+            self._set_stages(self.metrics)
+
+    def _set_stages(self, stages):
+        self.stages = stages
+        if self.estimator is not None:
+            self.estimator.stages = stages
 
     def load_sound(self):
-        """Load sound file"""
-        try:
-            if self.config["sound_enabled"] and Path(self.config["sound_path"]).exists():
-                self.sound = pygame.mixer.Sound(self.config["sound_path"])
-        except Exception as e:
-            print(f"Error loading sound: {e}")
-            self.sound = None
+        """Select the sound file (decoded in the background, and only if it changed)"""
+        if self.config["sound_enabled"]:
+            self.audio.load(self.config["sound_path"])
+
+    def _ensure_model(self):
+        """Build the gaze backend (or the inference pipeline around one) if it was released or never built"""
+        if self.estimator is None:
+            if self.config["pipeline_enabled"]:
+                self.estimator = InferencePipeline(self.config, self.config["pipeline_slots"])
+            else:
+                self.estimator = create_estimator(self.config)
+            self._model_key_in_use = self._model_key()
+        self.estimator.stages = self.stages
+
+    def _model_key(self):
+        """Settings that identify the gaze backend, so a warm one is only reused if they are unchanged"""
+        return (self.config["gaze_estimator"], self.config["pipeline_enabled"])
+
+    def _release_model(self, estimator):
+        """Close a gaze backend that sat unused for the whole grace period"""
+        if estimator is self.estimator:
+            self.estimator = None
+        estimator.close()
+
+    def _source_key(self):
+        """Settings that identify the camera, so a warm handle is only reused if they are unchanged"""
+        return tuple(self.config.get(key) for key in RESTART_KEYS)
+
+    def warm_up(self):
+        """Run one inference on a blank frame so the first real frame does not pay graph start-up"""
+        self._ensure_model()
+        self.estimator.warm_up()
+
+    def prepare_source(self):
+        """Open the frame source ahead of start_detection so the first frame arrives sooner"""
+        if self.prepared_source is None:
+            source = create_frame_source(self.config)
+            if source.start():
+                self.prepared_source = source
+                self._prepared_source_key = self._source_key()
 
     def start_detection(self):
         """Start the detection in a separate thread"""
@@ -63,109 +424,234 @@ class CharlieKirkDetector:
             return
 
         self.running = True
+        self.resume_latency = None
+        self._start_requested = time.perf_counter()
+        self.config_watcher.start()
+        # Start the overlay early so the spam images are decoded before the first trigger
+        self.spam_overlay.start()
+        if self.metrics_exporter:
+            self.metrics_exporter.start()
         self.detection_thread = threading.Thread(target=self._detection_loop, daemon=True)
         self.detection_thread.start()
 
     def stop_detection(self):
         """Stop the detection"""
         self.running = False
-        if self.cam:
-            self.cam.release()
-            cv2.destroyAllWindows()
-        if self.detection_thread:
+        self.config_watcher.stop()
+        if self.source:
+            # Pause rather than release: the detection loop parks the open camera in the warm pool
+            self.source.pause()
+        # ESC stops detection from inside the detection thread, which cannot join itself
+        if self.detection_thread and self.detection_thread is not threading.current_thread():
             self.detection_thread.join(timeout=2)
+        if self.metrics_exporter:
+            self.metrics_exporter.stop()
+
+    def shutdown(self):
+        """Stop detection and release everything kept warm (call on quit)"""
+        self.stop_detection()
+        self.resource_pool.release_all()
+        self.actions.close()
+        if self.session_log:
+            self.session_log.close()
+        if self.prepared_source:
+            self.prepared_source.stop()
+            self.prepared_source = None
 
-    def _detection_loop(self):
+    def run(self, source=None):
+        """Run detection on the calling thread until stopped or the source runs out"""
+        self.running = True
+        self.resume_latency = None
+        self._start_requested = time.perf_counter()
+        self._detection_loop(source)
+
+    def _detection_loop(self, source=None):
         """Main detection loop"""
-        self.cam = cv2.VideoCapture(0)
+        # Sources we create are ours to keep warm; a source passed in belongs to the caller
+        owned = source is None
+        if owned:
+            key = self._source_key()
+            if self.prepared_source is not None and self._prepared_source_key != key:
+                # Opened before the camera settings changed
+                self.prepared_source.stop()
+                self.prepared_source = None
+            source = self.prepared_source or self.resource_pool.take("camera", key)
+            self._source_key_in_use = key
+        self.source = source or create_frame_source(self.config)
+        self.prepared_source = None
+
+        self.resource_pool.take("model", self._model_key())
+        self._ensure_model()
+        self.preview = create_preview(self.config.get("preview", "in-process"))
+        if not self.source.start():
+            self.running = False
+            return
 
+        self.timeline.clear()
+        if self.session_log and not self.session_log.is_open:
+            self.session_log.open()
+        if self.landmark_tracker:
+            self.landmark_tracker.reset()
+        if self.governor:
+            # Time spent stopped is not idle headroom
+            self.governor.reset()
+        last_seq = -1
         while self.running:
-            ret, frame = self.cam.read()
-            if not ret:
+            frame_started = time.perf_counter()
+            if self.profile_capture is not None:
+                self._trace_frames()
+            self.stages.start_frame()
+            # Apply settings changed since the last frame (capture and FaceMesh keep running).
+            # Before reading, since it may swap the pipeline the frame would come from
+            if self._pending_config is not None:
+                config, self._pending_config = self._pending_config, None
+                self._apply_config(config)
+
+            # With a pipeline, frames arrive already scaled and estimated by the other stages
+            pipeline = self.estimator if isinstance(self.estimator, InferencePipeline) else None
+            if pipeline is not None:
+                pipeline.start(self.source)
+            frames = pipeline or self.source
+            # Blocks until there is a newer frame, so a dead camera does not busy-spin
+            captured = frames.read(after=last_seq)
+            if captured is None:
+                if frames.exhausted:
+                    break
                 continue
+            last_seq = captured.seq
+            self.last_frame_time = captured.timestamp
+            self.stages.lap("capture")
+
+            # Detection runs on the frame as captured; only the six points are mirrored afterwards
+            frame = captured.image
+            scale = self.config["capture_scale"]
+            if scale < 1.0 and pipeline is None:
+                # Cheaper than re-opening the camera at a lower resolution; points are normalized anyway
+                height, width = frame.shape[:2]
+                size = (max(1, round(width * scale)), max(1, round(height * scale)))
+                frame = cv2.resize(
+                    frame, size, dst=self._scaled.view((size[1], size[0]) + frame.shape[2:]), interpolation=cv2.INTER_AREA
+                )
+            if pipeline is not None:
+                # Inferred in the other process while this thread handled earlier frames
+                estimate = captured.estimate
+                points, confidence = (estimate.points, estimate.confidence) if estimate else (None, 0.0)
+                self.metrics.extra.update(pipeline.stats())
+            elif self.landmark_tracker:
+                # Full inference only when due; otherwise flow-tracked or unchanged points
+                points, confidence, origin = self.landmark_tracker.step(frame, self.estimator.estimate)
+                self.stages.lap("tracking")
+                if origin == SOURCE_INFERENCE:
+                    self.metrics.extra.update(self.landmark_tracker.stats())
+            else:
+                estimate = self.estimator.estimate(frame)
+                points, confidence = (estimate.points, estimate.confidence) if estimate else (None, 0.0)
+            l_ratio = r_ratio = None
+            threshold = self.trigger_engine.threshold
+
+            if points is not None:
+                # Mirror as if the frame had been flipped, then calculate iris ratios
+                points = mirror_points(points, self._points)
+                l_ratio, r_ratio = iris_ratios(points)
+            self.stages.lap("ratios")
 
-            frame = cv2.flip(frame, 1)
-            height, width, depth = frame.shape
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            processed_image = self.face_mesh_landmarks.process(rgb_frame)
-            face_landmark_points = processed_image.multi_face_landmarks
-
-            if face_landmark_points:
-                one_face_landmark_points = face_landmark_points[0].landmark
-
-                # Left eye landmarks
-                left = [one_face_landmark_points[145], one_face_landmark_points[159]]
-                for landmark_point in left:
-                    x = int(landmark_point.x * width)
-                    y = int(landmark_point.y * height)
-                    cv2.circle(frame, (x, y), 3, (0, 255, 255))
-
-                # Right eye landmarks
-                right = [one_face_landmark_points[374], one_face_landmark_points[386]]
-                for landmark_point in right:
-                    x = int(landmark_point.x * width)
-                    y = int(landmark_point.y * height)
-                    cv2.circle(frame, (x, y), 3, (255, 255, 0))
-
-                # Iris positions
-                l_iris = one_face_landmark_points[468]
-                r_iris = one_face_landmark_points[473]
-
-                # Calculate iris ratios
-                l_ratio = (l_iris.y - left[1].y) / (left[0].y - left[1].y + 1e-6)
-                r_ratio = (r_iris.y - right[1].y) / (right[0].y - right[1].y + 1e-6)
-
-                current = time.time()
-                threshold = self.config["iris_threshold"]
-
-                # Check if looking down (doomscrolling)
-                # When looking down, ratio DECREASES (iris moves up relative to eye landmarks)
-                if (l_ratio < threshold) and (r_ratio < threshold):
-                    if self.timer_started is None:
-                        self.timer_started = current
-
-                    # Timer exceeded - trigger spam
-                    if (current - self.timer_started) >= self.config["timer"]:
-                        if not self.playing:
-                            self.trigger_spam()
-                            self.playing = True
-                else:
-                    self.timer_started = None
-                    self.playing = False
-
-            cv2.imshow('Charlie-Kirkification - Face Detection', frame)
-            key = cv2.waitKey(100)
+            # Record the sample and let the trigger engine decide (no-face samples leave its state alone)
+            current = time.time()
+            face_found = l_ratio is not None
+            self.timeline.append(current, l_ratio, r_ratio, face_found, confidence)
+            was_playing = self.trigger_engine.playing
+            calibration = self.calibration
+            if calibration is not None:
+                # The user looks down on purpose while calibrating, so nothing triggers. Labels come
+                # from the phase the user was asked to hold, never from the threshold being calibrated
+                triggered = False
+                usable = face_found and confidence >= self.trigger_engine.min_confidence
+                if calibration.add(current, l_ratio if usable else None, r_ratio if usable else None):
+                    self._finish_calibration()
+            else:
+                triggered = self.trigger_engine.update(current, l_ratio, r_ratio, face_found, confidence)
+            if triggered:
+                self.metrics.record_trigger()
+                self.trigger_spam(l_ratio, r_ratio)
+                self.metrics.extra.update(self.actions.stats())
+            elif was_playing and not self.trigger_engine.playing and self.config["cancel_on_look_up"]:
+                # Looked back up after a trigger - stop the sound and the overlay
+                self.actions.recover()
+                self.metrics.extra.update(self.actions.stats())
+            looking_down = self.trigger_engine.timer_started is not None
+            if self.calibrator is not None and calibration is None and face_found \
+                    and confidence >= self.trigger_engine.min_confidence:
+                # Unlabelled: the live estimate never sees the trigger's decisions
+                self.calibrator.add(l_ratio, r_ratio)
+                if self.calibrator.count % 30 == 0:
+                    self._apply_calibration()
+            self.metrics.record_sample(current, face_found, looking_down)
+            self.stages.lap("decision")
+            if self.session_log:
+                flags = (FACE if face_found else 0) | (DOWN if looking_down else 0) | (TRIGGER if triggered else 0)
+                self.session_log.append(current, l_ratio, r_ratio, confidence, flags, self.stages.current)
+            self.stages.end_frame()
+
+            if self.governor is not None and self.governor.update():
+                # Over budget, or headroom again: re-apply the user's settings under the new level's limits
+                self._apply_config(self.base_config)
+                self.metrics.extra.update(self.governor.stats())
+
+            if self._start_requested is not None:
+                # Time from start_detection to the first processed frame
+                self.resume_latency = time.perf_counter() - self._start_requested
+                self._start_requested = None
+                self.metrics.extra["resume_latency_ms"] = self.resume_latency * 1000
+
+            # Idle while the gaze is far from the threshold, run at full rate near it
+            self.scheduler.next_interval(
+                face_found=face_found,
+                l_ratio=l_ratio,
+                r_ratio=r_ratio,
+                threshold=threshold,
+                # Full rate while calibrating, so the minute yields enough samples
+                timer_running=self.trigger_engine.timer_started is not None or calibration is not None,
+            )
+            wait = self.scheduler.wait_time(frame_started, time.perf_counter())
+
+            with span("preview"):
+                key = self.preview.show(frame, points, wait)
 
             # ESC key to stop
-            if key == 27:
+            if key == ESC_KEY:
                 self.stop_detection()
                 break
 
-        if self.cam:
-            self.cam.release()
-            cv2.destroyAllWindows()
-
-    def trigger_spam(self):
-        """Trigger Charlie Kirk spam"""
-        # Play sound
-        if self.sound and self.config["sound_enabled"]:
-            self.sound.play()
-
-        # Spam images in a separate thread to not block detection
-        spam_thread = threading.Thread(target=self._spam_images, daemon=True)
-        spam_thread.start()
-
-    def _spam_images(self):
-        """Spam Charlie Kirk images"""
-        try:
-            for loop in range(self.config["spam_loops"]):
-                for image_path in self.spam_folder.iterdir():
-                    if image_path.suffix.lower() in ['.jpg', '.png', '.jpeg']:
-                        im = Image.open(image_path)
-                        im.show()
-        except Exception as e:
-            print(f"Error spamming images: {e}")
+            # Nothing holds the image any more; the capture thread can decode the next frame into it
+            frames.recycle(captured)
+
+        self.running = False
+        if self.calibration is not None:
+            self.calibration = None
+            print("Calibration cancelled: detection stopped")
+        if isinstance(self.estimator, InferencePipeline):
+            # Frames in flight belong to this session; the inference process stays warm
+            self.estimator.stop()
+        if self.profile_capture is not None:
+            # cProfile is bound to this thread, so its stats are written here
+            self.profile_capture.detach()
+            self._set_stages(self.metrics)
+        if owned and not self.source.exhausted:
+            self.source.pause()
+            self.resource_pool.park("camera", self.source, lambda source: source.stop(), key=self._source_key_in_use)
+        else:
+            self.source.stop()
+        self.resource_pool.park("model", self.estimator, self._release_model, key=self._model_key_in_use)
+        self.preview.close()
+        self.trigger_engine.reset()
+        if self.session_log:
+            self.session_log.flush()
+        if self.config.get("timeline_path"):
+            self.timeline.save(self.config["timeline_path"])
 
+    def trigger_spam(self, l_ratio=None, r_ratio=None):
+        """Trigger Charlie Kirk spam (only enqueues, never blocks detection)"""
+        self.actions.trigger(l_ratio, r_ratio)
 
 if __name__ == "__main__":
     # Test the detector
@@ -0,0 +1,301 @@
+import time
+from collections import namedtuple
+import cv2
+import numpy as np
+import mediapipe as mp
+from buffers import ReusableBuffer
+from gaze import eye_points, eye_points_into, iris_ratios
+from roi import FaceROITracker, ROIComparison
+from stages import NullStageTimer
+
+# What every backend returns for a frame with a face: the six eye points
+# (normalized full-frame, gaze.eye_points() order), the two iris ratios and a 0-1 confidence.
+# FaceMesh reuses its points array, so copy the points to keep them past the next frame
+GazeEstimate = namedtuple("GazeEstimate", ["points", "l_ratio", "r_ratio", "confidence"])
+
+ESTIMATORS = ["facemesh", "face-landmarker", "eye-region"]
+
+
+class GazeEstimator:
+    """Base class for gaze backends: estimate(frame) returns a GazeEstimate, or None without a face"""
+
+    name = None
+
+    def __init__(self):
+        # The detector swaps in its stage timer; backends lap "convert" and "inference"
+        self.stages = NullStageTimer()
+
+    def estimate(self, frame):
+        raise NotImplementedError
+
+    def configure(self, config):
+        """Pick up settings that do not need a new backend"""
+
+    def warm_up(self):
+        """Run once on a blank frame so the first real frame does not pay graph start-up"""
+        self.estimate(np.zeros((256, 256, 3), dtype=np.uint8))
+
+    def close(self):
+        pass
+
+    def _result(self, points, confidence=1.0):
+        l_ratio, r_ratio = iris_ratios(points)
+        return GazeEstimate(points, l_ratio, r_ratio, confidence)
+
+
+class FaceMeshEstimator(GazeEstimator):
+    """Legacy FaceMesh graph (478 landmarks), run on the tracked face region when ROI tracking is on
+
+    `face_mesh` shares an existing graph (e.g. one per server worker across
+    several streams); a shared graph is left open by close().
+    """
+
+    name = "facemesh"
+
+    def __init__(self, config, face_mesh=None):
+        super().__init__()
+        self.owns_graph = face_mesh is None
+        self.face_mesh = face_mesh or mp.solutions.face_mesh.FaceMesh(refine_landmarks=True)
+        self.full_frame_face_mesh = None
+        self.roi_tracker = None
+        self.roi_comparison = None
+        # Reused every frame: the RGB copy MediaPipe reads, and the six eye points
+        self._rgb = ReusableBuffer()
+        self._points = np.empty((6, 2), dtype=np.float64)
+        self.configure(config)
+
+    def configure(self, config):
+        """Configure face-ROI cropping and the optional ROI vs full-frame comparison"""
+        if not config.get("roi_tracking", True):
+            self.roi_tracker = None
+            self._close_comparison()
+            return
+
+        self.roi_tracker = FaceROITracker(
+            padding=config.get("roi_padding", 0.3),
+            inference_size=config.get("roi_inference_size", 256),
+        )
+        if config.get("roi_compare", False):
+            # A separate graph, so its internal tracking state is not shared with the ROI one
+            if self.full_frame_face_mesh is None:
+                self.full_frame_face_mesh = mp.solutions.face_mesh.FaceMesh(refine_landmarks=True)
+            self.roi_comparison = ROIComparison()
+        else:
+            # Nothing else uses the full-frame graph, so it does not stay alive until close()
+            self._close_comparison()
+
+    def estimate(self, frame):
+        points = self._find_eye_points(frame)
+        return self._result(points) if points is not None else None
+
+    def close(self):
+        if self.owns_graph:
+            self.face_mesh.close()
+        self._close_comparison()
+
+    def _close_comparison(self):
+        self.roi_comparison = None
+        if self.full_frame_face_mesh is not None:
+            self.full_frame_face_mesh.close()
+            self.full_frame_face_mesh = None
+
+    def _find_eye_points(self, frame):
+        """Run FaceMesh on the tracked face region and return full-frame eye points, or None"""
+        height, width = frame.shape[:2]
+
+        if not self.roi_tracker:
+            landmarks = self._process(self.face_mesh, frame)
+            return eye_points_into(landmarks, self._points) if landmarks else None
+
+        image, box = self.roi_tracker.crop(frame)
+        landmarks = self._process(self.face_mesh, image)
+        if not landmarks and box is not None:
+            # Tracking lost - search the whole frame again
+            self.roi_tracker.lost()
+            image, box = self.roi_tracker.crop(frame)
+            landmarks = self._process(self.face_mesh, image)
+
+        if not landmarks:
+            self.roi_tracker.lost()
+            points = None
+        else:
+            self.roi_tracker.update(landmarks, box, (width, height))
+            points = eye_points_into(landmarks, self._points, box, (width, height))
+
+        if self.roi_comparison:
+            full_landmarks = self._process(self.full_frame_face_mesh, frame)
+            self.roi_comparison.add(
+                iris_ratios(points) if points is not None else None,
+                iris_ratios(eye_points(full_landmarks)) if full_landmarks else None,
+            )
+        return points
+
+    def _process(self, face_mesh, image):
+        """Run a FaceMesh graph on a BGR image and return the first face's landmarks, or None"""
+        rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=self._rgb.view(image.shape))
+        # Read-only, so MediaPipe wraps the array instead of copying it
+        rgb_image.flags.writeable = False
+        self.stages.lap("convert")
+        face_landmark_points = face_mesh.process(rgb_image).multi_face_landmarks
+        self.stages.lap("inference")
+        return face_landmark_points[0].landmark if face_landmark_points else None
+
+
+class FaceLandmarkerEstimator(GazeEstimator):
+    """MediaPipe Tasks FaceLandmarker in VIDEO mode, which carries face tracking across frames
+
+    Needs the face_landmarker.task model bundle (config "face_landmarker_model").
+    Confidence drops as either eye closes, using the model's blink blendshapes.
+    """
+
+    name = "face-landmarker"
+
+    def __init__(self, config):
+        super().__init__()
+        from mediapipe.tasks.python import BaseOptions
+        from mediapipe.tasks.python.vision import FaceLandmarker, FaceLandmarkerOptions, RunningMode
+
+        options = FaceLandmarkerOptions(
+            base_options=BaseOptions(model_asset_path=str(config["face_landmarker_model"])),
+            running_mode=RunningMode.VIDEO,
+            num_faces=1,
+            output_face_blendshapes=True,
+        )
+        self.landmarker = FaceLandmarker.create_from_options(options)
+        self._last_ms = -1
+
+    def estimate(self, frame):
+        rgb_image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        image = mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb_image)
+        self.stages.lap("convert")
+
+        # VIDEO mode requires strictly increasing timestamps
+        self._last_ms = max(self._last_ms + 1, int(time.monotonic() * 1000))
+        result = self.landmarker.detect_for_video(image, self._last_ms)
+        self.stages.lap("inference")
+        if not result.face_landmarks:
+            return None
+
+        confidence = 1.0
+        if result.face_blendshapes:
+            blink = max((c.score for c in result.face_blendshapes[0] if c.category_name.startswith("eyeBlink")), default=0.0)
+            confidence = 1.0 - blink
+        return self._result(eye_points(result.face_landmarks[0]), confidence)
+
+    def close(self):
+        self.landmarker.close()
+
+
+class EyeRegionEstimator(GazeEstimator):
+    """Cheap backend: BlazeFace eye keypoints plus NumPy lid and pupil localisation
+
+    The short-range face detector is a fraction of FaceMesh's cost and already
+    gives both eye centres. Around each one, the eye opening is found from the
+    rows darker than the region's median row and the pupil as the centroid of
+    the darkest pixels. Confidence is the pupil's contrast against the rest of
+    the eye region, and 0 when the pupil falls outside the fitted lids.
+
+    Its ratios are mapped onto FaceMesh's scale with `eye_region_ratio_scale`
+    and `eye_region_ratio_offset` (the pupil is moved between the lids), so
+    iris_threshold means the same for both. The defaults are fitted on the
+    bundled frames, which only look straight ahead; `bench.py
+    --compare-estimators` fits them on your own recording.
+    """
+
+    name = "eye-region"
+
+    def __init__(self, config=None, eye_width=0.5, eye_height=0.3, dark_percentile=8):
+        super().__init__()
+        self.detector = mp.solutions.face_detection.FaceDetection(model_selection=0, min_detection_confidence=0.5)
+        # Eye box size as a fraction of the distance between the eyes
+        self.eye_width = eye_width
+        self.eye_height = eye_height
+        self.dark_percentile = dark_percentile
+        self.configure(config or {})
+
+    def configure(self, config):
+        self.ratio_scale = config.get("eye_region_ratio_scale", 1.0)
+        self.ratio_offset = config.get("eye_region_ratio_offset", 0.0)
+
+    def estimate(self, frame):
+        rgb_image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        self.stages.lap("convert")
+        detections = self.detector.process(rgb_image).detections
+        if not detections:
+            self.stages.lap("inference")
+            return None
+
+        height, width = frame.shape[:2]
+        keypoints = detections[0].location_data.relative_keypoints
+        # Keypoint 0 is the eye FaceMesh calls LEFT_EYE, keypoint 1 its RIGHT_EYE
+        centres = [(keypoints[0].x * width, keypoints[0].y * height), (keypoints[1].x * width, keypoints[1].y * height)]
+        distance = np.hypot(centres[1][0] - centres[0][0], centres[1][1] - centres[0][1])
+
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        eyes = [self._locate(gray, cx, cy, distance) for cx, cy in centres]
+        self.stages.lap("inference")
+        if None in eyes:
+            return None
+
+        (l_low, l_up, l_iris, l_conf), (r_low, r_up, r_iris, r_conf) = eyes
+        points = [l_low, l_up, r_low, r_up, l_iris, r_iris]
+        points = [(x / width, y / height) for x, y in points]
+        return self._result(points, min(l_conf, r_conf) * detections[0].score[0])
+
+    def _locate(self, gray, cx, cy, distance):
+        """Return (lower lid, upper lid, pupil, confidence) in pixels for one eye, or None"""
+        half_w = max(4, int(distance * self.eye_width / 2))
+        half_h = max(3, int(distance * self.eye_height / 2))
+        x0, y0 = max(0, int(cx) - half_w), max(0, int(cy) - half_h)
+        x1, y1 = min(gray.shape[1], int(cx) + half_w + 1), min(gray.shape[0], int(cy) + half_h + 1)
+        if x1 - x0 < 4 or y1 - y0 < 3:
+            return None
+
+        region = cv2.GaussianBlur(gray[y0:y1, x0:x1], (3, 3), 0).astype(np.float32)
+
+        # Eye opening: centre and spread of the rows darker than the median row (sub-pixel, unlike a
+        # row threshold); a uniform band of height h has a standard deviation of h / sqrt(12)
+        rows = region.mean(axis=1)
+        darkness = np.clip(np.median(rows) - rows, 0, None)
+        if darkness.sum() <= 0:
+            return None
+        row_index = np.arange(len(rows))
+        centre = (row_index * darkness).sum() / darkness.sum()
+        spread = np.sqrt((((row_index - centre) ** 2) * darkness).sum() / darkness.sum()) * np.sqrt(3)
+        top, bottom = centre - spread, centre + spread
+
+        # Pupil: centroid of the darkest pixels, weighted by how dark they are
+        cutoff = np.percentile(region, self.dark_percentile)
+        weights = np.clip(cutoff - region, 0, None) + (region <= cutoff)
+        ys, xs = np.indices(region.shape)
+        total = weights.sum()
+        px = (xs * weights).sum() / total
+        py = (ys * weights).sum() / total
+
+        confidence = float(np.clip((np.median(region) - cutoff) / 64.0, 0.0, 1.0))
+        ratio = (py - top) / (bottom - top + 1e-6)
+        if not 0.0 <= ratio <= 1.0:
+            # Pupil outside the lids: the lid fit is off
+            confidence = 0.0
+        # Onto FaceMesh's ratio scale, by moving the pupil between the lids
+        py = top + (ratio * self.ratio_scale + self.ratio_offset) * (bottom - top)
+        return (x0 + px, y0 + bottom), (x0 + px, y0 + top), (x0 + px, y0 + py), confidence
+
+    def close(self):
+        self.detector.close()
+
+
+def create_estimator(config, face_mesh=None):
+    """Build the gaze backend named by config["gaze_estimator"], falling back to FaceMesh
+
+    `face_mesh` is an existing FaceMesh graph for the facemesh backend to share.
+    """
+    name = config.get("gaze_estimator", "facemesh")
+    try:
+        if name == "face-landmarker":
+            return FaceLandmarkerEstimator(config)
+        if name == "eye-region":
+            return EyeRegionEstimator(config)
+    except (OSError, RuntimeError, ValueError) as e:
+        print(f"Error loading {name} gaze estimator: {e}, using facemesh")
+    return FaceMeshEstimator(config, face_mesh)
@@ -0,0 +1,315 @@
+import cv2
+import threading
+import time
+from collections import namedtuple
+from pathlib import Path
+from profiler import span
+
+
+# A captured frame with the time it was grabbed and a monotonically increasing sequence number
+Frame = namedtuple("Frame", ["image", "timestamp", "seq"])
+
+IMAGE_SUFFIXES = ['.jpg', '.jpeg', '.png', '.bmp']
+
+
+class FrameSource:
+    """Base class for frame sources that capture on their own thread and keep only the newest frame"""
+
+    # Seconds to back off after a failed read instead of busy-spinning
+    retry_delay = 0.05
+    # Frame buffers kept for the capture thread to read into again
+    max_free_buffers = 3
+
+    def __init__(self, lossless=False, max_frames=None):
+        # When lossless, the capture thread waits for every frame to be consumed (useful for replay/tests)
+        self.lossless = lossless
+        # Stop after this many frames (useful for benchmarks)
+        self.max_frames = max_frames
+        self.running = False
+        self.exhausted = False
+        self.frames_captured = 0
+        self.frames_dropped = 0
+
+        self.is_open = False
+
+        self._cond = threading.Condition()
+        self._latest = None
+        self._consumed_seq = -1
+        self._seq = 0
+        self._thread = None
+        self._free = []
+        # perf_counter time the next frame is due, for sources that pace themselves
+        self._next_time = 0.0
+
+    def open(self):
+        """Open the underlying device or file, return True on success"""
+        raise NotImplementedError
+
+    def grab(self, buffer=None):
+        """Grab one image from the device, return None on failure
+
+        `buffer` is a previous frame's image to decode into when it has the
+        right size (the returned image is then `buffer` itself).
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """Release the underlying device or file"""
+
+    def start(self):
+        """Open the source (unless it is still open from before a pause) and start the capture thread"""
+        if self.running:
+            return True
+        if not self.is_open:
+            if not self.open():
+                return False
+            self.is_open = True
+
+        with self._cond:
+            # Never hand out a frame captured before a pause
+            self._latest = None
+        self.running = True
+        self.exhausted = False
+        # A (re)started source delivers its first frame straight away
+        self._next_time = 0.0
+        self._thread = threading.Thread(target=self._capture_loop, daemon=True)
+        self._thread.start()
+        return True
+
+    def pause(self):
+        """Stop the capture thread but keep the device open, so start() can resume quickly"""
+        self.running = False
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2)
+        self._thread = None
+
+    def stop(self):
+        """Stop the capture thread and release the source"""
+        self.pause()
+        if self.is_open:
+            self.close()
+            self.is_open = False
+
+    def read(self, after=-1, timeout=1.0):
+        """Wait for a frame newer than sequence number `after`, return None on timeout or end of stream"""
+        deadline = time.perf_counter() + timeout
+        with self._cond:
+            while self._latest is None or self._latest.seq <= after:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0 or not self.running:
+                    return None
+                self._cond.wait(remaining)
+            frame = self._latest
+            self._consumed_seq = frame.seq
+            self._cond.notify_all()
+            return frame
+
+    def recycle(self, frame):
+        """Hand a frame's image back once nothing uses it any more, so capture can decode into it
+
+        Only for a single reader: the image is overwritten by a later frame.
+        """
+        with self._cond:
+            if len(self._free) < self.max_free_buffers:
+                self._free.append(frame.image)
+
+    def _publish(self, image):
+        """Replace the latest frame, counting the previous one as dropped if nobody read it"""
+        with self._cond:
+            if self.lossless:
+                while self.running and self._latest is not None and self._consumed_seq < self._latest.seq:
+                    self._cond.wait(0.1)
+            elif self._latest is not None and self._consumed_seq < self._latest.seq:
+                self.frames_dropped += 1
+                # Nobody saw it, so its buffer is free straight away
+                if len(self._free) < self.max_free_buffers:
+                    self._free.append(self._latest.image)
+
+            self._latest = Frame(image, time.time(), self._seq)
+            self._seq += 1
+            self.frames_captured += 1
+            self._cond.notify_all()
+
+    def _pace(self, fps):
+        """Wait until the next frame is due at `fps`; the first frame is never delayed"""
+        delay = self._next_time - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+            self._next_time += 1.0 / fps
+        else:
+            # First frame, or running behind: pace from now
+            self._next_time = time.perf_counter() + 1.0 / fps
+
+    def _capture_loop(self):
+        """Capture thread: grab frames until stopped or the source runs out"""
+        while self.running:
+            if self.max_frames is not None and self.frames_captured >= self.max_frames:
+                self.exhausted = True
+                break
+            with self._cond:
+                buffer = self._free.pop() if self._free else None
+            with span("grab"):
+                image = self.grab(buffer)
+            if image is None:
+                if self.exhausted:
+                    break
+                time.sleep(self.retry_delay)
+                continue
+            self._publish(image)
+
+        self.running = False
+        with self._cond:
+            self._cond.notify_all()
+
+
+class WebcamSource(FrameSource):
+    """Live camera source that negotiates resolution, FOURCC and buffer size with the device"""
+
+    def __init__(self, index=0, width=None, height=None, fourcc=None, buffer_size=1, fps=None, lossless=False, max_frames=None):
+        super().__init__(lossless=lossless, max_frames=max_frames)
+        self.index = index
+        self.width = width
+        self.height = height
+        self.fourcc = fourcc
+        self.buffer_size = buffer_size
+        self.fps = fps
+        self.cam = None
+
+    def open(self):
+        """Open the camera and apply the requested capture properties"""
+        self.cam = cv2.VideoCapture(self.index)
+        if not self.cam.isOpened():
+            print(f"Error opening camera {self.index}")
+            self.cam = None
+            return False
+
+        # FOURCC must be set before resolution on most backends
+        if self.fourcc:
+            self.cam.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*self.fourcc))
+        if self.width:
+            self.cam.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+        if self.height:
+            self.cam.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+        if self.fps:
+            self.cam.set(cv2.CAP_PROP_FPS, self.fps)
+        if self.buffer_size:
+            self.cam.set(cv2.CAP_PROP_BUFFERSIZE, self.buffer_size)
+
+        # Read back what the device actually agreed to
+        self.width = int(self.cam.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(self.cam.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.fps = self.cam.get(cv2.CAP_PROP_FPS) or None
+        code = int(self.cam.get(cv2.CAP_PROP_FOURCC))
+        self.fourcc = "".join(chr((code >> (8 * i)) & 0xFF) for i in range(4)) if code else None
+        return True
+
+    def grab(self, buffer=None):
+        ret, image = self.cam.read(buffer)
+        return image if ret else None
+
+    def close(self):
+        if self.cam:
+            self.cam.release()
+            self.cam = None
+
+
+class VideoFileSource(FrameSource):
+    """Recorded video source, paced to the file's frame rate unless `realtime` is False"""
+
+    def __init__(self, path, loop=False, realtime=True, lossless=False, max_frames=None):
+        super().__init__(lossless=lossless, max_frames=max_frames)
+        self.path = str(path)
+        self.loop = loop
+        self.realtime = realtime
+        self.fps = None
+        self.cap = None
+
+    def open(self):
+        self.cap = cv2.VideoCapture(self.path)
+        if not self.cap.isOpened():
+            print(f"Error opening video file {self.path}")
+            self.cap = None
+            return False
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+        return True
+
+    def grab(self, buffer=None):
+        if self.realtime:
+            # Before reading rather than after, so a frame is published as soon as it is decoded
+            self._pace(self.fps)
+        ret, image = self.cap.read(buffer)
+        if not ret:
+            if not self.loop:
+                self.exhausted = True
+                return None
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, image = self.cap.read(buffer)
+            if not ret:
+                self.exhausted = True
+                return None
+        return image
+
+    def close(self):
+        if self.cap:
+            self.cap.release()
+            self.cap = None
+
+
+class ImageDirectorySource(FrameSource):
+    """Replays the images in a directory (sorted by name) at a fixed rate, unless `realtime` is False"""
+
+    def __init__(self, path, fps=10.0, loop=True, lossless=False, max_frames=None, realtime=True):
+        super().__init__(lossless=lossless, max_frames=max_frames)
+        self.path = Path(path)
+        self.fps = fps
+        self.loop = loop
+        self.realtime = realtime
+        self.files = []
+        self._index = 0
+
+    def open(self):
+        self.files = sorted(p for p in self.path.iterdir() if p.suffix.lower() in IMAGE_SUFFIXES)
+        if not self.files:
+            print(f"Error: no images found in {self.path}")
+            return False
+        self._index = 0
+        return True
+
+    def grab(self, buffer=None):
+        if self._index >= len(self.files):
+            if not self.loop:
+                self.exhausted = True
+                return None
+            self._index = 0
+
+        if self.fps and self.realtime:
+            self._pace(self.fps)
+        image = cv2.imread(str(self.files[self._index]))
+        self._index += 1
+        return image
+
+
+def create_frame_source(config, lossless=False):
+    """Build a frame source from config: a camera index, a stream URL, a video file or an image directory"""
+    source = config.get("frame_source", 0)
+
+    if isinstance(source, int) or str(source).isdigit():
+        return WebcamSource(
+            index=int(source),
+            width=config.get("capture_width"),
+            height=config.get("capture_height"),
+            fourcc=config.get("capture_fourcc"),
+            buffer_size=config.get("capture_buffer_size", 1),
+            lossless=lossless,
+        )
+
+    if "://" in str(source):
+        # Network/local streams (rtsp://, http://, udp://) pace themselves
+        return VideoFileSource(source, realtime=False, lossless=lossless)
+
+    path = Path(source)
+    if path.is_dir():
+        return ImageDirectorySource(path, lossless=lossless)
+    return VideoFileSource(path, lossless=lossless)
@@ -0,0 +1,77 @@
+import numpy as np
+
+# FaceMesh landmark indices used by the detector
+LEFT_EYE = (145, 159)    # lower lid, upper lid
+RIGHT_EYE = (374, 386)   # lower lid, upper lid
+LEFT_IRIS = 468
+RIGHT_IRIS = 473
+
+# The six landmarks the decision needs, in the order returned by eye_points()
+EYE_LANDMARKS = (LEFT_EYE[0], LEFT_EYE[1], RIGHT_EYE[0], RIGHT_EYE[1], LEFT_IRIS, RIGHT_IRIS)
+
+# eye_points() order after a horizontal flip: x mirrors and the two eyes swap places
+MIRRORED_ORDER = (2, 3, 0, 1, 5, 4)
+
+# Forehead, chin, left cheek, right cheek - enough to bound the face for ROI tracking
+FACE_EXTENT_LANDMARKS = (10, 152, 234, 454)
+
+
+def landmark_points(landmarks, indices, box=None, frame_size=None):
+    """Return normalized full-frame (x, y) points for the given landmark indices
+
+    `box` is the (x, y, w, h) crop the landmarks were computed on, in pixels of a
+    frame of `frame_size` (width, height). Without a box the landmarks are
+    already in full-frame coordinates.
+    """
+    if box is None:
+        return [(landmarks[i].x, landmarks[i].y) for i in indices]
+
+    bx, by, bw, bh = box
+    fw, fh = frame_size
+    return [((bx + landmarks[i].x * bw) / fw, (by + landmarks[i].y * bh) / fh) for i in indices]
+
+
+def eye_points(landmarks, box=None, frame_size=None):
+    """Return the six eye/iris points in EYE_LANDMARKS order"""
+    return landmark_points(landmarks, EYE_LANDMARKS, box, frame_size)
+
+
+def eye_points_into(landmarks, out, box=None, frame_size=None):
+    """Write the six eye/iris points into `out`, a (6, 2) float array, and return it
+
+    Same values as eye_points(), without building a list of tuples per frame.
+    """
+    for row, index in enumerate(EYE_LANDMARKS):
+        landmark = landmarks[index]
+        out[row, 0] = landmark.x
+        out[row, 1] = landmark.y
+    if box is not None:
+        bx, by, bw, bh = box
+        fw, fh = frame_size
+        out *= (bw / fw, bh / fh)
+        out += (bx / fw, by / fh)
+    return out
+
+
+def mirror_points(points, out=None):
+    """Return eye points as they would be found on the horizontally flipped frame
+
+    Detection runs on frames as captured, and the preview and ratios use the
+    mirrored view; flipping six points is far cheaper than flipping every
+    frame. `out` is a (6, 2) float64 array to reuse (it must not be `points`).
+    """
+    out = np.take(np.asarray(points, dtype=np.float64), MIRRORED_ORDER, axis=0, out=out, mode="clip")
+    np.subtract(1.0, out[:, 0], out=out[:, 0])
+    return out
+
+
+def iris_ratios(points):
+    """Compute (l_ratio, r_ratio) from eye_points() output
+
+    Each ratio is the iris height between the upper and lower lid; it
+    decreases when looking down.
+    """
+    l_low, l_up, r_low, r_up, l_iris, r_iris = points
+    l_ratio = (l_iris[1] - l_up[1]) / (l_low[1] - l_up[1] + 1e-6)
+    r_ratio = (r_iris[1] - r_up[1]) / (r_low[1] - r_up[1] + 1e-6)
+    return l_ratio, r_ratio
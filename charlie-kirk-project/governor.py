@@ -0,0 +1,110 @@
+import time
+
+# Quality levels from best to cheapest, as limits laid over the user's config: each one may only
+# lower capture_scale, roi_inference_size and max_fps, and raise tracking_full_every
+QUALITY_LEVELS = [
+    {},
+    {"tracking_enabled": True, "tracking_full_every": 3},
+    {"tracking_enabled": True, "tracking_full_every": 5, "roi_inference_size": 192},
+    {"tracking_enabled": True, "tracking_full_every": 8, "roi_inference_size": 160, "capture_scale": 0.75, "max_fps": 15},
+    {"tracking_enabled": True, "tracking_full_every": 10, "roi_inference_size": 128, "capture_scale": 0.5, "max_fps": 10},
+    {"tracking_enabled": True, "tracking_full_every": 15, "roi_inference_size": 128, "capture_scale": 0.5, "max_fps": 5},
+]
+
+# How each setting is tightened: the cheaper of the user's value and the level's
+_TIGHTEN = {
+    "tracking_enabled": lambda user, level: user or level,
+    "tracking_full_every": max,
+    "roi_inference_size": lambda user, level: min(user, level) if user else level,
+    "capture_scale": min,
+    "max_fps": min,
+}
+
+
+class CPUGovernor:
+    """Keep the detector's CPU use under a budget by stepping through quality levels
+
+    CPU time is measured with time.process_time (every thread of the
+    process) against wall time over windows of `window` seconds. Over
+    budget, the governor drops one level. Once usage has stayed under
+    `headroom` of the budget for `calm_windows` windows, it steps back up,
+    unless the better level was measured over budget less than
+    `retry_after` seconds ago.
+    """
+
+    def __init__(self, budget_percent, window=2.0, headroom=0.7, calm_windows=3, retry_after=30.0, levels=QUALITY_LEVELS):
+        self.budget_percent = budget_percent
+        self.window = window
+        self.headroom = headroom
+        self.calm_windows = calm_windows
+        self.retry_after = retry_after
+        self.levels = levels
+        self.level = 0
+        self.cpu_percent = None
+        self.changes = 0
+        # level -> (CPU percent last measured there, when)
+        self.costs = {}
+        self._calm = 0
+        self._cpu_start = None
+        self._wall_start = None
+
+    def reset(self):
+        """Start a new measurement window (e.g. after a pause, which would read as idle time)"""
+        self._cpu_start = None
+        self._wall_start = None
+        self._calm = 0
+
+    def govern(self, config):
+        """Return `config` with the current level's limits applied"""
+        config = dict(config)
+        for key, value in self.levels[self.level].items():
+            config[key] = _TIGHTEN[key](config.get(key), value) if config.get(key) is not None else value
+        return config
+
+    def update(self):
+        """Account for the frame just processed, return True if the level changed"""
+        cpu = time.process_time()
+        wall = time.perf_counter()
+        if self._wall_start is None:
+            self._cpu_start, self._wall_start = cpu, wall
+            return False
+        elapsed = wall - self._wall_start
+        if elapsed < self.window:
+            return False
+
+        usage = 100.0 * (cpu - self._cpu_start) / elapsed
+        self._cpu_start, self._wall_start = cpu, wall
+        self.cpu_percent = usage
+        self.costs[self.level] = (usage, wall)
+
+        if usage > self.budget_percent:
+            self._calm = 0
+            if self.level < len(self.levels) - 1:
+                return self._set_level(self.level + 1)
+            return False
+
+        if usage < self.budget_percent * self.headroom and self.level > 0:
+            self._calm += 1
+            cost, measured = self.costs.get(self.level - 1, (None, None))
+            fits = cost is None or cost <= self.budget_percent or wall - measured > self.retry_after
+            if self._calm >= self.calm_windows and fits:
+                return self._set_level(self.level - 1)
+        else:
+            self._calm = 0
+        return False
+
+    def stats(self):
+        """Return the chosen level and measured usage for the metrics snapshot"""
+        return {
+            "governor_level": self.level,
+            "governor_levels": len(self.levels),
+            "governor_changes": self.changes,
+            "cpu_percent": self.cpu_percent,
+            "cpu_budget_percent": self.budget_percent,
+        }
+
+    def _set_level(self, level):
+        self.level = level
+        self.changes += 1
+        self._calm = 0
+        return True
@@ -1,7 +1,6 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-import json
-from pathlib import Path
+from config import DEFAULT_CONFIG, load_config, save_config
 
 
 class SettingsWindow:
@@ -12,24 +11,11 @@ class SettingsWindow:
 
     def load_config(self):
         """Load configuration from JSON file"""
-        try:
-            with open(self.config_path, 'r') as f:
-                return json.load(f)
-        except FileNotFoundError:
-            # Default configuration
-            return {
-                "timer": 2.0,
-                "iris_threshold": 0.35,
-                "spam_loops": 4,
-                "sound_enabled": True,
-                "sound_path": "./assets/we-are-charlie-kirk-song.mp3",
-                "start_minimized": False
-            }
+        return load_config(self.config_path)
 
     def save_config(self):
-        """Save configuration to JSON file"""
-        with open(self.config_path, 'w') as f:
-            json.dump(self.config, f, indent=4)
+        """Save configuration to JSON file (a running detector applies it right away)"""
+        self.config = save_config(self.config, self.config_path)
 
     def show(self):
         """Display the settings window"""
@@ -40,7 +26,7 @@ class SettingsWindow:
 
         self.window = tk.Tk()
         self.window.title("Charlie-Kirkification Settings")
-        self.window.geometry("500x450")
+        self.window.geometry("500x500")
         self.window.resizable(False, False)
 
         # Main container
@@ -97,9 +83,15 @@ class SettingsWindow:
         minimized_checkbox = ttk.Checkbutton(main_frame, variable=self.start_minimized_var)
         minimized_checkbox.grid(row=9, column=1, sticky=tk.W, pady=(15, 5))
 
+        # Preview window
+        ttk.Label(main_frame, text="Preview Window:", font=("Arial", 10)).grid(row=10, column=0, sticky=tk.W, pady=(15, 5))
+        self.preview_var = tk.StringVar(value=self.config.get("preview", "in-process"))
+        preview_combo = ttk.Combobox(main_frame, textvariable=self.preview_var, values=["off", "in-process", "process"], state="readonly", width=13)
+        preview_combo.grid(row=10, column=1, sticky=tk.W, pady=(15, 5))
+
         # Buttons
         button_frame = ttk.Frame(main_frame)
-        button_frame.grid(row=10, column=0, columnspan=2, pady=(30, 0))
+        button_frame.grid(row=11, column=0, columnspan=2, pady=(30, 0))
 
         save_btn = ttk.Button(button_frame, text="Save", command=self.save_and_close)
         save_btn.pack(side=tk.LEFT, padx=5)
@@ -129,20 +121,22 @@ class SettingsWindow:
         self.config["sound_enabled"] = self.sound_enabled_var.get()
         self.config["sound_path"] = self.sound_path_var.get()
         self.config["start_minimized"] = self.start_minimized_var.get()
+        self.config["preview"] = self.preview_var.get()
 
         self.save_config()
-        messagebox.showinfo("Settings", "Settings saved successfully!\nRestart detection for changes to take effect.")
+        messagebox.showinfo("Settings", "Settings saved successfully!\nChanges apply immediately (camera settings need a detection restart).")
         self.window.destroy()
 
     def reset_defaults(self):
         """Reset to default values"""
         if messagebox.askyesno("Reset", "Reset all settings to default values?"):
-            self.timer_var.set(2.0)
-            self.threshold_var.set(0.35)
-            self.loops_var.set(4)
-            self.sound_enabled_var.set(True)
-            self.sound_path_var.set("./assets/we-are-charlie-kirk-song.mp3")
-            self.start_minimized_var.set(False)
+            self.timer_var.set(DEFAULT_CONFIG["timer"])
+            self.threshold_var.set(DEFAULT_CONFIG["iris_threshold"])
+            self.loops_var.set(DEFAULT_CONFIG["spam_loops"])
+            self.sound_enabled_var.set(DEFAULT_CONFIG["sound_enabled"])
+            self.sound_path_var.set(DEFAULT_CONFIG["sound_path"])
+            self.start_minimized_var.set(DEFAULT_CONFIG["start_minimized"])
+            self.preview_var.set(DEFAULT_CONFIG["preview"])
 
 
 if __name__ == "__main__":
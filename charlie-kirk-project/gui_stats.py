@@ -0,0 +1,77 @@
+import tkinter as tk
+from tkinter import ttk
+
+
+class StatsWindow:
+    def __init__(self, detector, refresh_ms=1000):
+        self.detector = detector
+        self.refresh_ms = refresh_ms
+        self.window = None
+        self.labels = {}
+
+    def show(self):
+        """Display the stats window"""
+        if self.window is not None and self.window.winfo_exists():
+            self.window.lift()
+            self.window.focus_force()
+            return
+
+        self.window = tk.Tk()
+        self.window.title("Charlie-Kirkification Stats")
+        self.window.geometry("420x430")
+        self.window.resizable(False, False)
+
+        main_frame = ttk.Frame(self.window, padding="20")
+        main_frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+
+        title = ttk.Label(main_frame, text="📊 Stats", font=("Arial", 16, "bold"))
+        title.grid(row=0, column=0, columnspan=2, pady=(0, 20))
+
+        rows = ["Status", "FPS", "CPU", "Threshold", "Frames captured", "Frames dropped", "Face found", "Triggers", "Looking down",
+                "Capture", "Convert", "Inference", "Ratios", "Decision"]
+        for i, name in enumerate(rows, start=1):
+            ttk.Label(main_frame, text=f"{name}:", font=("Arial", 10)).grid(row=i, column=0, sticky=tk.W, pady=2)
+            self.labels[name] = ttk.Label(main_frame, text="-", font=("Arial", 10))
+            self.labels[name].grid(row=i, column=1, sticky=tk.W, padx=(20, 0), pady=2)
+
+        close_btn = ttk.Button(main_frame, text="Close", command=self.window.destroy)
+        close_btn.grid(row=len(rows) + 1, column=0, columnspan=2, pady=(20, 0))
+
+        self.refresh()
+        self.window.mainloop()
+
+    def refresh(self):
+        """Update the labels from a fresh metrics snapshot"""
+        if self.window is None or not self.window.winfo_exists():
+            return
+
+        stats = self.detector.stats()
+        if stats is None:
+            self.labels["Status"].configure(text="Metrics off (set metrics_enabled in config.json)")
+        else:
+            self.labels["Status"].configure(text="Detecting" if self.detector.running else "Stopped")
+            self.labels["FPS"].configure(text=f"{stats['fps']:.1f}")
+            if stats.get("cpu_percent") is not None:
+                self.labels["CPU"].configure(text=(
+                    f"{stats['cpu_percent']:.0f}% of {stats['cpu_budget_percent']:.0f}% "
+                    f"(quality level {stats['governor_level']} of {stats['governor_levels'] - 1})"
+                ))
+            # The band only applies on the way back up: down below the threshold, up again above threshold + band
+            low, high = stats["iris_threshold"], stats["iris_threshold"] + stats["iris_hysteresis"]
+            threshold = f"down < {low:.2f}, back up ≥ {high:.2f}"
+            if stats["calibrating"]:
+                threshold += " (calibrating)"
+            elif stats.get("calibrated_threshold") is not None:
+                threshold += " (auto)"
+            self.labels["Threshold"].configure(text=threshold)
+            self.labels["Frames captured"].configure(text=str(stats["frames_captured"]))
+            self.labels["Frames dropped"].configure(text=str(stats["frames_dropped"]))
+            self.labels["Face found"].configure(text=f"{stats['face_found_rate'] * 100:.0f}%")
+            self.labels["Triggers"].configure(text=str(stats["triggers"]))
+            self.labels["Looking down"].configure(text=f"{stats['looking_down_seconds']:.0f}s")
+            for stage in ["capture", "convert", "inference", "ratios", "decision"]:
+                summary = stats["stages"].get(stage)
+                text = f"p50 {summary['p50_ms']:.1f} ms, p95 {summary['p95_ms']:.1f} ms" if summary else "-"
+                self.labels[stage.capitalize()].configure(text=text)
+
+        self.window.after(self.refresh_ms, self.refresh)
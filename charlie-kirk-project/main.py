@@ -1,20 +1,38 @@
 import pystray
 from pystray import MenuItem as item
 from PIL import Image
+import signal
 import threading
+import multiprocessing
 from pathlib import Path
-from detector import CharlieKirkDetector
 from gui_settings import SettingsWindow
+from gui_stats import StatsWindow
+from startup import StartupReport, Warmup
+from config import load_config
+
+# Taken before anything heavy is imported, so the report covers the whole start-up
+startup_report = StartupReport()
 
 
 class CharlieKirkApp:
-    def __init__(self):
-        self.detector = CharlieKirkDetector()
+    def __init__(self, config_path="config.json"):
+        self.config_path = config_path
+        self.config = load_config(config_path)
+        self.detector = None
         self.icon = None
         self.is_detecting = False
+        self.warmup_status = "Loading..."
+
+        # cv2, mediapipe, pygame and the FaceMesh graph load in the background once the tray icon is up
+        self.warmup = Warmup(
+            config_path,
+            report=startup_report,
+            progress=self.on_warmup_progress,
+            warm_camera=self.config.get("start_minimized", False),
+        )
 
         # Load config to check start minimized
-        if self.detector.config.get("start_minimized", False):
+        if self.config.get("start_minimized", False):
             self.start_detection()
 
     def create_icon_image(self):
@@ -22,21 +40,60 @@ class CharlieKirkApp:
         icon_path = Path("assets/icons/charlie-kirk-praying.png")
         return Image.open(icon_path)
 
+    def on_warmup_progress(self, step, index, total):
+        """Show warm-up progress in the tray tooltip and menu"""
+        if step == "ready":
+            self.detector = self.warmup.detector
+            if self.icon:
+                self.detector.set_notifier(self.icon.notify)
+            self.warmup_status = None
+            if self.config.get("startup_report", False):
+                print(startup_report.format())
+                startup_report.save("startup_report.json")
+        elif step == "failed":
+            self.warmup_status = f"Failed to load: {self.warmup.error}"
+        else:
+            self.warmup_status = f"Loading ({index + 1}/{total}): {step}"
+
+        if self.icon:
+            self.icon.title = "Charlie-Kirkification" + (f" - {self.warmup_status}" if self.warmup_status else "")
+        self.update_menu()
+
     def start_detection(self, icon=None, item=None):
         """Start face detection"""
         if not self.is_detecting:
             self.is_detecting = True
-            self.detector.reload_config()  # Reload config in case settings changed
-            self.detector.start_detection()
+            self.update_menu()
+            if self.warmup.ready.is_set():
+                self._start_when_ready()
+            else:
+                # Clicked before warm-up finished - start as soon as it is done
+                threading.Thread(target=self._start_when_ready, daemon=True).start()
+
+    def _start_when_ready(self):
+        """Wait for warm-up, then start the detector"""
+        detector = self.warmup.wait()
+        if not self.is_detecting:
+            # Stopped while we were waiting
+            return
+        if detector is None:
+            self.is_detecting = False
             if self.icon:
-                self.icon.notify("Charlie-Kirkification is now watching you!", "Detection Started")
+                self.icon.notify(f"Could not start detection: {self.warmup.error}", "Detection Failed")
             self.update_menu()
+            return
+
+        detector.reload_config()  # Reload config in case settings changed
+        detector.start_detection()
+        if self.icon:
+            self.icon.notify("Charlie-Kirkification is now watching you!", "Detection Started")
 
     def stop_detection(self, icon=None, item=None):
         """Stop face detection"""
         if self.is_detecting:
             self.is_detecting = False
-            self.detector.stop_detection()
+            if self.detector:
+                self.detector.stop_detection()
             if self.icon:
                 self.icon.notify("Detection stopped. You can doomscroll freely now.", "Detection Stopped")
             self.update_menu()
@@ -50,14 +107,51 @@ class CharlieKirkApp:
 
     def open_settings(self, icon=None, item=None):
         """Open settings window"""
-        settings = SettingsWindow(self.detector.config_path)
+        settings = SettingsWindow(self.config_path)
         # Run in separate thread to avoid blocking
         settings_thread = threading.Thread(target=settings.show, daemon=True)
         settings_thread.start()
 
+    def open_stats(self, icon=None, item=None):
+        """Open live stats window"""
+        stats = StatsWindow(self.detector)
+        # Run in separate thread to avoid blocking
+        stats_thread = threading.Thread(target=stats.show, daemon=True)
+        stats_thread.start()
+
+    def toggle_profiling(self, icon=None, item=None):
+        """Start a profile capture (tray menu or SIGUSR1), or end the running one early"""
+        if self.detector is None:
+            return
+        if self.detector.toggle_profiling(on_done=self.on_profile_done) and self.icon:
+            self.icon.notify(f"Profiling for {self.config.get('profile_seconds', 10.0):.0f}s...", "Profiling")
+        self.update_menu()
+
+    def on_profile_done(self, capture):
+        """Tell the user where the capture was written"""
+        if self.icon:
+            self.icon.notify(f"Profile saved to {capture.directory}", "Profiling Finished")
+        self.update_menu()
+
+    def calibrate(self, icon=None, item=None):
+        """Run the guided calibration, starting detection first if it is off"""
+        if self.detector is None:
+            return
+        if not self.is_detecting:
+            self.start_detection()
+        self.detector.start_calibration(on_done=self.on_calibrated)
+
+    def on_calibrated(self, result):
+        """Reload the config the calibration saved, so the settings window shows it"""
+        if result is not None:
+            self.config = load_config(self.config_path)
+
     def quit_app(self, icon=None, item=None):
         """Quit the application"""
         self.stop_detection()
+        if self.detector:
+            # Release the camera and model kept warm after the last stop
+            self.detector.shutdown()
         if self.icon:
             self.icon.stop()
 
@@ -73,9 +167,17 @@ class CharlieKirkApp:
         else:
             toggle_text = "Start Detection"
 
+        status_items = [item(self.warmup_status, None, enabled=False)] if self.warmup_status else []
+        capture = self.detector.profile_capture if self.detector else None
+        profile_text = "Stop Profiling" if capture is not None and capture.active else "Profile"
+
         return pystray.Menu(
+            *status_items,
             item(toggle_text, self.toggle_detection),
             item("Settings", self.open_settings),
+            item("Stats", self.open_stats, enabled=self.detector is not None),
+            item("Calibrate", self.calibrate, enabled=self.detector is not None),
+            item(profile_text, self.toggle_profiling, enabled=self.detector is not None),
             pystray.Menu.SEPARATOR,
             item("Quit", self.quit_app)
         )
@@ -90,16 +192,28 @@ class CharlieKirkApp:
             menu=self.create_menu()
         )
 
+        # `kill -USR1 <pid>` toggles profiling without touching the tray (not on Windows)
+        if hasattr(signal, "SIGUSR1"):
+            signal.signal(signal.SIGUSR1, lambda signum, frame: self.toggle_profiling())
+
+        # Run the icon (this blocks until quit)
+        self.icon.run(setup=self.on_icon_ready)
+
+    def on_icon_ready(self, icon):
+        """Called once the tray icon exists: show it, then warm up in the background"""
+        icon.visible = True
+        startup_report.mark("tray icon visible")
+
         # Show notification on startup
-        self.icon.notify(
+        icon.notify(
             "Charlie-Kirkification is running in the system tray.\nRight-click the icon to access settings.",
             "App Started"
         )
-
-        # Run the icon (this blocks until quit)
-        self.icon.run()
+        self.warmup.start()
 
 
 if __name__ == "__main__":
+    # Needed for the preview process in the PyInstaller build
+    multiprocessing.freeze_support()
     app = CharlieKirkApp()
     app.run()
@@ -0,0 +1,230 @@
+import bisect
+import json
+import os
+import threading
+import time
+from stages import STAGES
+
+# Stage latency bucket upper bounds in seconds (Prometheus-style, cumulative on export)
+LATENCY_BUCKETS = [0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0]
+
+
+class Histogram:
+    """Fixed-bucket latency histogram; observe() is a bisect and two adds"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """Estimate a quantile (0-1) as the upper bound of the bucket it falls in
+
+        The overflow bucket has no upper bound; it reports the top bound
+        (so the estimate stays finite and the JSON export stays valid).
+        """
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return self.buckets[-1]
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean_ms": 1000 * self.sum / self.count if self.count else 0.0,
+            "p50_ms": 1000 * self.quantile(0.50),
+            "p95_ms": 1000 * self.quantile(0.95),
+            "p99_ms": 1000 * self.quantile(0.99),
+        }
+
+
+class NullMetrics:
+    """Metrics turned off: every hook is a no-op"""
+
+    enabled = False
+    current = {}
+
+    def start_frame(self):
+        pass
+
+    def lap(self, stage):
+        pass
+
+    def end_frame(self):
+        pass
+
+    def record_sample(self, timestamp, face_found, looking_down):
+        pass
+
+    def record_trigger(self):
+        pass
+
+    @property
+    def extra(self):
+        # Writes are discarded
+        return {}
+
+    def snapshot(self, source=None):
+        return None
+
+
+class DetectorMetrics:
+    """Counters and per-stage histograms for the detection loop
+
+    Doubles as the detector's stage timer, so stage latencies are recorded
+    from the same lap() calls the benchmark uses.
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self.started = time.time()
+        self.stages = {stage: Histogram() for stage in STAGES}
+        self.frames_processed = 0
+        self.faces_found = 0
+        self.triggers = 0
+        self.looking_down_seconds = 0.0
+        self.fps = 0.0
+        self.extra = {}
+        # Seconds per stage of the frame in progress
+        self.current = {}
+
+        self._last_sample = None
+        self._was_down = False
+        self._frame_start = None
+        self._last = None
+
+    def start_frame(self):
+        self.current.clear()
+        self._last = self._frame_start = time.perf_counter()
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            histogram = self.stages[stage] = Histogram()
+        histogram.observe(now - self._last)
+        self.current[stage] = self.current.get(stage, 0.0) + (now - self._last)
+        self._last = now
+
+    def end_frame(self):
+        self.frames_processed += 1
+
+    def record_sample(self, timestamp, face_found, looking_down):
+        """Count one decision sample; time spent looking down accrues between samples"""
+        if face_found:
+            self.faces_found += 1
+        if self._last_sample is not None:
+            interval = timestamp - self._last_sample
+            if self._was_down:
+                self.looking_down_seconds += interval
+            if interval > 0:
+                # Exponential moving average of the processed frame rate
+                self.fps = 0.9 * self.fps + 0.1 / interval if self.fps else 1.0 / interval
+        self._last_sample = timestamp
+        self._was_down = looking_down
+
+    def record_trigger(self):
+        self.triggers += 1
+
+    def snapshot(self, source=None):
+        """Return the current metrics as a plain dict"""
+        snapshot = {
+            "timestamp": time.time(),
+            "uptime_s": time.time() - self.started,
+            "fps": self.fps,
+            "frames_captured": source.frames_captured if source else 0,
+            "frames_dropped": source.frames_dropped if source else 0,
+            "frames_processed": self.frames_processed,
+            "face_found_rate": self.faces_found / self.frames_processed if self.frames_processed else 0.0,
+            "triggers": self.triggers,
+            "looking_down_seconds": self.looking_down_seconds,
+            # Copied first: lap() on the detection thread can add a stage while this runs
+            "stages": {stage: h.summary() for stage, h in dict(self.stages).items() if h.count},
+        }
+        snapshot.update(self.extra)
+        return snapshot
+
+    def prometheus(self, source=None):
+        """Render the current metrics in the Prometheus text exposition format"""
+        snapshot = self.snapshot(source)
+        lines = []
+        for name, key, kind in [
+            ("charlie_frames_captured_total", "frames_captured", "counter"),
+            ("charlie_frames_dropped_total", "frames_dropped", "counter"),
+            ("charlie_frames_processed_total", "frames_processed", "counter"),
+            ("charlie_triggers_total", "triggers", "counter"),
+            ("charlie_looking_down_seconds_total", "looking_down_seconds", "counter"),
+            ("charlie_face_found_ratio", "face_found_rate", "gauge"),
+            ("charlie_fps", "fps", "gauge"),
+        ]:
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{name} {snapshot[key]}")
+
+        lines.append("# TYPE charlie_stage_seconds histogram")
+        for stage, histogram in dict(self.stages).items():
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + [float("inf")], histogram.counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else bound
+                lines.append(f'charlie_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+            lines.append(f'charlie_stage_seconds_sum{{stage="{stage}"}} {histogram.sum}')
+            lines.append(f'charlie_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+
+class MetricsExporter:
+    """Periodically rewrite a Prometheus (.prom) or JSON snapshot file from a background thread"""
+
+    def __init__(self, metrics, path, interval=5.0, source_getter=lambda: None):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self.source_getter = source_getter
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+        self.write()
+
+    def write(self):
+        """Write one snapshot, atomically replacing the previous file"""
+        source = self.source_getter()
+        if str(self.path).endswith(".json"):
+            text = json.dumps(self.metrics.snapshot(source), indent=4)
+        else:
+            text = self.metrics.prometheus(source)
+
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                f.write(text)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Error writing metrics: {e}")
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.write()
@@ -0,0 +1,430 @@
+import multiprocessing as mp
+import queue
+import threading
+import time
+from collections import namedtuple
+from multiprocessing import shared_memory
+import cv2
+import numpy as np
+from estimators import GazeEstimate, create_estimator
+from gaze import iris_ratios
+from profiler import span
+from stages import NullStageTimer, StageTimer
+
+# Slot states: the feeder writes a frame, the inference process turns it into a result,
+# and the detection loop holds it while it decides and previews
+FREE, WRITING, READY, BUSY, DONE, HELD = range(6)
+
+# Per-slot header (float64): the fields below, then the six eye points. GENERATION says
+# which frame ring the pixels are in, since the ring is recreated for larger frames
+STATE, SEQ, TIMESTAMP, HEIGHT, WIDTH, CHANNELS, GENERATION, FOUND, CONFIDENCE, CONVERT, INFERENCE = range(11)
+POINTS = 11
+HEADER_SIZE = POINTS + 12
+
+# A frame handed to the detection loop, with the estimate the inference process made for it
+PipelineFrame = namedtuple("PipelineFrame", ["image", "timestamp", "seq", "estimate", "slot"])
+
+# Settings that need a new backend in the inference process rather than configure()
+BACKEND_KEYS = ["gaze_estimator", "face_landmarker_model"]
+
+
+def _oldest(headers, state, after=-1):
+    """Index of the slot in `state` with the lowest sequence number above `after`, or None"""
+    candidates = np.flatnonzero((headers[:, STATE] == state) & (headers[:, SEQ] > after))
+    if candidates.size == 0:
+        return None
+    return int(candidates[np.argmin(headers[candidates, SEQ])])
+
+
+def _slot_shape(header):
+    height, width, channels = int(header[HEIGHT]), int(header[WIDTH]), int(header[CHANNELS])
+    return (height, width, channels) if channels else (height, width)
+
+
+def _release(shm):
+    try:
+        shm.close()
+    except BufferError:
+        # A frame view is still alive somewhere; the mapping goes away with it
+        pass
+
+
+class InferencePipeline:
+    """Run capture, inference and decision as three overlapping stages
+
+    A feeder thread takes frames from the frame source and scales them
+    (capture_scale) straight into a slot of a shared-memory ring. A
+    separate process, out of reach of the detection thread's GIL, runs the
+    gaze backend on ready slots oldest first and writes the six points
+    back into the slot header. The detection loop picks up finished slots
+    with read(), decides and previews on the slot's own image, and hands
+    the slot back with recycle(). Slot states change under one
+    cross-process condition; pixels are written and read outside it.
+
+    When the feeder finds no free slot it overwrites the oldest frame still
+    waiting for inference, so slow inference sheds stale frames instead of
+    adding latency. While a result is waiting to be read it feeds nothing:
+    a detection loop that idles between frames (see FrameScheduler) or
+    falls behind would only throw newer results away. Frames from a
+    lossless source are never dropped; the feeder waits instead.
+
+    Stands in for the gaze backend in the detector (configure, warm_up,
+    close, stages), so the warm pool parks it, inference process included.
+    """
+
+    def __init__(self, config, slots=4):
+        self.config = config
+        self.slots = slots
+        self.capture_scale = config.get("capture_scale", 1.0)
+        # Backend stages run in the other process and come back in the slot headers
+        self.stages = NullStageTimer()
+        self.frames_dropped = 0
+        self.last_stages = {}
+        self.ctx = mp.get_context("spawn")
+        self.cond = self.ctx.Condition()
+        self.control = self.ctx.Queue()
+        self.ready = self.ctx.Event()
+        self.header_shm = shared_memory.SharedMemory(create=True, size=8 * HEADER_SIZE * slots)
+        self.headers = np.ndarray((slots, HEADER_SIZE), dtype=np.float64, buffer=self.header_shm.buf)
+        self.headers[:] = 0
+        self.headers[:, STATE] = FREE
+        self.frame_shm = None
+        self.slot_bytes = 0
+        self.generation = 0
+        self.process = None
+        self.source = None
+        self.lossless = False
+        self._feeder = None
+        self._feeding = False
+        self._fed_all = False
+        self._points = np.empty((6, 2), dtype=np.float64)
+
+    @property
+    def name(self):
+        return self.config.get("gaze_estimator", "facemesh")
+
+    @property
+    def exhausted(self):
+        """True once a finite source has ended and every frame it gave has been read"""
+        return self._fed_all and not np.isin(self.headers[:, STATE], (WRITING, READY, BUSY, DONE)).any()
+
+    def configure(self, config):
+        self.config = config
+        self.capture_scale = config["capture_scale"]
+        if self.process is not None:
+            self.control.put(("config", config))
+
+    def warm_up(self):
+        """Start the inference process and wait until its backend has run once"""
+        self._start_process()
+        if not self.ready.wait(60):
+            print("Error: inference process did not start")
+
+    def start(self, source):
+        """Feed frames from `source` until stop() (does nothing if already feeding)"""
+        if self._feeder is not None:
+            return
+        self._start_process()
+        self.source = source
+        self.lossless = source.lossless
+        self._fed_all = False
+        self._feeding = True
+        self._feeder = threading.Thread(target=self._feed, name="pipeline-feeder", daemon=True)
+        self._feeder.start()
+
+    def stop(self):
+        """Stop feeding and drop every frame in flight; the inference process stays warm"""
+        self._feeding = False
+        with self.cond:
+            self.cond.notify_all()
+        if self._feeder is not None and self._feeder is not threading.current_thread():
+            self._feeder.join(timeout=2)
+        self._feeder = None
+        self.source = None
+        with self.cond:
+            # A result still being computed is discarded, since its slot is no longer BUSY
+            self.headers[:, STATE] = FREE
+            self.cond.notify_all()
+
+    def read(self, after=-1, timeout=1.0):
+        """Wait for the oldest finished frame newer than `after`, return None on timeout or end of stream"""
+        deadline = time.perf_counter() + timeout
+        with self.cond:
+            while True:
+                slot = _oldest(self.headers, DONE, after)
+                if slot is not None:
+                    break
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0 or self.exhausted:
+                    slot = None
+                    break
+                self.cond.wait(remaining)
+            if slot is not None:
+                header = self.headers[slot]
+                header[STATE] = HELD
+                seq, timestamp, shape = int(header[SEQ]), header[TIMESTAMP], _slot_shape(header)
+                found, confidence = bool(header[FOUND]), float(header[CONFIDENCE])
+                if found:
+                    self._points[:] = header[POINTS:].reshape(6, 2)
+                self.last_stages = {"convert": float(header[CONVERT]), "inference": float(header[INFERENCE])}
+
+        if slot is None:
+            if self.process is not None and not self.process.is_alive():
+                print("Error: inference process exited, restarting it")
+                self._start_process()
+            return None
+
+        estimate = None
+        if found:
+            l_ratio, r_ratio = iris_ratios(self._points)
+            estimate = GazeEstimate(self._points, l_ratio, r_ratio, confidence)
+        return PipelineFrame(self._slot_view(slot, shape), timestamp, seq, estimate, slot)
+
+    def recycle(self, frame):
+        """Hand a frame from read() back once nothing uses its image any more"""
+        with self.cond:
+            header = self.headers[frame.slot]
+            if header[STATE] == HELD and header[SEQ] == frame.seq:
+                header[STATE] = FREE
+                self.cond.notify_all()
+
+    def stats(self):
+        """Return drop counters and the last frame's backend stage times for the metrics snapshot"""
+        return {
+            "pipeline_frames_dropped": self.frames_dropped,
+            "pipeline_convert_ms": self.last_stages.get("convert", 0.0) * 1000,
+            "pipeline_inference_ms": self.last_stages.get("inference", 0.0) * 1000,
+        }
+
+    def close(self):
+        self.stop()
+        if self.process is not None:
+            self.control.put(None)
+            self.process.join(timeout=2)
+            if self.process.is_alive():
+                self.process.terminate()
+            self.process = None
+        if self.frame_shm is not None:
+            _release(self.frame_shm)
+            self.frame_shm.unlink()
+            self.frame_shm = None
+        if self.header_shm is not None:
+            self.headers = None
+            _release(self.header_shm)
+            self.header_shm.unlink()
+            self.header_shm = None
+
+    def _start_process(self):
+        if self.process is not None and self.process.is_alive():
+            return
+        with self.cond:
+            # Slots the old process was working on will never finish
+            busy = self.headers[:, STATE] == BUSY
+            self.headers[busy, STATE] = FREE
+        self.ready.clear()
+        self.process = self.ctx.Process(
+            target=_inference_process,
+            args=(self.config, self.header_shm.name, self.slots, self.cond, self.control, self.ready),
+            daemon=True,
+        )
+        self.process.start()
+        if self.frame_shm is not None:
+            self.control.put(("buffer", self.frame_shm.name, self.slot_bytes, self.generation))
+
+    def _allocate(self, slot_bytes):
+        """(Re)create the frame ring for frames of up to `slot_bytes` once every frame in flight is through"""
+        with self.cond:
+            while not (self.headers[:, STATE] == FREE).all():
+                if not self._feeding:
+                    return False
+                self.cond.wait(0.1)
+            old = self.frame_shm
+            self.frame_shm = shared_memory.SharedMemory(create=True, size=slot_bytes * self.slots)
+            self.slot_bytes = slot_bytes
+            self.generation += 1
+            self.control.put(("buffer", self.frame_shm.name, slot_bytes, self.generation))
+        if old is not None:
+            _release(old)
+            old.unlink()
+        return True
+
+    def _slot_view(self, slot, shape):
+        return np.ndarray(shape, dtype=np.uint8, buffer=self.frame_shm.buf, offset=slot * self.slot_bytes)
+
+    def _feed(self):
+        """Feeder thread: capture and pre-processing stage"""
+        source = self.source
+        last_seq = -1
+        while self._feeding:
+            captured = source.read(after=last_seq, timeout=0.5)
+            if captured is None:
+                if source.exhausted:
+                    break
+                continue
+            last_seq = captured.seq
+            with span("pipeline.feed"):
+                self._write(captured)
+            # The image was copied into shared memory, so capture can decode into it again
+            source.recycle(captured)
+
+        self._fed_all = source.exhausted
+        with self.cond:
+            self.cond.notify_all()
+
+    def _write(self, captured):
+        image = captured.image
+        # Sized for unscaled frames, so changing capture_scale never needs a new ring
+        if image.nbytes > self.slot_bytes and not self._allocate(image.nbytes):
+            return
+        height, width = image.shape[:2]
+        scale = self.capture_scale
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        shape = (size[1], size[0]) + image.shape[2:]
+
+        slot = self._claim()
+        if slot is None:
+            return
+        view = self._slot_view(slot, shape)
+        if size == (width, height):
+            np.copyto(view, image)
+        else:
+            # Scaling straight into the slot is the copy into shared memory
+            cv2.resize(image, size, dst=view, interpolation=cv2.INTER_AREA)
+
+        with self.cond:
+            header = self.headers[slot]
+            header[SEQ] = captured.seq
+            header[TIMESTAMP] = captured.timestamp
+            header[HEIGHT], header[WIDTH] = shape[:2]
+            header[CHANNELS] = shape[2] if len(shape) > 2 else 0
+            header[GENERATION] = self.generation
+            header[STATE] = READY
+            self.cond.notify_all()
+
+    def _claim(self):
+        """Take a slot to write into once the last result was read, dropping the oldest queued frame if none is free"""
+        with self.cond:
+            while self._feeding:
+                slot = None
+                if self.lossless or not (self.headers[:, STATE] == DONE).any():
+                    slot = _oldest(self.headers, FREE)
+                    if slot is None and not self.lossless:
+                        slot = _oldest(self.headers, READY)
+                        if slot is not None:
+                            self.frames_dropped += 1
+                if slot is not None:
+                    self.headers[slot, STATE] = WRITING
+                    return slot
+                self.cond.wait(0.1)
+        return None
+
+
+class _InferenceWorker:
+    """The inference process's side of the ring: run the backend on READY slots"""
+
+    def __init__(self, config, header_name, slots, cond, control):
+        self.config = config
+        self.cond = cond
+        self.control = control
+        self.header_shm = shared_memory.SharedMemory(name=header_name)
+        self.headers = np.ndarray((slots, HEADER_SIZE), dtype=np.float64, buffer=self.header_shm.buf)
+        self.frame_shm = None
+        self.slot_bytes = 0
+        self.generation = 0
+        self.stages = StageTimer()
+        self.estimator = None
+        self._build()
+
+    def run(self):
+        while True:
+            try:
+                while True:
+                    if not self._handle(self.control.get_nowait()):
+                        return
+            except queue.Empty:
+                pass
+
+            with self.cond:
+                slot = _oldest(self.headers, READY)
+                if slot is None:
+                    self.cond.wait(0.1)
+                    continue
+                header = self.headers[slot]
+                header[STATE] = BUSY
+                seq, shape, generation = header[SEQ], _slot_shape(header), header[GENERATION]
+
+            # A new ring is announced before its first frame is marked ready, but may still be in the queue
+            while self.generation != generation:
+                if not self._handle(self.control.get()):
+                    return
+            self._estimate(slot, seq, shape)
+
+    def _estimate(self, slot, seq, shape):
+        image = np.ndarray(shape, dtype=np.uint8, buffer=self.frame_shm.buf, offset=slot * self.slot_bytes)
+        self.stages.start_frame()
+        try:
+            estimate = self.estimator.estimate(image)
+        except Exception as e:
+            print(f"Error in inference process: {e}")
+            estimate = None
+        del image
+
+        with self.cond:
+            header = self.headers[slot]
+            # Dropped by stop() or overwritten meanwhile: nobody wants this result
+            if header[STATE] != BUSY or header[SEQ] != seq:
+                return
+            header[FOUND] = estimate is not None
+            if estimate is not None:
+                header[CONFIDENCE] = estimate.confidence
+                header[POINTS:] = np.asarray(estimate.points, dtype=np.float64).ravel()
+            header[CONVERT] = self.stages.current.get("convert", 0.0)
+            header[INFERENCE] = self.stages.current.get("inference", 0.0)
+            header[STATE] = DONE
+            self.cond.notify_all()
+
+    def _handle(self, message):
+        """Apply one control message, return False on the stop message"""
+        if message is None:
+            return False
+        kind = message[0]
+        if kind == "buffer":
+            if self.frame_shm is not None:
+                _release(self.frame_shm)
+            _, name, self.slot_bytes, self.generation = message
+            self.frame_shm = shared_memory.SharedMemory(name=name)
+        elif kind == "config":
+            config = message[1]
+            rebuild = any(config.get(key) != self.config.get(key) for key in BACKEND_KEYS)
+            self.config = config
+            if rebuild:
+                self.estimator.close()
+                self._build()
+            else:
+                self.estimator.configure(config)
+        return True
+
+    def _build(self):
+        self.estimator = create_estimator(self.config)
+        self.estimator.warm_up()
+        # Only timed from here on: the timer laps relative to a frame start
+        self.estimator.stages = self.stages
+
+    def close(self):
+        self.estimator.close()
+        self.headers = None
+        _release(self.header_shm)
+        if self.frame_shm is not None:
+            _release(self.frame_shm)
+
+
+def _inference_process(config, header_name, slots, cond, control, ready):
+    """Inference process: build the backend, report ready, then serve the ring until told to stop"""
+    worker = _InferenceWorker(config, header_name, slots, cond, control)
+    ready.set()
+    try:
+        worker.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        worker.close()
@@ -0,0 +1,234 @@
+import cv2
+import multiprocessing as mp
+import numpy as np
+import queue
+import time
+from multiprocessing import shared_memory
+from buffers import ReusableBuffer
+
+PREVIEW_MODES = ["off", "in-process", "process"]
+WINDOW_TITLE = 'Charlie-Kirkification - Face Detection'
+ESC_KEY = 27
+
+
+def draw_overlays(frame, points):
+    """Draw the eye lid landmarks on a BGR frame"""
+    if points is None:
+        return
+    height, width = frame.shape[:2]
+    # All four lid points to pixels in one go
+    pixels = (np.asarray(points[:4]) * (width, height)).astype(np.int32).tolist()
+
+    # Left eye landmarks
+    for x, y in pixels[0:2]:
+        cv2.circle(frame, (x, y), 3, (0, 255, 255))
+
+    # Right eye landmarks
+    for x, y in pixels[2:4]:
+        cv2.circle(frame, (x, y), 3, (255, 255, 0))
+
+
+def window_closed(title):
+    """Whether the user closed the window with its close button (only valid after imshow)"""
+    return cv2.getWindowProperty(title, cv2.WND_PROP_VISIBLE) < 1
+
+
+class NoPreview:
+    """Headless mode: no drawing and no window calls"""
+
+    def show(self, frame, points, wait):
+        """Wait out the frame interval; there is no window to read keys from"""
+        if wait > 0:
+            time.sleep(wait)
+        return -1
+
+    def close(self):
+        pass
+
+
+class InProcessPreview:
+    """Draw and show the preview from the detection thread
+
+    Frames arrive as captured and are mirrored into a reused buffer for
+    display; `points` are already mirrored.
+    """
+
+    def __init__(self, title=WINDOW_TITLE):
+        self.title = title
+        self._mirrored = ReusableBuffer()
+
+    def show(self, frame, points, wait):
+        """Show the frame and wait for a key for up to `wait` seconds"""
+        frame = cv2.flip(frame, 1, dst=self._mirrored.view(frame.shape))
+        draw_overlays(frame, points)
+        cv2.imshow(self.title, frame)
+        key = cv2.waitKey(max(1, round(wait * 1000)))
+        if window_closed(self.title):
+            return ESC_KEY
+        return key
+
+    def close(self):
+        cv2.destroyAllWindows()
+
+
+class SharedMemoryPreview:
+    """Send frames to a separate preview process through a shared-memory ring buffer
+
+    Each slot holds one frame. A per-slot sequence number acts as a seqlock:
+    it is cleared before the slot is written and set afterwards, so the
+    preview process can tell a torn read and skip that frame. Only slot
+    numbers, shapes and the six landmark points travel over the queue.
+    """
+
+    def __init__(self, title=WINDOW_TITLE, slots=3):
+        self.title = title
+        self.slots = slots
+        self.shm = None
+        self.headers = None
+        self.shape = None
+        self.seq = 0
+        self.process = None
+        self.ctx = mp.get_context("spawn")
+        self.frames = self.ctx.Queue(maxsize=self.slots)
+        self.keys = self.ctx.Queue()
+
+    def _allocate(self, shape):
+        """(Re)create the ring buffer for frames of `shape`"""
+        self._release_buffer()
+        frame_bytes = int(np.prod(shape))
+        self.shm = shared_memory.SharedMemory(create=True, size=8 * self.slots + frame_bytes * self.slots)
+        self.headers = np.ndarray((self.slots,), dtype=np.int64, buffer=self.shm.buf)
+        self.headers[:] = -1
+        self.shape = shape
+
+        if self.process is None:
+            self.process = self.ctx.Process(
+                target=_preview_process,
+                args=(self.title, self.slots, self.frames, self.keys),
+                daemon=True,
+            )
+            self.process.start()
+
+    def _slot(self, index):
+        frame_bytes = int(np.prod(self.shape))
+        offset = 8 * self.slots + frame_bytes * index
+        return np.ndarray(self.shape, dtype=np.uint8, buffer=self.shm.buf, offset=offset)
+
+    def show(self, frame, points, wait):
+        """Publish the frame to the preview process and return any key it reported"""
+        if self.shape != frame.shape:
+            self._allocate(frame.shape)
+
+        index = self.seq % self.slots
+        self.headers[index] = -1
+        # Mirror straight into the slot: the copy into shared memory is the flip
+        cv2.flip(frame, 1, dst=self._slot(index))
+        self.headers[index] = self.seq
+
+        # The detector reuses its points array, and the queue pickles on a background thread
+        message = (self.shm.name, self.shape, index, self.seq, None if points is None else points.tolist())
+        try:
+            self.frames.put_nowait(message)
+        except queue.Full:
+            # Preview is behind - it will pick up a newer frame next time
+            pass
+        self.seq += 1
+
+        if wait > 0:
+            time.sleep(wait)
+
+        key = -1
+        try:
+            while True:
+                key = self.keys.get_nowait()
+        except queue.Empty:
+            pass
+        if self.process is not None and not self.process.is_alive():
+            # Preview window was closed from outside - treat like ESC
+            key = ESC_KEY
+        return key
+
+    def close(self):
+        if self.process is not None:
+            try:
+                self.frames.put(None, timeout=1)
+            except queue.Full:
+                pass
+            self.process.join(timeout=2)
+            if self.process.is_alive():
+                self.process.terminate()
+            self.process = None
+        self._release_buffer()
+
+    def _release_buffer(self):
+        if self.shm is not None:
+            self.headers = None
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+
+def _slot_seq(shm, index):
+    """Read a slot's sequence number without keeping a view on the buffer (so it can be closed)"""
+    return int(np.ndarray((1,), dtype=np.int64, buffer=shm.buf, offset=8 * index)[0])
+
+
+def _preview_process(title, slots, frames, keys):
+    """Preview process: show frames from shared memory and report key presses"""
+    shm = None
+    shm_name = None
+
+    while True:
+        message = frames.get()
+        # Skip to the newest frame that is waiting
+        try:
+            while message is not None:
+                message = frames.get_nowait()
+        except queue.Empty:
+            pass
+        if message is None:
+            break
+
+        name, shape, index, seq, points = message
+        if name != shm_name:
+            if shm is not None:
+                shm.close()
+                shm = None
+            try:
+                shm = shared_memory.SharedMemory(name=name)
+            except FileNotFoundError:
+                # Ring buffer was reallocated for a new frame size
+                shm_name = None
+                continue
+            shm_name = name
+
+        frame_bytes = int(np.prod(shape))
+        if _slot_seq(shm, index) != seq:
+            continue
+        frame = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf, offset=8 * slots + frame_bytes * index).copy()
+        if _slot_seq(shm, index) != seq:
+            # Overwritten while copying
+            continue
+
+        draw_overlays(frame, points)
+        cv2.imshow(title, frame)
+        key = cv2.waitKey(1)
+        if window_closed(title):
+            # Closing the window does not end this process by itself - tell the detector, like ESC
+            keys.put(ESC_KEY)
+            break
+        if key != -1:
+            keys.put(key)
+
+    if shm is not None:
+        shm.close()
+    cv2.destroyAllWindows()
+
+
+def create_preview(mode):
+    """Build the preview for a `preview` config value"""
+    if mode == "off":
+        return NoPreview()
+    if mode == "process":
+        return SharedMemoryPreview()
+    return InProcessPreview()
@@ -0,0 +1,229 @@
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+# The capture in progress, if any; span() only looks at this when nothing is being recorded
+_capture = None
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    def __init__(self, capture, name):
+        self.capture = capture
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.capture.add(self.name, self.start, time.perf_counter())
+        return False
+
+
+def span(name):
+    """Time a block on the calling thread while a capture is running (a shared no-op otherwise)"""
+    capture = _capture
+    if capture is None:
+        return _NULL_SPAN
+    return _Span(capture, name)
+
+
+class ProfileCapture:
+    """Record spans from every thread for `seconds`, then write a Chrome trace and collapsed stacks
+
+    Spans come from span() blocks and from the detector's stage laps (see
+    TracingStageTimer). A sampling thread also snapshots every thread's
+    Python stack every `sample_interval` seconds for the flame graph. With
+    `cprofile`, the detection thread additionally runs under cProfile while
+    it is attached.
+
+    Output, in `directory`:
+    - profile-<time>.trace.json: open in chrome://tracing or ui.perfetto.dev
+    - profile-<time>.collapsed.txt: one "thread;frame;frame count" line per stack, for flamegraph.pl
+    - profile-<time>.prof: cProfile stats (pstats / snakeviz), with `cprofile`
+    """
+
+    def __init__(self, seconds=10.0, directory="profiles", sample_interval=0.005, cprofile=False, on_done=None):
+        self.seconds = seconds
+        self.directory = Path(directory)
+        self.sample_interval = sample_interval
+        self.cprofile = cProfile.Profile() if cprofile else None
+        self.on_done = on_done
+        self.started = None
+        self.finished = False
+        self.paths = {}
+        self.spans = []
+        self.thread_names = {}
+        self.stacks = Counter()
+        self._prefix = None
+        self._attached = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start recording; returns immediately, the capture ends by itself after `seconds`"""
+        global _capture
+        self.started = time.perf_counter()
+        self._prefix = self.directory / f"profile-{time.strftime('%Y%m%d-%H%M%S')}"
+        _capture = self
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    @property
+    def active(self):
+        return self.started is not None and not self.finished
+
+    def add(self, name, start, end, tid=None):
+        """Record one span (perf_counter times) on thread `tid` (default: the calling thread)"""
+        if tid is None:
+            tid = threading.get_ident()
+        if tid not in self.thread_names:
+            self.thread_names[tid] = threading.current_thread().name
+        # list.append is atomic, so threads need no lock here
+        self.spans.append((name, tid, start, end))
+
+    def attach(self):
+        """Run the calling thread under cProfile until detach() (a no-op without `cprofile`)"""
+        if self.cprofile is not None and self._attached is None:
+            self._attached = threading.get_ident()
+            self.cprofile.enable()
+
+    def detach(self):
+        """Stop cProfile on the attached thread and write its stats; call from that same thread"""
+        if self._attached is None or self._attached != threading.get_ident():
+            return
+        self.cprofile.disable()
+        self._attached = None
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._prefix.with_suffix(".prof")
+        self.cprofile.dump_stats(path)
+        self.paths["cprofile"] = path
+
+    def stop(self):
+        """End the capture now and write the trace and collapsed-stack files"""
+        global _capture
+        with self._lock:
+            if self.finished or self.started is None:
+                return self.paths
+            self.finished = True
+            if _capture is self:
+                _capture = None
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2)
+
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self.paths["trace"] = self._write_trace()
+            self.paths["collapsed"] = self._write_collapsed()
+        except OSError as e:
+            print(f"Error writing profile: {e}")
+        if self.on_done:
+            self.on_done(self)
+        return self.paths
+
+    def _run(self):
+        """Sample every thread's stack until the capture ends, then stop it"""
+        deadline = self.started + self.seconds
+        me = threading.get_ident()
+        while True:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            if self._stop.wait(min(self.sample_interval, remaining) if self.sample_interval > 0 else remaining):
+                return
+            if self.sample_interval > 0:
+                self._sample(me)
+        self.stop()
+
+    def _sample(self, me):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for tid, frame in sys._current_frames().items():
+            if tid == me:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+                frame = frame.f_back
+            stack.append(names.get(tid, str(tid)))
+            self.stacks[";".join(reversed(stack))] += 1
+
+    def _write_trace(self):
+        """Chrome trace event format: one complete ("X") event per span, timestamps in microseconds"""
+        pid = os.getpid()
+        events = [
+            {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+            for tid, name in self.thread_names.items()
+        ]
+        for name, tid, start, end in self.spans:
+            events.append({
+                "name": name,
+                "ph": "X",
+                "pid": pid,
+                "tid": tid,
+                "ts": (start - self.started) * 1e6,
+                "dur": (end - start) * 1e6,
+            })
+        path = self._prefix.with_suffix(".trace.json")
+        with open(path, 'w') as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        return path
+
+    def _write_collapsed(self):
+        path = self._prefix.with_suffix(".collapsed.txt")
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
+
+
+class TracingStageTimer:
+    """Stage timer that forwards to another one and records every lap as a span of `capture`
+
+    The detector swaps it in only while a capture runs, so its stage timer
+    costs nothing extra the rest of the time.
+    """
+
+    def __init__(self, inner, capture):
+        self.inner = inner
+        self.capture = capture
+        self._tid = None
+        self._frame_start = None
+        self._last = None
+
+    @property
+    def current(self):
+        return self.inner.current
+
+    def start_frame(self):
+        self.inner.start_frame()
+        self._tid = threading.get_ident()
+        self._last = self._frame_start = time.perf_counter()
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        self.inner.lap(stage)
+        self.capture.add(stage, self._last, now, self._tid)
+        self._last = now
+
+    def end_frame(self):
+        self.inner.end_frame()
+        self.capture.add("frame", self._frame_start, time.perf_counter(), self._tid)
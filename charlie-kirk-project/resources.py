@@ -0,0 +1,60 @@
+import threading
+
+
+class WarmResourcePool:
+    """Keep expensive resources (camera handle, FaceMesh graph) alive for a grace period after use
+
+    park() hands a resource to the pool and starts its grace timer; take()
+    gets it back (if it is still there and was parked under the same key)
+    and cancels the timer. When the timer fires the resource is released,
+    so the camera LED turns off and other apps can use the device.
+    """
+
+    def __init__(self, grace_period=30.0):
+        self.grace_period = grace_period
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def park(self, name, resource, release, key=None):
+        """Keep `resource` warm; call release(resource) if nobody takes it within the grace period"""
+        with self._lock:
+            self._discard(name)
+            if self.grace_period <= 0:
+                release(resource)
+                return
+            timer = threading.Timer(self.grace_period, self._expire, args=(name, resource))
+            timer.daemon = True
+            self._entries[name] = (resource, release, key, timer)
+            timer.start()
+
+    def take(self, name, key=None):
+        """Return the parked resource if it matches `key`, otherwise release it and return None"""
+        with self._lock:
+            entry = self._entries.pop(name, None)
+            if entry is None:
+                return None
+            resource, release, parked_key, timer = entry
+            timer.cancel()
+            if parked_key != key:
+                release(resource)
+                return None
+            return resource
+
+    def release_all(self):
+        with self._lock:
+            for name in list(self._entries):
+                self._discard(name)
+
+    def _discard(self, name):
+        entry = self._entries.pop(name, None)
+        if entry is not None:
+            resource, release, _, timer = entry
+            timer.cancel()
+            release(resource)
+
+    def _expire(self, name, resource):
+        with self._lock:
+            entry = self._entries.get(name)
+            # Ignore a timer that lost the race with take() or a newer park()
+            if entry is not None and entry[0] is resource:
+                self._discard(name)
@@ -0,0 +1,100 @@
+import cv2
+from buffers import ReusableBuffer
+from gaze import FACE_EXTENT_LANDMARKS, landmark_points
+
+
+class FaceROITracker:
+    """Crop each frame to a padded box around the face found in the previous frame
+
+    FaceMesh then only sees the face region, optionally downscaled to a fixed
+    inference size, instead of the full camera frame. Landmarks computed on
+    the crop are mapped back to full-frame space with `box`.
+    """
+
+    def __init__(self, padding=0.3, inference_size=256):
+        self.padding = padding
+        self.inference_size = inference_size
+        self.box = None
+        self._resized = ReusableBuffer()
+
+    @property
+    def tracking(self):
+        return self.box is not None
+
+    def crop(self, frame):
+        """Return (image, box) to run inference on; box is None for a full-frame search"""
+        if self.box is None:
+            return self._resize(frame), None
+
+        x, y, w, h = self.box
+        if x + w > frame.shape[1] or y + h > frame.shape[0]:
+            # Frame size changed under us (e.g. replaying an image folder)
+            self.lost()
+            return self._resize(frame), None
+        return self._resize(frame[y:y + h, x:x + w]), self.box
+
+    def update(self, landmarks, box, frame_size):
+        """Track the face for the next frame from landmarks found on this one"""
+        points = landmark_points(landmarks, FACE_EXTENT_LANDMARKS, box, frame_size)
+        fw, fh = frame_size
+        xs = [p[0] * fw for p in points]
+        ys = [p[1] * fh for p in points]
+
+        # Square box around the face extents, padded on every side and clipped to the frame
+        cx = (min(xs) + max(xs)) / 2
+        cy = (min(ys) + max(ys)) / 2
+        side = max(max(xs) - min(xs), max(ys) - min(ys)) * (1 + 2 * self.padding)
+        x0 = int(max(cx - side / 2, 0))
+        y0 = int(max(cy - side / 2, 0))
+        x1 = int(min(cx + side / 2, fw))
+        y1 = int(min(cy + side / 2, fh))
+
+        if x1 - x0 < 16 or y1 - y0 < 16:
+            self.lost()
+        else:
+            self.box = (x0, y0, x1 - x0, y1 - y0)
+
+    def lost(self):
+        """Drop the tracked box so the next frame is searched in full"""
+        self.box = None
+
+    def _resize(self, image):
+        if not self.inference_size:
+            return image
+        h, w = image.shape[:2]
+        scale = self.inference_size / max(w, h)
+        if scale >= 1:
+            return image
+        size = (max(1, round(w * scale)), max(1, round(h * scale)))
+        return cv2.resize(image, size, dst=self._resized.view((size[1], size[0]) + image.shape[2:]), interpolation=cv2.INTER_AREA)
+
+
+class ROIComparison:
+    """Accumulate how far ROI ratios drift from full-frame ratios on the same frames"""
+
+    def __init__(self, report_every=100):
+        self.report_every = report_every
+        self.samples = 0
+        self.misses = 0
+        self.max_error = 0.0
+        self.total_error = 0.0
+
+    def add(self, roi_ratios, full_ratios):
+        """Record one frame; either side may be None if no face was found"""
+        self.samples += 1
+        if roi_ratios is None or full_ratios is None:
+            if roi_ratios != full_ratios:
+                self.misses += 1
+        else:
+            error = max(abs(roi_ratios[0] - full_ratios[0]), abs(roi_ratios[1] - full_ratios[1]))
+            self.max_error = max(self.max_error, error)
+            self.total_error += error
+
+        if self.samples % self.report_every == 0:
+            print(self.summary())
+
+    def summary(self):
+        matched = self.samples - self.misses
+        mean_error = self.total_error / matched if matched else 0.0
+        return (f"ROI vs full frame: {self.samples} frames, {self.misses} face mismatches, "
+                f"mean ratio error {mean_error:.4f}, max {self.max_error:.4f}")
@@ -0,0 +1,45 @@
+class FrameScheduler:
+    """Pick the delay before the next frame from the current gaze state
+
+    Far from the threshold (or with no face) the detector idles at a low rate;
+    as the iris ratios approach the threshold, or while the trigger timer is
+    running, it ramps up to the full camera rate.
+    """
+
+    def __init__(self, config):
+        self.interval = 0.0
+        self.apply_config(config)
+
+    def apply_config(self, config):
+        """Read rate limits from config"""
+        self.min_interval = 1.0 / config.get("max_fps", 30)
+        self.idle_interval = max(config.get("idle_interval", 0.25), self.min_interval)
+        self.no_face_interval = max(config.get("no_face_interval", 0.5), self.min_interval)
+        self.near_margin = config.get("scheduler_near_margin", 0.1)
+        self.far_margin = max(config.get("scheduler_far_margin", 0.3), self.near_margin + 1e-6)
+        # How much the interval may grow per frame when backing off (ramping up is immediate)
+        self.backoff = config.get("scheduler_backoff", 1.5)
+        self.interval = self.min_interval
+
+    def next_interval(self, face_found, l_ratio=None, r_ratio=None, threshold=None, timer_running=False):
+        """Return the target seconds between this frame and the next"""
+        if timer_running:
+            target = self.min_interval
+        elif not face_found:
+            target = self.no_face_interval
+        else:
+            # Both eyes must drop below the threshold, so the larger ratio is the one that matters
+            distance = max(l_ratio, r_ratio) - threshold
+            span = self.far_margin - self.near_margin
+            t = min(max((distance - self.near_margin) / span, 0.0), 1.0)
+            target = self.min_interval + (self.idle_interval - self.min_interval) * t
+
+        if target < self.interval:
+            self.interval = target
+        else:
+            self.interval = min(target, max(self.interval, self.min_interval) * self.backoff)
+        return self.interval
+
+    def wait_time(self, frame_started, now):
+        """Seconds left to wait once the frame that began at `frame_started` has been processed"""
+        return max(self.interval - (now - frame_started), 0.0)
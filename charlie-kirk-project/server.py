@@ -0,0 +1,344 @@
+"""Run detection on several streams at once, spread across a pool of worker processes
+
+Examples:
+    python server.py 0 1                                  # two cameras
+    python server.py rtsp://127.0.0.1:8554/desk1 desk2.mp4 --workers 2
+    python server.py a.mp4 b.mp4 c.mp4 d.mp4 --bench --frames 600   # throughput over local video files or image folders
+"""
+import argparse
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from collections import namedtuple
+from config import load_config, trigger_min_confidence
+
+TriggerEvent = namedtuple("TriggerEvent", ["stream_id", "source", "worker_id", "timestamp", "l_ratio", "r_ratio"])
+
+# How often workers report per-stream frame counts
+STATS_INTERVAL = 1.0
+
+
+class _Stream:
+    """Per-stream state inside a worker: its frame source, ROI/flow tracking and trigger engine"""
+
+    def __init__(self, stream_id, spec, config, face_mesh, realtime, max_frames):
+        from estimators import create_estimator
+        from frame_source import ImageDirectorySource, VideoFileSource, create_frame_source
+        from timeline import TriggerEngine
+        from tracking import LandmarkTracker
+
+        self.stream_id = stream_id
+        self.spec = spec
+        self.frames = 0
+        self.last_seq = -1
+        # Wall-clock times of the first and latest processed frame, comparable across workers
+        self.first_frame = None
+        self.last_frame = None
+
+        stream_config = dict(config, frame_source=spec)
+        self.source = create_frame_source(stream_config, lossless=not realtime)
+        local = isinstance(self.source, (VideoFileSource, ImageDirectorySource)) and "://" not in str(spec)
+        if local:
+            # Image folders play once like video files, so --bench and --frames runs end
+            self.source.loop = False
+            self.source.realtime = realtime
+            self.source.max_frames = max_frames
+        # Files replayed faster than real time are timed by their own frame rate, so triggers do not depend on speed
+        self.media_time = local and not self.source.realtime
+
+        self.estimator = create_estimator(stream_config, face_mesh)
+        self.tracker = None
+        if config["tracking_enabled"]:
+            self.tracker = LandmarkTracker(
+                full_every=config["tracking_full_every"],
+                min_confidence=config["tracking_min_confidence"],
+                motion_threshold=config["tracking_motion_threshold"],
+            )
+        self.engine = TriggerEngine(
+            config["iris_threshold"], config["timer"], trigger_min_confidence(config), config["iris_hysteresis"]
+        )
+
+    def process(self, captured):
+        """Run one frame through the pipeline, return (timestamp, l_ratio, r_ratio) if it triggers"""
+        from gaze import iris_ratios, mirror_points
+
+        self.last_seq = captured.seq
+        self.frames += 1
+        self.last_frame = time.time()
+        if self.first_frame is None:
+            self.first_frame = self.last_frame
+        frame = captured.image
+        if self.tracker:
+            points, confidence, _ = self.tracker.step(frame, self.estimator.estimate)
+        else:
+            estimate = self.estimator.estimate(frame)
+            points, confidence = (estimate.points, estimate.confidence) if estimate else (None, 0.0)
+
+        timestamp = captured.seq / self.source.fps if self.media_time else captured.timestamp
+        self.source.recycle(captured)
+        if points is None:
+            return None
+        # Same left/right as the tray app, which mirrors the points of the unflipped frame
+        l_ratio, r_ratio = iris_ratios(mirror_points(points))
+        if self.engine.update(timestamp, l_ratio, r_ratio, True, confidence):
+            return timestamp, l_ratio, r_ratio
+        return None
+
+    def report(self):
+        return self.stream_id, self.frames, self.first_frame, self.last_frame
+
+    def close(self):
+        self.source.stop()
+        self.estimator.close()
+
+
+def _worker_main(worker_id, streams, config, realtime, max_frames, events, stop):
+    """Worker process: one gaze model shared by all of this worker's streams, visited round-robin"""
+    face_mesh = None
+    if config["gaze_estimator"] == "facemesh":
+        import mediapipe as mp
+        # Static image mode keeps no landmark tracking state inside the graph, so streams cannot
+        # confuse each other; each stream's own ROI tracker still keeps inference on a small crop
+        face_mesh = mp.solutions.face_mesh.FaceMesh(static_image_mode=True, refine_landmarks=True)
+
+    active = []
+    finished = []
+    for stream_id, spec in streams:
+        stream = _Stream(stream_id, spec, config, face_mesh, realtime, max_frames)
+        if stream.source.start():
+            active.append(stream)
+        else:
+            print(f"Error opening stream {stream_id} ({spec})")
+            finished.append(stream)
+            events.put(("done", worker_id, stream.report()))
+
+    next_stats = time.perf_counter() + STATS_INTERVAL
+    while active and not stop.is_set():
+        progressed = False
+        for stream in list(active):
+            captured = stream.source.read(after=stream.last_seq, timeout=0)
+            if captured is None:
+                if stream.source.exhausted:
+                    active.remove(stream)
+                    finished.append(stream)
+                    events.put(("done", worker_id, stream.report()))
+                continue
+            progressed = True
+            trigger = stream.process(captured)
+            if trigger:
+                events.put(("trigger", TriggerEvent(stream.stream_id, stream.spec, worker_id, *trigger)))
+
+        now = time.perf_counter()
+        if now >= next_stats:
+            events.put(("stats", worker_id, {stream.stream_id: stream.frames for stream in active}))
+            next_stats = now + STATS_INTERVAL
+        if not progressed:
+            # Every stream is waiting on its capture thread
+            stop.wait(0.002)
+
+    for stream in active:
+        events.put(("done", worker_id, stream.report()))
+    for stream in active + finished:
+        stream.close()
+    if face_mesh is not None:
+        face_mesh.close()
+
+
+class TriggerDispatcher:
+    """Collect events from every worker on one thread and hand triggers to `on_trigger(event)`"""
+
+    def __init__(self, events, on_trigger=None):
+        self.events = events
+        self.on_trigger = on_trigger or self.print_trigger
+        self.frames = {}
+        self.spans = {}
+        self.triggers = []
+        self.done = set()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+        # Whatever the workers sent last
+        while True:
+            try:
+                self._handle(*self.events.get_nowait())
+            except queue.Empty:
+                break
+
+    def print_trigger(self, event):
+        print(f"Trigger on stream {event.stream_id} ({event.source}) at {event.timestamp:.2f}s")
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                message = self.events.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            self._handle(*message)
+
+    def _handle(self, kind, *payload):
+        if kind == "trigger":
+            event = payload[0]
+            self.triggers.append(event)
+            try:
+                self.on_trigger(event)
+            except Exception as e:
+                print(f"Error handling trigger: {e}")
+        elif kind == "stats":
+            self.frames.update(payload[1])
+        elif kind == "done":
+            stream_id, frames, first_frame, last_frame = payload[1]
+            self.frames[stream_id] = frames
+            if first_frame is not None:
+                self.spans[stream_id] = (first_frame, last_frame)
+            self.done.add(stream_id)
+
+
+class DetectionServer:
+    """Spread stream sources across worker processes, each with its own gaze model
+
+    Streams are dealt round-robin to `workers` processes (default: one per
+    core, at most one per stream). Sources are camera indices, stream URLs,
+    video files or image folders, as for `frame_source` in config.json.
+    """
+
+    def __init__(self, streams, config_path="config.json", workers=None, realtime=True, max_frames=None, on_trigger=None):
+        self.streams = [int(spec) if str(spec).isdigit() else spec for spec in streams]
+        self.config = load_config(config_path)
+        self.workers = max(1, min(workers or os.cpu_count() or 1, len(self.streams)))
+        self.realtime = realtime
+        self.max_frames = max_frames
+
+        self.ctx = multiprocessing.get_context("spawn")
+        self.events = self.ctx.Queue()
+        self.stop_event = self.ctx.Event()
+        self.dispatcher = TriggerDispatcher(self.events, on_trigger)
+        self.processes = []
+        self.started = None
+
+    def start(self):
+        self.started = time.perf_counter()
+        self.dispatcher.start()
+        for worker_id in range(self.workers):
+            assigned = [(i, spec) for i, spec in enumerate(self.streams) if i % self.workers == worker_id]
+            process = self.ctx.Process(
+                target=_worker_main,
+                args=(worker_id, assigned, self.config, self.realtime, self.max_frames, self.events, self.stop_event),
+                daemon=True,
+            )
+            process.start()
+            self.processes.append(process)
+
+    def wait(self, timeout=None):
+        """Block until every stream has ended (or `timeout` seconds), return True if they all did"""
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while len(self.dispatcher.done) < len(self.streams):
+            if deadline is not None and time.perf_counter() >= deadline:
+                return False
+            if not any(process.is_alive() for process in self.processes):
+                break
+            time.sleep(0.05)
+        return len(self.dispatcher.done) >= len(self.streams)
+
+    def stop(self):
+        self.stop_event.set()
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self.dispatcher.stop()
+        self.processes = []
+
+    def stats(self):
+        """Return per-stream and total frames processed, and the total frame rate
+
+        Once streams have finished, the rate is measured from the first to the
+        last processed frame, so worker start-up (model loading) is not counted.
+        """
+        elapsed = time.perf_counter() - self.started if self.started else 0.0
+        frames = dict(self.dispatcher.frames)
+        total = sum(frames.values())
+        spans = list(self.dispatcher.spans.values())
+        if spans and len(self.dispatcher.done) >= len(self.streams):
+            elapsed = max(end for _, end in spans) - min(start for start, _ in spans)
+        return {
+            "workers": self.workers,
+            "streams": len(self.streams),
+            "elapsed_s": elapsed,
+            "frames": frames,
+            "total_frames": total,
+            "total_fps": total / elapsed if elapsed else 0.0,
+            "triggers": len(self.dispatcher.triggers),
+        }
+
+
+def spam_handler():
+    """Trigger handler that plays the sound and shows the spam overlay, like the tray app"""
+    from pathlib import Path
+    from actions import ActionDispatcher, OverlayAction, SoundAction
+    from audio import AudioPlayer
+    from spam import SpamImageCache, SpamOverlay
+
+    config = load_config()
+    audio = AudioPlayer()
+    overlay = SpamOverlay(SpamImageCache(Path("assets/spam"), max_bytes=config["spam_cache_mb"] * 1024 * 1024))
+    overlay.start()
+    actions = [OverlayAction(overlay, config["spam_loops"], config["action_min_interval"])]
+    if config["sound_enabled"]:
+        audio.load(config["sound_path"])
+        actions.insert(0, SoundAction(audio, config["action_min_interval"]))
+    # Triggers from every stream share one rate limit, so several streams firing together play once
+    dispatcher = ActionDispatcher(actions, max_queue=config["action_queue_size"])
+
+    def handle(event):
+        print(f"Trigger on stream {event.stream_id} ({event.source})")
+        dispatcher.trigger(event.l_ratio, event.r_ratio)
+    return handle
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Charlie-Kirkification detection on several streams at once")
+    parser.add_argument("streams", nargs="+", help="Camera indices, stream URLs, video files or image folders")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: one per core, at most one per stream)")
+    parser.add_argument("--config", default="config.json", help="Config file shared by every stream")
+    parser.add_argument("--bench", action="store_true", help="Replay files as fast as possible and report throughput")
+    parser.add_argument("--frames", type=int, help="Stop each file stream after this many frames")
+    parser.add_argument("--spam", action="store_true", help="Play the sound and show the overlay on triggers")
+    args = parser.parse_args()
+
+    server = DetectionServer(
+        args.streams,
+        config_path=args.config,
+        workers=args.workers,
+        realtime=not args.bench,
+        max_frames=args.frames,
+        on_trigger=spam_handler() if args.spam else None,
+    )
+    server.start()
+    try:
+        server.wait()
+    except KeyboardInterrupt:
+        pass
+    stats = server.stats()
+    server.stop()
+
+    print(f"{stats['streams']} streams on {stats['workers']} workers, {stats['elapsed_s']:.1f}s")
+    for stream_id, frames in sorted(stats["frames"].items()):
+        print(f"  stream {stream_id} ({server.streams[stream_id]}): {frames} frames")
+    print(f"Total: {stats['total_frames']} frames, {stats['total_fps']:.1f} FPS, {stats['triggers']} triggers")
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    main()
@@ -0,0 +1,272 @@
+import json
+import mmap
+import os
+import threading
+import time
+from pathlib import Path
+import numpy as np
+from stages import STAGES
+
+MAGIC = b"CKLOG01\n"
+LOG_SUFFIX = ".cklog"
+
+# Flag bits in each record's `flags` field
+FACE = 1
+DOWN = 2
+TRIGGER = 4
+
+# One fixed-width record per processed frame; stage latencies are NaN when metrics are off
+RECORD_DTYPE = np.dtype(
+    [("timestamp", "<f8"), ("l_ratio", "<f4"), ("r_ratio", "<f4"), ("confidence", "<f4"), ("flags", "u1")]
+    + [(f"{stage}_ms", "<f4") for stage in STAGES],
+    align=True,
+)
+
+# File layout: magic, record count (u8, updated in place), header size (u4), JSON dtype description
+# padded to HEADER_ALIGN, then the records
+HEADER_ALIGN = 64
+# Files grow by this much at a time, so a crash leaves at most this much unused space at the end
+GROW_BYTES = 1024 * 1024
+_COUNT = slice(8, 16)
+_NAN = float("nan")
+
+
+class SessionLog:
+    """Append-only binary log of gaze samples written through a memory-mapped file
+
+    Each file grows in GROW_BYTES steps up to `max_bytes`. append() only
+    stores one record into the mapping and bumps the count in the header, so
+    the detection thread makes system calls only when it remaps a grown file
+    (every few thousand records). A background thread flushes dirty pages
+    every `flush_interval` seconds. A full file is trimmed to its records and
+    the log rotates to a new one. Files left untrimmed by a crash are trimmed
+    by the next open().
+    """
+
+    def __init__(self, directory="logs", max_bytes=64 * 1024 * 1024, flush_interval=5.0):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.path = None
+        self.count = 0
+        # Records the current mapping holds, and the most the file may grow to
+        self.capacity = 0
+        self.max_records = 0
+        self._header_size = 0
+        self._file = None
+        self._mmap = None
+        self._records = None
+        self._header = None
+        self._sequence = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def is_open(self):
+        return self._mmap is not None
+
+    def open(self):
+        """Trim files a crash left behind, start a new log file and the flush thread"""
+        with self._lock:
+            recover_logs(self.directory)
+            self._open_file()
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def append(self, timestamp, l_ratio, r_ratio, confidence, flags, stages=None):
+        """Store one sample; `stages` maps stage name to seconds for this frame"""
+        if self.count >= self.capacity:
+            self._grow()
+        stages = stages or {}
+        # One tuple store into the mapping (about a microsecond, far cheaper than field-by-field)
+        self._records[self.count] = (
+            timestamp,
+            _NAN if l_ratio is None else l_ratio,
+            _NAN if r_ratio is None else r_ratio,
+            confidence,
+            flags,
+            *[stages[stage] * 1000 if stage in stages else _NAN for stage in STAGES],
+        )
+        self.count += 1
+        # Readers only trust records below the count, so it is written last
+        self._header[0] = self.count
+
+    def flush(self):
+        with self._lock:
+            if self._mmap is not None:
+                self._mmap.flush()
+
+    def close(self):
+        """Stop the flush thread and trim the current file to its records"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+        with self._lock:
+            self._close_file()
+
+    def _grow(self):
+        """Map another GROW_BYTES of the current file, or rotate to a new file once it is full"""
+        with self._lock:
+            if self.capacity < self.max_records:
+                self._map(min(self.max_records, self.capacity + max(1, GROW_BYTES // RECORD_DTYPE.itemsize)))
+                return
+            self._close_file()
+            self._open_file()
+
+    def _map(self, capacity):
+        """(Re)map the current file with room for `capacity` records, extending the file to match"""
+        # NumPy views must go before the mapping can close
+        self._records = None
+        self._header = None
+        if self._mmap is not None:
+            self._mmap.close()
+        size = self._header_size + capacity * RECORD_DTYPE.itemsize
+        self._file.truncate(size)
+        self._mmap = mmap.mmap(self._file.fileno(), size)
+        self._header = np.frombuffer(self._mmap, dtype="<u8", count=1, offset=_COUNT.start)
+        self._records = np.frombuffer(self._mmap, dtype=RECORD_DTYPE, count=capacity, offset=self._header_size)
+        self.capacity = capacity
+
+    def _open_file(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        while True:
+            # Another log (a restart, or a new SessionLog after a settings change) may have this name already
+            self._sequence += 1
+            self.path = self.directory / f"session-{stamp}-{self._sequence:03d}{LOG_SUFFIX}"
+            try:
+                self._file = open(self.path, "x+b")
+                break
+            except FileExistsError:
+                continue
+
+        description = json.dumps({"dtype": _describe(RECORD_DTYPE), "created": time.time()}).encode()
+        header_size = -(-(20 + len(description)) // HEADER_ALIGN) * HEADER_ALIGN
+        self._header_size = header_size
+        self.max_records = max(1, (self.max_bytes - header_size) // RECORD_DTYPE.itemsize)
+
+        self._mmap = None
+        self._map(min(self.max_records, max(1, GROW_BYTES // RECORD_DTYPE.itemsize)))
+        self._mmap[:8] = MAGIC
+        self._mmap[16:20] = np.uint32(header_size).tobytes()
+        self._mmap[20:header_size] = description.ljust(header_size - 20)
+        self._header[0] = self.count = 0
+
+    def _close_file(self):
+        if self._mmap is None:
+            return
+        used = self._header_size + self.count * RECORD_DTYPE.itemsize
+        # NumPy views must go before the mapping can close
+        self._records = None
+        self._header = None
+        self._mmap.flush()
+        self._mmap.close()
+        self._mmap = None
+        self._file.truncate(used)
+        self._file.close()
+        self._file = None
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+
+def _describe(dtype):
+    return [[name, dtype.fields[name][0].str, dtype.fields[name][1]] for name in dtype.names] + [["", "", dtype.itemsize]]
+
+
+def _parse(description):
+    *fields, (_, _, itemsize) = description
+    return np.dtype({
+        "names": [name for name, _, _ in fields],
+        "formats": [kind for _, kind, _ in fields],
+        "offsets": [offset for _, _, offset in fields],
+        "itemsize": itemsize,
+    })
+
+
+def _read_header(f):
+    """Return (count, header size, description) from an open log file"""
+    prefix = f.read(20)
+    if prefix[:8] != MAGIC:
+        raise ValueError(f"{f.name} is not a session log")
+    count = int(np.frombuffer(prefix[_COUNT], dtype="<u8")[0])
+    header_size = int(np.frombuffer(prefix[16:20], dtype="<u4")[0])
+    description = json.loads(f.read(header_size - 20).decode().strip())
+    return count, header_size, description
+
+
+def read_log(path):
+    """Memory-map one log file as a read-only structured array (no copy), valid records only"""
+    with open(path, "rb") as f:
+        count, header_size, description = _read_header(f)
+        size = os.fstat(f.fileno()).st_size
+
+    dtype = _parse(description["dtype"])
+    # A crash can leave the count ahead of what reached the disk
+    count = min(count, max(0, (size - header_size) // dtype.itemsize))
+    if count == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", offset=header_size, shape=(count,))
+
+
+def recover_logs(directory="logs"):
+    """Trim log files a crash left at their grown size down to their records"""
+    for path in log_files(directory):
+        try:
+            with open(path, "r+b") as f:
+                count, header_size, description = _read_header(f)
+                used = header_size + count * _parse(description["dtype"]).itemsize
+                if os.fstat(f.fileno()).st_size > used:
+                    f.truncate(used)
+        except (OSError, ValueError) as e:
+            print(f"Error recovering session log {path}: {e}")
+
+
+def log_files(directory="logs"):
+    """Log files in `directory`, oldest first"""
+    return sorted(Path(directory).glob(f"*{LOG_SUFFIX}"))
+
+
+def read_logs(directory="logs", start=None, end=None):
+    """Memory-map every log file in `directory`, return one zero-copy array per file
+
+    `start`/`end` (Unix timestamps) skip whole files outside the range and
+    slice the rest with a binary search, still without copying.
+    """
+    arrays = []
+    for path in log_files(directory):
+        records = read_log(path)
+        if not len(records):
+            continue
+        timestamp = records["timestamp"]
+        lo = np.searchsorted(timestamp, start) if start is not None else 0
+        hi = np.searchsorted(timestamp, end, side="right") if end is not None else len(records)
+        if hi > lo:
+            arrays.append(records[lo:hi])
+    return arrays
+
+
+def load_logs(directory="logs", start=None, end=None):
+    """Concatenate read_logs() into a single array (this one copies)"""
+    arrays = read_logs(directory, start, end)
+    return np.concatenate(arrays) if arrays else np.zeros(0, dtype=RECORD_DTYPE)
+
+
+if __name__ == "__main__":
+    # Summarize a log directory: python sessionlog.py logs
+    import sys
+
+    arrays = read_logs(sys.argv[1] if len(sys.argv) > 1 else "logs")
+    records = sum(len(a) for a in arrays)
+    print(f"Files: {len(arrays)}, records: {records}")
+    if records:
+        first, last = arrays[0]["timestamp"][0], arrays[-1]["timestamp"][-1]
+        faces = sum(int((a["flags"] & FACE).astype(bool).sum()) for a in arrays)
+        triggers = sum(int((a["flags"] & TRIGGER).astype(bool).sum()) for a in arrays)
+        print(f"From {time.ctime(first)} to {time.ctime(last)}")
+        print(f"Face found: {faces / records:.1%}, triggers: {triggers}")
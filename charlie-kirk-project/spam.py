@@ -0,0 +1,211 @@
+import queue
+import random
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from PIL import Image
+
+SPAM_SUFFIXES = ['.jpg', '.png', '.jpeg']
+
+
+class SpamImageCache:
+    """Decode and downsample the spam images once, bounded by memory with LRU eviction
+
+    Entries are keyed by path, mtime and size, and the folder listing is
+    re-read only when the folder's own mtime changes, so edits to the
+    folder invalidate the cache without re-scanning it on every trigger.
+    """
+
+    def __init__(self, folder, max_size=(800, 800), max_bytes=64 * 1024 * 1024):
+        self.folder = Path(folder)
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self.generation = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._files = []
+        self._folder_mtime = None
+        self._lock = threading.Lock()
+
+    def set_max_size(self, max_size):
+        """Change the target size (e.g. once the screen size is known), dropping everything cached"""
+        with self._lock:
+            if tuple(max_size) != tuple(self.max_size):
+                self.max_size = tuple(max_size)
+                self._clear()
+
+    def files(self):
+        """Return the spam image paths, re-listing the folder only if it changed"""
+        try:
+            mtime = self.folder.stat().st_mtime
+        except OSError:
+            return []
+        if mtime != self._folder_mtime:
+            self._files = sorted(p for p in self.folder.iterdir() if p.suffix.lower() in SPAM_SUFFIXES)
+            self._folder_mtime = mtime
+            self.generation += 1
+        return self._files
+
+    def images(self):
+        """Return (key, image) pairs for every spam image, decoding only what is not cached"""
+        result = []
+        with self._lock:
+            for path in self.files():
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                key = (str(path), stat.st_mtime, stat.st_size)
+                image = self._entries.get(key)
+                if image is None:
+                    image = self._decode(path)
+                    if image is None:
+                        continue
+                    self._entries[key] = image
+                    self._bytes += self._image_bytes(image)
+                else:
+                    self._entries.move_to_end(key)
+                result.append((key, image))
+
+            # Evict least recently used images once over budget (keeping at least this batch)
+            while self._bytes > self.max_bytes and len(self._entries) > len(result):
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= self._image_bytes(evicted)
+        return result
+
+    def preload(self):
+        """Decode everything on a background thread"""
+        threading.Thread(target=self.images, daemon=True).start()
+
+    def _decode(self, path):
+        try:
+            with Image.open(path) as im:
+                image = im.convert("RGB")
+            image.thumbnail(self.max_size)
+            return image
+        except Exception as e:
+            print(f"Error loading spam image {path}: {e}")
+            return None
+
+    @staticmethod
+    def _image_bytes(image):
+        return image.width * image.height * 3
+
+    def _clear(self):
+        self._entries.clear()
+        self._bytes = 0
+        self.generation += 1
+
+
+class SpamOverlay:
+    """A single reusable, borderless, always-on-top window that flashes the spam images
+
+    It runs its own Tk event loop on a background thread; show() only
+    enqueues a request, so the detection thread never waits on it. If Tk
+    cannot open a window (no display), `available` turns False and show()
+    does nothing.
+    """
+
+    def __init__(self, cache, image_ms=400, screen_fraction=0.6):
+        self.cache = cache
+        self.image_ms = image_ms
+        self.screen_fraction = screen_fraction
+        self._requests = queue.Queue()
+        self._thread = None
+        self._sequence = []
+        self._photos = {}
+        self._generation = None
+        self._after_id = None
+        self.available = True
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def show(self, loops):
+        """Flash every spam image `loops` times"""
+        self.start()
+        if self.available:
+            self._requests.put(loops)
+
+    def cancel(self):
+        """Stop the current sequence and hide the window"""
+        self._requests.put(0)
+
+    def close(self):
+        self._requests.put(None)
+
+    def _run(self):
+        import tkinter as tk
+        from PIL import ImageTk
+
+        self._image_tk = ImageTk
+        try:
+            self.root = tk.Tk()
+        except tk.TclError as e:
+            # Logged once: the thread ends here and later show() calls are dropped
+            self.available = False
+            print(f"Error opening spam overlay, images will not be shown: {e}")
+            return
+        self.root.withdraw()
+        self.root.overrideredirect(True)
+        self.root.attributes("-topmost", True)
+        self.label = tk.Label(self.root, borderwidth=0)
+        self.label.pack()
+
+        screen = (self.root.winfo_screenwidth(), self.root.winfo_screenheight())
+        self.cache.set_max_size((int(screen[0] * self.screen_fraction), int(screen[1] * self.screen_fraction)))
+        self.screen = screen
+        self.cache.preload()
+
+        self.root.after(50, self._poll)
+        self.root.mainloop()
+
+    def _poll(self):
+        try:
+            while True:
+                loops = self._requests.get_nowait()
+                if loops is None:
+                    self.root.destroy()
+                    return
+                if loops == 0:
+                    self._sequence = []
+                    if self._after_id is not None:
+                        self.root.after_cancel(self._after_id)
+                        self._after_id = None
+                    self.root.withdraw()
+                else:
+                    images = self.cache.images()
+                    # Forget photos of images that were evicted or replaced
+                    keys = {key for key, _ in images}
+                    self._photos = {key: photo for key, photo in self._photos.items() if key in keys}
+                    # Repeated triggers while a sequence is showing just extend it
+                    self._sequence.extend(images * loops)
+                    if self._after_id is None:
+                        self._next_image()
+        except queue.Empty:
+            pass
+        self.root.after(50, self._poll)
+
+    def _next_image(self):
+        if not self._sequence:
+            self._after_id = None
+            self.root.withdraw()
+            return
+
+        key, image = self._sequence.pop(0)
+        if self.cache.generation != self._generation:
+            self._photos.clear()
+            self._generation = self.cache.generation
+        photo = self._photos.get(key)
+        if photo is None:
+            photo = self._photos[key] = self._image_tk.PhotoImage(image, master=self.root)
+
+        self.label.configure(image=photo)
+        x = random.randint(0, max(0, self.screen[0] - image.width))
+        y = random.randint(0, max(0, self.screen[1] - image.height))
+        self.root.geometry(f"{image.width}x{image.height}+{x}+{y}")
+        self.root.deiconify()
+        self.root.lift()
+        self._after_id = self.root.after(self.image_ms, self._next_image)
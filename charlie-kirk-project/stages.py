@@ -0,0 +1,75 @@
+import time
+
+# Pipeline stages in the order they run for each frame
+STAGES = ["capture", "convert", "inference", "tracking", "ratios", "decision"]
+
+
+class NullStageTimer:
+    """Stage timer that records nothing (the default when nobody is measuring)"""
+
+    # Seconds per stage of the frame in progress (always empty here)
+    current = {}
+
+    def start_frame(self):
+        pass
+
+    def lap(self, stage):
+        pass
+
+    def end_frame(self):
+        pass
+
+
+class StageTimer:
+    """Record how long each pipeline stage takes per frame
+
+    lap(stage) charges the time since the previous lap to `stage`; a stage
+    that runs twice in one frame (e.g. an ROI miss retried full-frame) is
+    summed. `current` holds the frame in progress; end_frame() stores its
+    totals.
+    """
+
+    def __init__(self):
+        self.samples = {stage: [] for stage in STAGES}
+        self.frames = 0
+        self.current = {}
+        self._last = None
+
+    def start_frame(self):
+        self.current = {}
+        self._last = time.perf_counter()
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        self.current[stage] = self.current.get(stage, 0.0) + (now - self._last)
+        self._last = now
+
+    def end_frame(self):
+        for stage, seconds in self.current.items():
+            self.samples.setdefault(stage, []).append(seconds)
+        self.frames += 1
+        self.current = {}
+
+    def summary(self):
+        """Return {stage: {count, mean_ms, p50_ms, p95_ms, p99_ms}} for stages that ran"""
+        return {stage: summarize(samples) for stage, samples in self.samples.items() if samples}
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(samples):
+    """Summarize durations in seconds as milliseconds"""
+    values = sorted(samples)
+    return {
+        "count": len(values),
+        "mean_ms": 1000 * sum(values) / len(values),
+        "p50_ms": 1000 * percentile(values, 50),
+        "p95_ms": 1000 * percentile(values, 95),
+        "p99_ms": 1000 * percentile(values, 99),
+    }
@@ -0,0 +1,110 @@
+import importlib
+import json
+import threading
+import time
+
+# Heavy third-party modules, imported (and timed) one by one during warm-up
+HEAVY_MODULES = ["numpy", "cv2", "mediapipe", "pygame"]
+
+
+class StartupReport:
+    """Record how long each start-up step took, relative to process start"""
+
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.steps = []
+
+    def measure(self, name, func, *args):
+        """Run func(*args), record its duration and return its result"""
+        started = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            self.steps.append({
+                "step": name,
+                "start_s": started - self.t0,
+                "duration_s": time.perf_counter() - started,
+            })
+
+    def mark(self, name):
+        """Record a point in time (e.g. the tray icon becoming visible)"""
+        self.steps.append({"step": name, "start_s": time.perf_counter() - self.t0, "duration_s": 0.0})
+
+    def to_dict(self):
+        return {"steps": self.steps, "total_s": time.perf_counter() - self.t0}
+
+    def format(self):
+        lines = ["Start-up timing:"]
+        for step in self.steps:
+            lines.append(f"  {step['step']:<28} at {step['start_s']:7.3f}s  took {step['duration_s']:7.3f}s")
+        return "\n".join(lines)
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=4)
+
+
+class Warmup:
+    """Import and initialise the heavy subsystems on a background thread
+
+    Steps: import cv2/mediapipe/pygame, build the detector (FaceMesh graph),
+    initialise the mixer, run a first inference, and optionally open the
+    camera. `progress(step, index, total)` is called before each step.
+    """
+
+    def __init__(self, config_path="config.json", report=None, progress=None, warm_camera=False):
+        self.config_path = config_path
+        self.report = report or StartupReport()
+        self.progress = progress
+        self.warm_camera = warm_camera
+        self.detector = None
+        self.error = None
+        self.ready = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, daemon=True)
+            self._thread.start()
+
+    def wait(self, timeout=None):
+        """Block until warm-up has finished, return the detector (None on failure)"""
+        self.ready.wait(timeout)
+        return self.detector
+
+    def run(self):
+        steps = [(f"import {name}", importlib.import_module, name) for name in HEAVY_MODULES]
+        steps += [
+            ("import detector", importlib.import_module, "detector"),
+            ("build detector", self._build_detector),
+            ("init mixer", lambda: self.detector.audio.init_mixer()),
+            ("first inference", lambda: self.detector.warm_up()),
+        ]
+        if self.warm_camera:
+            steps.append(("open camera", lambda: self.detector.prepare_source()))
+
+        try:
+            for index, (name, func, *args) in enumerate(steps):
+                if self.progress:
+                    self.progress(name, index, len(steps))
+                self.report.measure(name, func, *args)
+        except Exception as e:
+            print(f"Error during warm-up: {e}")
+            self.error = e
+            self.detector = None
+        finally:
+            self.report.mark("warm-up done")
+            self.ready.set()
+            if self.progress:
+                self.progress("failed" if self.error else "ready", len(steps), len(steps))
+
+    def _build_detector(self):
+        from detector import CharlieKirkDetector
+        self.detector = CharlieKirkDetector(self.config_path)
+
+
+if __name__ == "__main__":
+    # Print the start-up timing report without the tray: python startup.py
+    warmup = Warmup(warm_camera=True)
+    warmup.run()
+    print(warmup.report.format())
@@ -0,0 +1,197 @@
+import numpy as np
+
+
+class GazeTimeline:
+    """Fixed-capacity ring buffer of gaze samples backed by NumPy arrays
+
+    Each sample is a timestamp, the two iris ratios, whether a face was
+    found (ratios are NaN when it was not) and how confident the landmarks
+    are (1.0 for full inference, lower for tracked points). Once full, the
+    oldest samples are overwritten.
+    """
+
+    def __init__(self, capacity=36000):
+        self.capacity = capacity
+        self.timestamp = np.zeros(capacity, dtype=np.float64)
+        self.l_ratio = np.zeros(capacity, dtype=np.float64)
+        self.r_ratio = np.zeros(capacity, dtype=np.float64)
+        self.face = np.zeros(capacity, dtype=bool)
+        self.confidence = np.zeros(capacity, dtype=np.float64)
+        self.count = 0
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def append(self, timestamp, l_ratio, r_ratio, face, confidence=1.0):
+        """Add one sample, overwriting the oldest when full"""
+        i = self.count % self.capacity
+        self.timestamp[i] = timestamp
+        self.l_ratio[i] = l_ratio if face else np.nan
+        self.r_ratio[i] = r_ratio if face else np.nan
+        self.face[i] = face
+        self.confidence[i] = confidence if face else 0.0
+        self.count += 1
+
+    def arrays(self):
+        """Return (timestamp, l_ratio, r_ratio, face, confidence) in chronological order"""
+        n = len(self)
+        if self.count <= self.capacity:
+            order = slice(0, n)
+        else:
+            start = self.count % self.capacity
+            order = np.r_[start:self.capacity, 0:start]
+        return self.timestamp[order], self.l_ratio[order], self.r_ratio[order], self.face[order], self.confidence[order]
+
+    def clear(self):
+        self.count = 0
+
+    def save(self, path):
+        """Write the timeline to an .npz file"""
+        timestamp, l_ratio, r_ratio, face, confidence = self.arrays()
+        np.savez_compressed(path, timestamp=timestamp, l_ratio=l_ratio, r_ratio=r_ratio, face=face, confidence=confidence)
+
+    @classmethod
+    def load(cls, path):
+        """Load a timeline saved with save()"""
+        data = np.load(path)
+        # Timelines recorded before tracking have no confidence column
+        confidence = data["confidence"] if "confidence" in data.files else None
+        return cls.from_arrays(data["timestamp"], data["l_ratio"], data["r_ratio"], data["face"], confidence)
+
+    @classmethod
+    def from_arrays(cls, timestamp, l_ratio, r_ratio, face, confidence=None):
+        timeline = cls(capacity=max(len(timestamp), 1))
+        n = len(timestamp)
+        timeline.timestamp[:n] = timestamp
+        timeline.l_ratio[:n] = l_ratio
+        timeline.r_ratio[:n] = r_ratio
+        timeline.face[:n] = face
+        timeline.confidence[:n] = np.where(timeline.face[:n], 1.0, 0.0) if confidence is None else confidence
+        timeline.count = n
+        return timeline
+
+
+class TriggerEngine:
+    """Decide when looking down has lasted long enough to trigger
+
+    update() is the live, one-sample-at-a-time path; batch() evaluates a
+    whole recording at once. Both apply the same rules and produce the same
+    triggers for the same samples:
+
+    - a sample is "down" when both ratios are below the threshold; once
+      down, it stays down until a ratio rises above threshold + hysteresis
+    - the timer starts at the first down sample of a run and resets on the
+      first sample with a face that is not down
+    - samples without a face, or with confidence below `min_confidence`,
+      leave the state untouched
+    - one trigger per run, on the first down sample at least `timer` seconds
+      after the run started
+    """
+
+    def __init__(self, threshold=0.35, timer=2.0, min_confidence=0.0, hysteresis=0.0):
+        self.threshold = threshold
+        self.timer = timer
+        self.min_confidence = min_confidence
+        self.hysteresis = hysteresis
+        self.timer_started = None
+        self.playing = False
+
+    def reset(self):
+        self.timer_started = None
+        self.playing = False
+
+    def update(self, timestamp, l_ratio, r_ratio, face=True, confidence=1.0):
+        """Feed one sample, return True if it triggers"""
+        if not face or confidence < self.min_confidence:
+            return False
+
+        # When looking down, ratio DECREASES (iris moves up relative to eye landmarks).
+        # Already down, the ratios have to clear the hysteresis band to count as looking up
+        threshold = self.threshold if self.timer_started is None else self.threshold + self.hysteresis
+        if (l_ratio < threshold) and (r_ratio < threshold):
+            if self.timer_started is None:
+                self.timer_started = timestamp
+
+            # Timer exceeded - trigger
+            if (timestamp - self.timer_started) >= self.timer and not self.playing:
+                self.playing = True
+                return True
+        else:
+            self.timer_started = None
+            self.playing = False
+        return False
+
+    def batch(self, timestamp, l_ratio, r_ratio, face, confidence=None):
+        """Evaluate a recording from a reset state, return a dict of NumPy arrays
+
+        - `triggers`: sample indices that trigger
+        - `crossings`: sample indices where the down state changes
+        - `run_start`, `run_end`: first/last sample index of each down run
+        - `dwell`: seconds from the first to the last sample of each run
+        """
+        timestamp = np.asarray(timestamp, dtype=np.float64)
+        usable = np.asarray(face, dtype=bool)
+        if confidence is not None:
+            usable = usable & (np.asarray(confidence) >= self.min_confidence)
+        face_idx = np.flatnonzero(usable)
+        t = timestamp[face_idx]
+        l_ratio = np.asarray(l_ratio)[face_idx]
+        r_ratio = np.asarray(r_ratio)[face_idx]
+        down = (l_ratio < self.threshold) & (r_ratio < self.threshold)
+        if self.hysteresis > 0:
+            # Down from the first sample below the threshold until the first one above the band
+            release = self.threshold + self.hysteresis
+            index = np.arange(len(down))
+            last_down = np.maximum.accumulate(np.where(down, index, -1))
+            last_up = np.maximum.accumulate(np.where((l_ratio < release) & (r_ratio < release), -1, index))
+            down = last_down > last_up
+
+        # Down runs over usable samples (no-face and low-confidence samples neither extend nor break a run)
+        edges = np.diff(down.astype(np.int8), prepend=np.int8(0), append=np.int8(0))
+        starts = np.flatnonzero(edges == 1)
+        ends = np.flatnonzero(edges == -1) - 1
+
+        run_id = np.cumsum(edges[:-1] == 1) - 1
+        down_idx = np.flatnonzero(down)
+        elapsed = t[down_idx] - t[starts[run_id[down_idx]]]
+        eligible = down_idx[elapsed >= self.timer]
+        eligible_runs = run_id[eligible]
+        first = np.ones(len(eligible), dtype=bool)
+        first[1:] = eligible_runs[1:] != eligible_runs[:-1]
+
+        crossings = np.flatnonzero(np.diff(down.astype(np.int8)) != 0) + 1
+        return {
+            "triggers": face_idx[eligible[first]],
+            "crossings": face_idx[crossings],
+            "run_start": face_idx[starts],
+            "run_end": face_idx[ends],
+            "dwell": t[ends] - t[starts],
+        }
+
+    def replay(self, timestamp, l_ratio, r_ratio, face, confidence=None):
+        """Run the live path over a recording from a reset state, return trigger indices"""
+        if confidence is None:
+            confidence = np.ones(len(timestamp))
+        self.reset()
+        triggers = [i for i in range(len(timestamp))
+                    if self.update(float(timestamp[i]), float(l_ratio[i]), float(r_ratio[i]), bool(face[i]),
+                                   float(confidence[i]))]
+        self.reset()
+        return np.array(triggers, dtype=np.int64)
+
+
+if __name__ == "__main__":
+    # Tune threshold/timer/hysteresis against a recorded session: python timeline.py session.npz 0.35 2.0 0.05
+    import sys
+
+    timeline = GazeTimeline.load(sys.argv[1])
+    engine = TriggerEngine(
+        threshold=float(sys.argv[2]) if len(sys.argv) > 2 else 0.35,
+        timer=float(sys.argv[3]) if len(sys.argv) > 3 else 2.0,
+        hysteresis=float(sys.argv[4]) if len(sys.argv) > 4 else 0.0,
+    )
+    result = engine.batch(*timeline.arrays())
+    print(f"Samples: {len(timeline)}")
+    print(f"Down runs: {len(result['run_start'])}, triggers: {len(result['triggers'])}")
+    if len(result["dwell"]):
+        print(f"Dwell: mean {result['dwell'].mean():.2f}s, max {result['dwell'].max():.2f}s")
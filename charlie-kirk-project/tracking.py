@@ -0,0 +1,161 @@
+import cv2
+import numpy as np
+from buffers import ReusableBuffer
+
+# Where a sample's eye points came from
+SOURCE_INFERENCE = "inference"
+SOURCE_FLOW = "flow"
+SOURCE_STATIC = "static"
+
+
+class LandmarkTracker:
+    """Run full inference only every N frames and track the eye points in between
+
+    Between inferences the six eye/iris points are propagated with pyramidal
+    Lucas-Kanade optical flow. Before even that, a cheap difference score on
+    a small grayscale thumbnail of the eye region decides whether anything
+    moved since the last processed frame; if not, the previous points are
+    reused as they are. Full inference runs when `full_every` frames have
+    passed, when flow loses a point, or when tracking confidence drops below
+    `min_confidence`.
+    """
+
+    def __init__(self, full_every=5, min_confidence=0.6, motion_threshold=2.0, motion_size=(32, 16)):
+        self.full_every = full_every
+        self.min_confidence = min_confidence
+        self.motion_threshold = motion_threshold
+        self.motion_size = motion_size
+
+        self.inference_calls = 0
+        self.flow_frames = 0
+        self.static_frames = 0
+
+        # Two grayscale frames alternate (current and reference), plus the returned points
+        self._gray = [ReusableBuffer(), ReusableBuffer()]
+        self._gray_index = 0
+        self._points = None
+
+        self._lk_params = dict(
+            winSize=(21, 21),
+            maxLevel=3,
+            criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 20, 0.03),
+        )
+        self.reset()
+
+    def reset(self):
+        """Forget the tracked points so the next frame runs full inference"""
+        self._prev_gray = None
+        self._prev_points = None
+        self._prev_thumb = None
+        self._region = None
+        self._confidence = 0.0
+        self._since_full = 0
+
+    @property
+    def frames(self):
+        return self.inference_calls + self.flow_frames + self.static_frames
+
+    def stats(self):
+        """Return counters for the benchmark and metrics"""
+        frames = self.frames
+        return {
+            "tracking_frames": frames,
+            "tracking_inference_calls": self.inference_calls,
+            "tracking_flow_frames": self.flow_frames,
+            "tracking_static_frames": self.static_frames,
+            "tracking_inference_reduction": frames / self.inference_calls if self.inference_calls else 0.0,
+        }
+
+    def step(self, frame, infer):
+        """Return (points, confidence, source) for this frame
+
+        `infer(frame)` runs full inference and returns a GazeEstimate or
+        None. Confidence is the estimate's own for inferred points and decays
+        while they are tracked.
+        """
+        due = self._prev_points is None or self._since_full >= self.full_every
+
+        if not due and self._motion(frame) < self.motion_threshold:
+            # Nothing moved around the eyes - reuse the previous points without touching the frame
+            self._since_full += 1
+            self.static_frames += 1
+            return self._normalized(frame), self._confidence, SOURCE_STATIC
+
+        # Write into whichever buffer is not holding the reference frame
+        self._gray_index ^= 1
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=self._gray[self._gray_index].view(frame.shape[:2]))
+        if not due:
+            points, confidence = self._flow(gray)
+            if points is not None and confidence >= self.min_confidence:
+                self._keep(frame, gray, points, confidence)
+                self._since_full += 1
+                self.flow_frames += 1
+                return self._normalized(frame), confidence, SOURCE_FLOW
+
+        self.inference_calls += 1
+        self._since_full = 0
+        estimate = infer(frame)
+        if estimate is None:
+            self.reset()
+            return None, 0.0, SOURCE_INFERENCE
+
+        height, width = frame.shape[:2]
+        pixels = np.array(estimate.points, dtype=np.float32).reshape(-1, 1, 2) * np.float32([width, height])
+        self._keep(frame, gray, pixels, estimate.confidence)
+        return estimate.points, estimate.confidence, SOURCE_INFERENCE
+
+    def _keep(self, frame, gray, points, confidence):
+        """Remember this frame as the reference for flow and the motion check"""
+        self._prev_gray = gray
+        self._prev_points = points
+        self._confidence = confidence
+
+        # Eye region: the points' bounding box padded by half its width on every side
+        height, width = gray.shape
+        x0, y0 = points.reshape(-1, 2).min(axis=0)
+        x1, y1 = points.reshape(-1, 2).max(axis=0)
+        pad = max(x1 - x0, y1 - y0, 8.0) / 2
+        self._region = (
+            int(max(0, x0 - pad)), int(max(0, y0 - pad)),
+            int(min(width, x1 + pad + 1)), int(min(height, y1 + pad + 1)),
+        )
+        self._prev_thumb = self._thumb(frame)
+
+    def _thumb(self, frame):
+        x0, y0, x1, y1 = self._region
+        crop = cv2.cvtColor(frame[y0:y1, x0:x1], cv2.COLOR_BGR2GRAY)
+        return cv2.resize(crop, self.motion_size, interpolation=cv2.INTER_AREA)
+
+    def _motion(self, frame):
+        """Mean absolute grey-level difference of the eye region against the reference frame"""
+        if self._prev_thumb is None or frame.shape[:2] != self._prev_gray.shape:
+            return float("inf")
+        thumb = self._thumb(frame)
+        return cv2.norm(thumb, self._prev_thumb, cv2.NORM_L1) / thumb.size
+
+    def _flow(self, gray):
+        """Track the previous points into `gray`, return (pixel points, confidence) or (None, 0)"""
+        if self._prev_gray.shape != gray.shape:
+            return None, 0.0
+
+        points, status, _ = cv2.calcOpticalFlowPyrLK(self._prev_gray, gray, self._prev_points, None, **self._lk_params)
+        if points is None or not status.all():
+            return None, 0.0
+
+        # Forward-backward check: track back and see how far from the start we land
+        back, back_status, _ = cv2.calcOpticalFlowPyrLK(gray, self._prev_gray, points, None, **self._lk_params)
+        if back is None or not back_status.all():
+            return None, 0.0
+        error = float(np.abs(back - self._prev_points).max())
+
+        # Confidence falls with the round-trip error (a 2 px miss is zero) and with every tracked frame
+        confidence = self._confidence * max(0.0, 1.0 - error / 2.0) * (1.0 - 0.5 / max(self.full_every, 1))
+        return points, confidence
+
+    def _normalized(self, frame):
+        """The tracked points in normalized coordinates, in an array reused across frames"""
+        height, width = frame.shape[:2]
+        points = self._prev_points.reshape(-1, 2)
+        if self._points is None or self._points.shape != points.shape:
+            self._points = np.empty(points.shape, dtype=np.float64)
+        return np.divide(points, (width, height), out=self._points)